@@ -61,6 +61,9 @@ class EvidenceSet:
             item = self._items.get(key)
             if item is None:
                 item = {
+                    # Which chunk supplied the text, so a checkpoint can name
+                    # the passage and a resumed run can read it back.
+                    "chunk_id": c.get("chunk_id"),
                     "segment_id": c.get("segment_id"),
                     # Carried through because a name is not an identity. Two
                     # workspaces may each hold a policy.pdf, and anything
@@ -104,7 +107,7 @@ class EvidenceSet:
         """
         return [
             {
-                "chunk_id": None,
+                "chunk_id": e.get("chunk_id"),
                 "segment_id": e["segment_id"],
                 "content": e["content"],
                 # Two dictionaries are built from one chunk on the way here,
@@ -122,3 +125,39 @@ class EvidenceSet:
             }
             for e in self.ranked(limit)
         ]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """The set without its text, small enough to write after every node.
+
+        What it cannot name by chunk it cannot restore, so a passage that
+        arrived without a chunk_id is left out.
+        """
+        return [
+            {"chunk_id": e["chunk_id"], "score": e["score"], "hits": e["hits"],
+             "queries": list(e["queries"])}
+            for e in self._items.values()
+            if e.get("chunk_id") is not None
+        ]
+
+    @classmethod
+    def restore(
+        cls, snapshot: Iterable[Dict[str, Any]], chunks: Dict[Any, Dict[str, Any]]
+    ) -> "EvidenceSet":
+        """Rebuild a set from `snapshot`, reading the text from `chunks` by id.
+
+        A chunk that no longer exists, because its document was deleted while
+        the run waited to be retried, is dropped rather than cited.
+        """
+        evidence = cls()
+        for s in snapshot or []:
+            c = chunks.get(s.get("chunk_id"))
+            if c is None:
+                continue
+            added = evidence.add([c], "")
+            if not added:
+                continue
+            item = added[0]
+            item["score"] = float(s.get("score") or 0.0)
+            item["hits"] = int(s.get("hits") or 0)
+            item["queries"] = list(s.get("queries") or [])
+        return evidence
@@ -26,6 +26,10 @@ class IngestionAgent:
 
     This first thin-slice keeps the existing ingestion implementation intact and
     provides a graph orchestration layer + structured trace logs.
+
+    One per process (workflows/tasks.py), compiled once. Nothing about a
+    particular upload lives on the instance; it all travels in the state that
+    run() passes to ainvoke, so concurrent ingests can share it.
     """
 
     def __init__(self, *, process_fn: Callable[..., Awaitable[Dict[str, Any]]]):
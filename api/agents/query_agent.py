@@ -2,10 +2,11 @@ import logging
 
 from api.core.log_safety import safe_text
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from typing_extensions import TypedDict
 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, StateGraph
 
 from api.agents.evidence import EvidenceSet
@@ -137,10 +138,70 @@ class QueryAgentState(TypedDict, total=False):
     next_query: str
     last_query: str
     last_added: int
+    # Per-arm profiles of the searches that were sampled for EXPLAIN, for the
+    # run record (see AsyncFileRepository.EXPLAIN_EVERY).
+    search_profiles: List[Dict[str, Any]]
 
     response: str
     mode: str
 
+    # The last node to finish, which is where a resumed run picks up.
+    completed: str
+
+
+# Where to go once each node has finished, for a run resuming from a
+# checkpoint. check_coverage is the one branch and asks the same question the
+# graph does; generate finishing means there is nothing left to do.
+_RESUME_AFTER = {
+    None: "process_query",
+    "process_query": "retrieve",
+    "retrieve": "dedupe_and_normalize",
+    "dedupe_and_normalize": "check_coverage",
+    "select_context": "generate",
+}
+
+# Carried through a checkpoint as they are. Everything else in the state is
+# passages, which are written as chunk ids and read back on resume.
+_CHECKPOINT_FIELDS = (
+    "rewritten_query", "expanded_terms", "information_needs", "need_attempts",
+    "covered_needs", "retrievals", "next_query", "last_query", "last_added",
+    "response", "mode", "search_profiles",
+)
+
+
+def _refs(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Passages as the checkpoint records them: which chunk, and its score."""
+    out = []
+    for c in chunks or []:
+        if c.get("chunk_id") is None:
+            continue
+        ref = {
+            "chunk_id": c["chunk_id"],
+            "score": c.get("similarity_score", c.get("hybrid_score")),
+        }
+        # The selector cuts a chunk that alone overruns the budget; the cut is
+        # part of what the answer was going to be written from.
+        if c.get("truncated"):
+            ref["chars"] = len(c.get("content") or "")
+        out.append(ref)
+    return out
+
+
+def _from_refs(refs: List[Dict[str, Any]], found: Dict[Any, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = []
+    for ref in refs or []:
+        c = found.get(ref.get("chunk_id"))
+        if c is None:
+            continue
+        c = dict(c)
+        if ref.get("score") is not None:
+            c["hybrid_score"] = c["similarity_score"] = float(ref["score"])
+        if ref.get("chars"):
+            c["content"] = c["content"][: int(ref["chars"])]
+            c["truncated"] = True
+        out.append(c)
+    return out
+
 
 class QueryAgent:
     def __init__(self, *, store: Any, syntext: Any):
@@ -151,14 +212,29 @@ class QueryAgent:
     def _build_graph(self):
         workflow: StateGraph = StateGraph(QueryAgentState)
 
-        workflow.add_node("process_query", self._process_query)
-        workflow.add_node("retrieve", self._retrieve)
-        workflow.add_node("dedupe_and_normalize", self._dedupe_and_normalize)
-        workflow.add_node("check_coverage", self._check_coverage)
-        workflow.add_node("select_context", self._select_context)
-        workflow.add_node("generate", self._generate)
-
-        workflow.set_entry_point("process_query")
+        workflow.add_node("process_query", self._checkpointed("process_query", self._process_query))
+        workflow.add_node("retrieve", self._checkpointed("retrieve", self._retrieve))
+        workflow.add_node(
+            "dedupe_and_normalize",
+            self._checkpointed("dedupe_and_normalize", self._dedupe_and_normalize),
+        )
+        workflow.add_node("check_coverage", self._checkpointed("check_coverage", self._check_coverage))
+        workflow.add_node("select_context", self._checkpointed("select_context", self._select_context))
+        workflow.add_node("generate", self._checkpointed("generate", self._generate))
+
+        # process_query for a new run; after its last completed node for one
+        # resumed from a checkpoint.
+        workflow.set_conditional_entry_point(
+            self._resume_at,
+            {
+                "process_query": "process_query",
+                "retrieve": "retrieve",
+                "dedupe_and_normalize": "dedupe_and_normalize",
+                "check_coverage": "check_coverage",
+                "select_context": "select_context",
+                "generate": "generate",
+            },
+        )
         workflow.add_edge("process_query", "retrieve")
         workflow.add_edge("retrieve", "dedupe_and_normalize")
         # No rerank stage. What sat here called itself a cross-encoder but
@@ -203,7 +279,16 @@ class QueryAgent:
         formatted_history: str = "",
         workspace_id: int | None = None,
         file_id: int | None = None,
+        checkpoint: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None,
+        resume_from: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
+        """Answer one question.
+
+        `checkpoint` is called after every node with what that node left, in a
+        form that can be stored (see _snapshot). Handing one of those back as
+        `resume_from` continues the run after the node it was taken at, rather
+        than paying for the rewrite and the searches again.
+        """
         initial: QueryAgentState = {
             "user_id": user_id,
             "message": message,
@@ -213,9 +298,19 @@ class QueryAgent:
             "workspace_id": workspace_id,
             "file_id": file_id,
         }
-
-        final_state: QueryAgentState = await self._graph.ainvoke(initial)
-        return {
+        resumed_after = None
+        if resume_from and resume_from.get("completed"):
+            initial.update(await self._restore(resume_from))
+            resumed_after = initial["completed"]
+            logger.info({"event": "query_agent.resume", "after": resumed_after})
+
+        if resumed_after == "generate":
+            final_state: QueryAgentState = initial
+        else:
+            final_state = await self._graph.ainvoke(
+                initial, config={"configurable": {"checkpoint": checkpoint}}
+            )
+        result = {
             "response": final_state.get("response", ""),
             "context_chunks": final_state.get("context_chunks", []),
             "rewritten_query": final_state.get("rewritten_query", message),
@@ -225,6 +320,66 @@ class QueryAgent:
             "covered_needs": final_state.get("covered_needs", []),
             "retrievals": final_state.get("retrievals", 1),
         }
+        if resumed_after:
+            result["resumed_after"] = resumed_after
+        if final_state.get("search_profiles"):
+            result["search_profiles"] = final_state["search_profiles"]
+        return result
+
+    def _checkpointed(self, name: str, node):
+        """`node`, followed by handing its result to the run's checkpoint."""
+        async def run_node(state: QueryAgentState, config: RunnableConfig) -> QueryAgentState:
+            update = await node(state)
+            update = {**update, "completed": name}
+            save = (config.get("configurable") or {}).get("checkpoint")
+            if save is not None:
+                await save(self._snapshot({**state, **update}))
+            return update
+        return run_node
+
+    def _resume_at(self, state: QueryAgentState) -> str:
+        completed = state.get("completed")
+        if completed == "check_coverage":
+            return "retrieve" if self._needs_more_evidence(state) == "retrieve" else "select_context"
+        return _RESUME_AFTER.get(completed, "process_query")
+
+    @staticmethod
+    def _snapshot(state: QueryAgentState) -> Dict[str, Any]:
+        """The state as it is stored: JSON, with passages named by chunk id.
+
+        The text is already in `chunks`, and fifty kilobytes of it rewritten to
+        the run row after every node is what _run_record was written to stop.
+        """
+        evidence = state.get("evidence")
+        return {
+            "completed": state.get("completed"),
+            **{k: state[k] for k in _CHECKPOINT_FIELDS if state.get(k) is not None},
+            "evidence": evidence.snapshot() if evidence is not None else [],
+            "retrieved_results": _refs(state.get("retrieved_results")),
+            "unique_results": _refs(state.get("unique_results")),
+            "context_chunks": _refs(state.get("context_chunks")),
+        }
+
+    async def _restore(self, checkpoint: Dict[str, Any]) -> QueryAgentState:
+        """A snapshot back into graph state, reading its passages by id."""
+        ids = {
+            ref["chunk_id"]
+            for key in ("evidence", "retrieved_results", "unique_results", "context_chunks")
+            for ref in checkpoint.get(key) or []
+            if ref.get("chunk_id") is not None
+        }
+        found = await self._store.file_repo.chunks_by_ids(sorted(ids))
+        state: QueryAgentState = {
+            k: checkpoint[k] for k in _CHECKPOINT_FIELDS if checkpoint.get(k) is not None
+        }
+        state.update({
+            "completed": checkpoint["completed"],
+            "evidence": EvidenceSet.restore(checkpoint.get("evidence") or [], found),
+            "retrieved_results": _from_refs(checkpoint.get("retrieved_results"), found),
+            "unique_results": _from_refs(checkpoint.get("unique_results"), found),
+            "context_chunks": _from_refs(checkpoint.get("context_chunks"), found),
+        })
+        return state
 
     async def _process_query(self, state: QueryAgentState) -> QueryAgentState:
         message = state.get("message") or ""
@@ -290,6 +445,7 @@ class QueryAgent:
         if workspace_id is None:
             accessible_ids = await self._store.workspace_repo.accessible_workspace_ids(user_id)
 
+        profiles: List[Dict[str, Any]] = []
         vector_results = await self._store.file_repo.hybrid_search(
             user_id=user_id,
             query=rewritten_query,
@@ -298,6 +454,7 @@ class QueryAgent:
             file_id=file_id,
             top_k=RETRIEVAL_TOP_K,
             accessible_workspace_ids=accessible_ids,
+            profiles=profiles,
         )
 
         additional_results: List[Dict[str, Any]] = []
@@ -312,6 +469,7 @@ class QueryAgent:
                     file_id=file_id,
                     top_k=5,
                     accessible_workspace_ids=accessible_ids,
+                    profiles=profiles,
                 )
                 additional_results.extend(term_results)
             except Exception as term_error:
@@ -334,11 +492,14 @@ class QueryAgent:
             }
         )
 
-        return {
+        update: QueryAgentState = {
             "retrieved_results": all_results,
             "retrievals": int(state.get("retrievals") or 0) + 1,
             "last_query": rewritten_query,
         }
+        if profiles:
+            update["search_profiles"] = list(state.get("search_profiles") or []) + profiles
+        return update
 
     async def _dedupe_and_normalize(self, state: QueryAgentState) -> QueryAgentState:
         all_results = state.get("retrieved_results") or []
@@ -0,0 +1,46 @@
+"""Never read the same page image twice within an organization.
+
+WHY
+
+`page_reads` is keyed on (file_id, page_number), which is the right key for
+resuming one file and the wrong one for everything else. The same manual
+uploaded into two workspaces, or a revised PDF whose charging chart did not
+change, went back to the vision model for every page, at 12 to 180 seconds and
+real money each. Vision is the dominant cost and latency of ingestion, and the
+read is a function of the image: the same pixels get the same transcription.
+
+WHAT THE HASH IS OVER
+
+sha256 of the exact PNG bytes sent to the model, so a different DPI or a page
+that changed by one pixel is a different image and a miss. A miss costs one
+vision call, which is what happens today.
+
+SCOPED TO THE ORGANIZATION, FOR THE SAME REASON EMBEDDINGS ARE
+
+See embeddings_for_hashes. Reusing another tenant's read would leak nothing the
+caller does not already hold, but a cache that crosses tenants is something
+somebody has to keep proving safe, and nearly all of the saving is a company
+re-uploading its own documents.
+
+Revision ID: 20260816_page_read_image_hash
+Revises: 20260815_drop_unread
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260816_page_read_image_hash"
+down_revision = "20260815_drop_unread"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Null for rows written before this, and for OCR pages, which cost nothing
+    # worth caching across files.
+    op.add_column("page_reads", sa.Column("image_hash", sa.String(length=64), nullable=True))
+    op.create_index("idx_page_reads_image_hash", "page_reads", ["image_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_page_reads_image_hash", table_name="page_reads")
+    op.drop_column("page_reads", "image_hash")
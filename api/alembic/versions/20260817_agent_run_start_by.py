@@ -0,0 +1,29 @@
+"""A deadline for a queued run to start by.
+
+`agent_runs.priority` is a static integer, and nothing said "this one has a
+person watching a spinner". start_by is that: optional, set by the enqueuer,
+claimed earliest-first ahead of everything without one, and reported as a
+queue-wait SLO breach when missed. Null for every existing row, which keeps
+them exactly where the ordering already put them.
+
+Revision ID: 20260817_agent_run_start_by
+Revises: 20260816_page_read_image_hash
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260817_agent_run_start_by"
+down_revision = "20260816_page_read_image_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "agent_runs",
+        sa.Column("start_by", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("agent_runs", "start_by")
@@ -0,0 +1,196 @@
+"""Partition agent_runs by month, index only the live queue, archive old traces.
+
+WHY
+
+agent_runs is two things at once: the live queue the worker claims from every
+few seconds, and the permanent record of every question and upload, with a
+retrieval trace in `result`. The queue is a few dozen rows. The record grows by
+one row per question forever, and every queue operation was paying for it:
+idx_agent_runs_queue covered every row ever written, so the claim, the lease
+sweep and the usage queries all walked an index that was almost entirely
+finished runs.
+
+WHAT CHANGES
+
+  - agent_runs is range partitioned by created_at, one partition per month
+    (agent_runs_yYYYYmMM). The primary key becomes (id, created_at), because a
+    partitioned table's unique constraints must include the partition key. ids
+    are still gen_random_uuid(), so id alone stays unique in practice, and the
+    model keeps id as its identity.
+  - idx_agent_runs_queue is replaced by idx_agent_runs_hot, partial on
+    status IN ('queued', 'running'). It holds the live queue and nothing else,
+    so its size tracks the queue rather than history.
+  - A DEFAULT partition catches any row whose month has no partition yet, so an
+    insert can never fail for want of one. The worker's maintenance creates
+    months ahead (AsyncAgentRunRepository.run_maintenance), so in practice it
+    stays empty.
+  - agent_runs_archive holds the full `result` of finished runs past the
+    retention window, compressed (lz4 where the server supports it, pglz
+    otherwise). The row in agent_runs keeps only cited_file_ids, which the
+    usage dashboard reads, and a marker saying where the rest went.
+
+THE COPY
+
+Rows are copied in one statement inside the migration's transaction. The table
+is small enough today for that to be seconds; it is the last time it will be.
+The worker should be stopped for it, as for any migration that rewrites a table
+it claims from.
+
+Revision ID: 20260818_partition_agent_runs
+Revises: 20260817_agent_run_start_by
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260818_partition_agent_runs"
+down_revision = "20260817_agent_run_start_by"
+branch_labels = None
+depends_on = None
+
+# Months created ahead of now. The maintenance job keeps this topped up.
+MONTHS_AHEAD = 3
+
+_FOREIGN_KEYS = (
+    ("user_id", "users", "CASCADE"),
+    ("workspace_id", "workspaces", "CASCADE"),
+    ("file_id", "files", "CASCADE"),
+    ("chat_history_id", "chat_histories", "CASCADE"),
+    ("message_id", "messages", "SET NULL"),
+)
+
+_INDEXES = (
+    ("idx_agent_runs_user_id", "user_id"),
+    ("idx_agent_runs_file_id", "file_id"),
+    ("idx_agent_runs_chat_history_id", "chat_history_id"),
+    ("idx_agent_runs_message_id", "message_id"),
+)
+
+
+def _add_months(d: datetime, n: int) -> datetime:
+    y, m = divmod(d.month - 1 + n, 12)
+    return d.replace(year=d.year + y, month=m + 1)
+
+
+def _month_partition(lo: datetime) -> str:
+    hi = _add_months(lo, 1)
+    return (
+        f"CREATE TABLE agent_runs_y{lo:%Y}m{lo:%m} PARTITION OF agent_runs "
+        f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Out of the way, under names that do not collide with the new table's.
+    op.execute("ALTER TABLE agent_runs RENAME TO agent_runs_unpartitioned")
+    op.execute(
+        "ALTER TABLE agent_runs_unpartitioned "
+        "RENAME CONSTRAINT agent_runs_pkey TO agent_runs_unpartitioned_pkey"
+    )
+    op.drop_index("idx_agent_runs_queue", table_name="agent_runs_unpartitioned")
+    for name, _ in _INDEXES:
+        op.drop_index(name, table_name="agent_runs_unpartitioned")
+
+    op.execute(
+        """
+        CREATE TABLE agent_runs (
+            LIKE agent_runs_unpartitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    for column, target, on_delete in _FOREIGN_KEYS:
+        op.execute(
+            f"ALTER TABLE agent_runs ADD CONSTRAINT agent_runs_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES {target}(id) ON DELETE {on_delete}"
+        )
+
+    first = bind.execute(
+        sa.text("SELECT date_trunc('month', min(created_at) AT TIME ZONE 'UTC') FROM agent_runs_unpartitioned")
+    ).scalar()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = min(first or this_month, this_month)
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        op.execute(_month_partition(month.replace(tzinfo=timezone.utc)))
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE agent_runs_default PARTITION OF agent_runs DEFAULT")
+
+    op.execute("INSERT INTO agent_runs SELECT * FROM agent_runs_unpartitioned")
+    op.execute("DROP TABLE agent_runs_unpartitioned")
+
+    # On the parent, so every partition, present and future, gets them.
+    op.execute(
+        "CREATE INDEX idx_agent_runs_hot ON agent_runs (status, priority, created_at) "
+        "WHERE status IN ('queued', 'running')"
+    )
+    for name, column in _INDEXES:
+        op.create_index(name, "agent_runs", [column])
+
+    op.execute(
+        """
+        CREATE TABLE agent_runs_archive (
+            run_id uuid NOT NULL,
+            created_at timestamptz NOT NULL,
+            archived_at timestamptz NOT NULL DEFAULT now(),
+            result jsonb NOT NULL,
+            PRIMARY KEY (run_id),
+            FOREIGN KEY (run_id, created_at)
+                REFERENCES agent_runs (id, created_at) ON DELETE CASCADE
+        )
+        """
+    )
+    # lz4 needs Postgres 14 built with it. Without, TOAST's default pglz still
+    # compresses anything over a couple of kilobytes, which a trace always is.
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            ALTER TABLE agent_runs_archive ALTER COLUMN result SET COMPRESSION lz4;
+        EXCEPTION WHEN others THEN
+            RAISE NOTICE 'lz4 unavailable, agent_runs_archive.result uses pglz';
+        END $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE agent_runs RENAME TO agent_runs_partitioned")
+    op.execute(
+        "ALTER TABLE agent_runs_partitioned "
+        "RENAME CONSTRAINT agent_runs_pkey TO agent_runs_partitioned_pkey"
+    )
+    op.drop_index("idx_agent_runs_hot", table_name="agent_runs_partitioned")
+    for name, _ in _INDEXES:
+        op.drop_index(name, table_name="agent_runs_partitioned")
+
+    op.execute(
+        """
+        CREATE TABLE agent_runs (
+            LIKE agent_runs_partitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id)
+        )
+        """
+    )
+    for column, target, on_delete in _FOREIGN_KEYS:
+        op.execute(
+            f"ALTER TABLE agent_runs ADD CONSTRAINT agent_runs_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES {target}(id) ON DELETE {on_delete}"
+        )
+    op.execute("INSERT INTO agent_runs SELECT * FROM agent_runs_partitioned")
+    # Put the archived traces back where they came from.
+    op.execute(
+        "UPDATE agent_runs r SET result = a.result "
+        "FROM agent_runs_archive a WHERE a.run_id = r.id"
+    )
+    op.execute("DROP TABLE agent_runs_archive")
+    op.execute("DROP TABLE agent_runs_partitioned CASCADE")
+
+    op.create_index(
+        "idx_agent_runs_queue", "agent_runs", ["status", "priority", "run_after", "created_at"]
+    )
+    for name, column in _INDEXES:
+        op.create_index(name, "agent_runs", [column])
@@ -0,0 +1,31 @@
+"""Checkpoint a running query's progress on its run row.
+
+A question is several steps, two of them model calls, and a worker that died
+half way through left a retry to start again from the rewrite. The query graph
+now writes its state to agent_runs.checkpoint after each node, passages by
+chunk id rather than text so the row stays small, and a retried run resumes
+after the last node that completed. Null for every existing row, and cleared
+again when a run finishes.
+
+Revision ID: 20260819_agent_run_checkpoint
+Revises: 20260818_partition_agent_runs
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "20260819_agent_run_checkpoint"
+down_revision = "20260818_partition_agent_runs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "agent_runs",
+        sa.Column("checkpoint", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("agent_runs", "checkpoint")
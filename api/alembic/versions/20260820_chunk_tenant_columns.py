@@ -0,0 +1,56 @@
+"""Carry workspace and organization on chunks, so retrieval filters the chunk.
+
+WHY
+
+Every arm of hybrid_search found its tenant by joining chunks to files, while
+ix_chunks_embedding_hnsw is one HNSW graph over every tenant's vectors. As the
+table grows the planner has two bad choices for a small workspace: walk the
+graph and throw away the other tenants' rows afterwards, which leaves fewer
+than CANDIDATE_POOL candidates because the scan stops at ef_search, or give up
+on the index and scan sequentially.
+
+WHAT CHANGES
+
+  - chunks.workspace_id and chunks.organization_id, copied from the file and
+    its workspace, backfilled here and written at ingest. A document moved to
+    another workspace has its chunks rewritten in the same transaction.
+  - ix_chunks_workspace_id, which a small workspace's search can use on its own
+    to read exactly its own rows.
+  - hybrid_search filters on c.workspace_id, and on pgvector 0.8 or later the
+    vector arm runs with hnsw.iterative_scan, so a filtered HNSW scan keeps
+    walking until it has a full candidate pool instead of stopping short.
+
+Revision ID: 20260820_chunk_tenant_columns
+Revises: 20260819_agent_run_checkpoint
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260820_chunk_tenant_columns"
+down_revision = "20260819_agent_run_checkpoint"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("chunks", sa.Column("workspace_id", sa.Integer(), nullable=True))
+    op.add_column("chunks", sa.Column("organization_id", sa.Integer(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE chunks c
+        SET workspace_id = f.workspace_id,
+            organization_id = w.organization_id
+        FROM files f
+        LEFT JOIN workspaces w ON w.id = f.workspace_id
+        WHERE f.id = c.file_id
+        """
+    )
+
+    op.create_index("ix_chunks_workspace_id", "chunks", ["workspace_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chunks_workspace_id", table_name="chunks")
+    op.drop_column("chunks", "organization_id")
+    op.drop_column("chunks", "workspace_id")
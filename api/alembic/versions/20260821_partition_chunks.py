@@ -0,0 +1,181 @@
+"""Optionally partition chunks by organization.
+
+WHY
+
+20260820 put organization_id on every chunk and taught retrieval to filter on
+it, but chunks is still one table with one HNSW graph and one GIN index across
+every tenant. A dental practice with forty documents searches the same
+structures as a manufacturer with forty thousand, and pays for their size: the
+graph is deeper, the posting lists longer, the buffers the manufacturer keeps
+warm are not the practice's. Partitioning by organization gives each tenant
+(or a small group of them) its own heap and its own indexes, and a query that
+names the organization never opens anyone else's.
+
+WHAT CHANGES, WHEN ENABLED
+
+Nothing happens unless the deployment asks for it. Two settings, read once
+when this migration runs:
+
+    CHUNK_PARTITION_ORGS   organization ids that get a partition of their own,
+                           comma separated: the large tenants
+                           (chunks_org_<id>).
+    CHUNK_PARTITIONS       hash partitions for everyone else (chunks_shared_<n>),
+                           so each small tenant shares its heap and indexes with
+                           about 1/N of the others. 0 or unset for one shared
+                           partition.
+
+If both are unset the migration records itself and leaves the table alone.
+
+The layout is LIST on organization_id, one partition per listed organization,
+and a DEFAULT partition that is itself HASH partitioned when CHUNK_PARTITIONS
+is two or more. A chunk of a document in no workspace has no organization; it
+falls through to the default, and hash routes a null key to remainder zero.
+
+Every index on chunks is recreated on the parent from its own definition, so
+each partition gets its HNSW, GIN and btree indexes. There is no primary key
+any more: a unique constraint on a partitioned table has to include the
+partition key, and organization_id is null for a workspace-less document, so it
+cannot be part of one. ids still come from chunks_id_seq and stay unique in
+practice, ix_chunks_id serves lookups by id, and the model keeps id as its
+identity, as agent_runs does since 20260818.
+
+To change the layout later, downgrade to 20260820_chunk_tenant_columns and
+upgrade again with the new settings. Both directions copy the table in one
+statement inside the migration's transaction; the worker should be stopped for
+it, as for any migration that rewrites a table it writes to.
+
+Revision ID: 20260821_partition_chunks
+Revises: 20260820_chunk_tenant_columns
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260821_partition_chunks"
+down_revision = "20260820_chunk_tenant_columns"
+branch_labels = None
+depends_on = None
+
+_FOREIGN_KEYS = (
+    ("file_id", "files"),
+    ("segment_id", "segments"),
+)
+
+
+def _own_partitions() -> list:
+    raw = os.getenv("CHUNK_PARTITION_ORGS", "")
+    return sorted({int(p) for p in raw.replace(" ", "").split(",") if p})
+
+
+def _shared_partitions() -> int:
+    return int(os.getenv("CHUNK_PARTITIONS", "0") or 0)
+
+
+def _is_partitioned(bind) -> bool:
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'chunks'::regclass"
+    )).scalar())
+
+
+def _index_definitions(bind) -> list:
+    """(name, CREATE INDEX ...) for every index on chunks but the key."""
+    rows = bind.execute(sa.text(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = 'chunks' "
+        "AND indexname NOT IN ('chunks_pkey', 'ix_chunks_id')"
+    )).all()
+    return [(name, definition) for name, definition in rows]
+
+
+def _copyable_columns(bind, table: str) -> str:
+    # tsv is GENERATED ALWAYS; the new table computes it again on insert.
+    rows = bind.execute(sa.text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table "
+        "AND is_generated = 'NEVER' ORDER BY ordinal_position"
+    ), {"table": table}).scalars().all()
+    return ", ".join(rows)
+
+
+def _set_aside(bind, old: str) -> list:
+    """Rename chunks to `old` and drop its indexes; returns their definitions.
+
+    The definitions name the table as chunks, which is what it is called again
+    by the time they are replayed.
+    """
+    definitions = _index_definitions(bind)
+    op.execute(f"ALTER TABLE chunks RENAME TO {old}")
+    for name, _ in definitions:
+        op.execute(f"DROP INDEX {name}")
+    return definitions
+
+
+def _finish(bind, old: str, definitions: list) -> None:
+    for column, target in _FOREIGN_KEYS:
+        op.execute(
+            f"ALTER TABLE chunks ADD CONSTRAINT chunks_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES {target}(id) ON DELETE CASCADE"
+        )
+    columns = _copyable_columns(bind, old)
+    op.execute(f"INSERT INTO chunks ({columns}) SELECT {columns} FROM {old}")
+    # The id default points at the sequence the old table owns; dropping that
+    # table would take the sequence with it.
+    op.execute("ALTER SEQUENCE chunks_id_seq OWNED BY chunks.id")
+    op.execute(f"DROP TABLE {old}")
+    for _, definition in definitions:
+        op.execute(definition)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    own, shared = _own_partitions(), _shared_partitions()
+    if not own and shared < 2:
+        return
+    if _is_partitioned(bind):
+        return
+
+    definitions = _set_aside(bind, "chunks_unpartitioned")
+
+    op.execute(
+        """
+        CREATE TABLE chunks (
+            LIKE chunks_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED
+        ) PARTITION BY LIST (organization_id)
+        """
+    )
+    for org in own:
+        op.execute(f"CREATE TABLE chunks_org_{org} PARTITION OF chunks FOR VALUES IN ({org})")
+    if shared >= 2:
+        op.execute(
+            "CREATE TABLE chunks_shared PARTITION OF chunks DEFAULT "
+            "PARTITION BY HASH (organization_id)"
+        )
+        for n in range(shared):
+            op.execute(
+                f"CREATE TABLE chunks_shared_{n} PARTITION OF chunks_shared "
+                f"FOR VALUES WITH (MODULUS {shared}, REMAINDER {n})"
+            )
+    else:
+        op.execute("CREATE TABLE chunks_shared PARTITION OF chunks DEFAULT")
+
+    _finish(bind, "chunks_unpartitioned", definitions)
+    op.execute("CREATE INDEX ix_chunks_id ON chunks (id)")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if not _is_partitioned(bind):
+        return
+
+    definitions = _set_aside(bind, "chunks_partitioned")
+    op.execute("DROP INDEX IF EXISTS ix_chunks_id")
+    op.execute(
+        """
+        CREATE TABLE chunks (
+            LIKE chunks_partitioned INCLUDING DEFAULTS INCLUDING GENERATED,
+            PRIMARY KEY (id)
+        )
+        """
+    )
+    _finish(bind, "chunks_partitioned", definitions)
@@ -0,0 +1,85 @@
+"""Optionally index chunk embeddings at half precision or as bits.
+
+WHY
+
+ix_chunks_embedding_hnsw indexes 1024 float32 dimensions per chunk: 4 KB of
+vector for every entry before the graph's own links. The vector arm is only
+fast while that index is in shared buffers, and on a small server it stops
+fitting long before the corpus stops growing. After that every search reads
+the graph from disk.
+
+WHAT CHANGES, WHEN ENABLED
+
+CHUNK_VECTOR_INDEX, read when this migration runs, names the compact indexes
+to build in place of the float one:
+
+    halfvec   ix_chunks_embedding_halfvec, on embedding::halfvec(1024).
+              2 bytes a dimension, half the size, and ranks nearly the same.
+    bit       ix_chunks_embedding_bit, on binary_quantize(embedding), one bit a
+              dimension with Hamming distance. 32 times smaller, and coarse.
+
+Either or both, comma separated. Unset, the migration records itself and
+changes nothing.
+
+These are expression indexes. The column stays float32, because it is needed
+anyway: hybrid_search searches the compact index for an oversampled
+neighbourhood and rescores those rows with the exact cosine distance before
+fusion (AsyncFileRepository.OVERSAMPLE), so what changes is which rows are
+considered, never how they are ranked. Only the compact index has to be in
+memory; the full vectors are read from the heap for a few hundred rows.
+
+ix_chunks_embedding_hnsw is dropped when a compact index replaces it, since
+keeping it would keep its size on disk and its cost on every insert. The
+downgrade builds it again. Both need pgvector 0.7 or later.
+
+Revision ID: 20260822_compact_vector_index
+Revises: 20260821_partition_chunks
+"""
+import os
+
+from alembic import op
+
+revision = "20260822_compact_vector_index"
+down_revision = "20260821_partition_chunks"
+branch_labels = None
+depends_on = None
+
+_INDEXES = {
+    "halfvec": (
+        "CREATE INDEX IF NOT EXISTS ix_chunks_embedding_halfvec ON chunks "
+        "USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)"
+    ),
+    "bit": (
+        "CREATE INDEX IF NOT EXISTS ix_chunks_embedding_bit ON chunks "
+        "USING hnsw ((binary_quantize(embedding)::bit(1024)) bit_hamming_ops)"
+    ),
+}
+
+
+def _requested() -> list:
+    raw = os.getenv("CHUNK_VECTOR_INDEX", "").lower().replace(" ", "")
+    kinds = [k for k in raw.split(",") if k]
+    unknown = [k for k in kinds if k not in _INDEXES]
+    if unknown:
+        raise ValueError(f"CHUNK_VECTOR_INDEX: unknown index kind(s) {unknown}")
+    return kinds
+
+
+def upgrade() -> None:
+    kinds = _requested()
+    if not kinds:
+        return
+    for kind in kinds:
+        op.execute(_INDEXES[kind])
+    op.execute("DROP INDEX IF EXISTS ix_chunks_embedding_hnsw")
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_chunks_embedding_hnsw
+        ON chunks USING hnsw (embedding vector_cosine_ops)
+        """
+    )
+    for kind in _INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS ix_chunks_embedding_{kind}")
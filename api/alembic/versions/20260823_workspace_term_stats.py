@@ -0,0 +1,202 @@
+"""Per-workspace term statistics, so the text arm can be BM25.
+
+WHY
+
+The text arm ranked with ts_rank_cd, which scores how tightly a question's
+words cluster in a chunk and knows nothing about how rare a word is. The
+literal arm was added to make up for that for one kind of word, the identifying
+token (see _LITERAL_TOKEN in async_file_repository.py), and between them every
+search ran two ranking passes over every matching chunk, each computing cover
+density from the chunk's positions.
+
+BM25 needs two numbers ts_rank_cd never had: how many chunks in the workspace
+contain each term, and how long each chunk is against the average. Kept here,
+hybrid_search scores every matching chunk once, weighing "251" by its rarity
+and "pressure" by its commonness. The literal list is now a second ordering of
+those same scores rather than a second ranking pass.
+
+WHAT CHANGES
+
+  - chunks.term_count, generated: the number of term occurrences in the chunk,
+    counted from the same english tsvector as chunks.tsv.
+  - workspace_term_stats (workspace_id, lexeme, df): in how many of the
+    workspace's chunks each lexeme appears.
+  - workspace_text_stats (workspace_id, chunk_count, term_count): the corpus
+    size and total length that give N and the average chunk length.
+  - A statement-level trigger on chunks keeps both current. Chunks are inserted
+    by update_file_with_chunks, and deleted by delete_file_entry and by four
+    different foreign-key cascades (file, workspace, organization, user), and
+    moved by update_file_workspace. A trigger sees every one of those in one
+    place; code in each path would miss the cascades. It reads the statement's
+    transition tables, so a batch of five hundred chunks is one aggregate, not
+    five hundred updates.
+
+No foreign keys on the statistics. A workspace deleted by cascade has its
+chunks deleted in the same statement, and the trigger's decrement would then
+be referencing a row that is already gone. Instead a lexeme whose count reaches
+zero is deleted, so a workspace with no chunks has no statistics left.
+
+Concurrent ingests into the same workspace take row locks on the lexemes they
+share for the length of a batch's transaction. The rows are written in lexeme
+order, so they queue rather than deadlock.
+
+Revision ID: 20260823_workspace_term_stats
+Revises: 20260822_compact_vector_index
+"""
+from alembic import op
+
+revision = "20260823_workspace_term_stats"
+down_revision = "20260822_compact_vector_index"
+branch_labels = None
+depends_on = None
+
+# Applies one transition table's rows with a sign. Written out per operation
+# because a transition table only exists for the operations that declare it.
+_APPLY = """
+    INSERT INTO workspace_term_stats AS s (workspace_id, lexeme, df)
+    SELECT r.workspace_id, u.lexeme, {sign} count(*)
+    FROM {rows} r CROSS JOIN LATERAL unnest(r.tsv) AS u
+    WHERE r.workspace_id IS NOT NULL {only_changed}
+    GROUP BY r.workspace_id, u.lexeme
+    ORDER BY r.workspace_id, u.lexeme
+    ON CONFLICT (workspace_id, lexeme) DO UPDATE SET df = s.df + EXCLUDED.df;
+
+    INSERT INTO workspace_text_stats AS s (workspace_id, chunk_count, term_count)
+    SELECT r.workspace_id, {sign} count(*), {sign} coalesce(sum(r.term_count), 0)
+    FROM {rows} r
+    WHERE r.workspace_id IS NOT NULL {only_changed}
+    GROUP BY r.workspace_id
+    ORDER BY r.workspace_id
+    ON CONFLICT (workspace_id) DO UPDATE SET
+        chunk_count = s.chunk_count + EXCLUDED.chunk_count,
+        term_count = s.term_count + EXCLUDED.term_count;
+"""
+
+# An UPDATE that changed neither the workspace nor the text (re-embedding, a
+# new content_hash) leaves the statistics as they were.
+_CHANGED_FROM = (
+    "AND NOT EXISTS (SELECT 1 FROM {other} x WHERE x.id = r.id "
+    "AND x.workspace_id IS NOT DISTINCT FROM r.workspace_id AND x.tsv = r.tsv)"
+)
+
+_CLEAN = """
+    DELETE FROM workspace_term_stats WHERE df <= 0;
+    DELETE FROM workspace_text_stats WHERE chunk_count <= 0;
+"""
+
+
+def _function() -> str:
+    insert = _APPLY.format(sign="", rows="new_rows", only_changed="")
+    delete = _APPLY.format(sign="-", rows="old_rows", only_changed="")
+    update = (
+        _APPLY.format(sign="-", rows="old_rows", only_changed=_CHANGED_FROM.format(other="new_rows"))
+        + _APPLY.format(sign="", rows="new_rows", only_changed=_CHANGED_FROM.format(other="old_rows"))
+    )
+    return f"""
+    CREATE OR REPLACE FUNCTION maintain_workspace_term_stats() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {insert}
+        ELSIF TG_OP = 'DELETE' THEN
+            {delete}
+            {_CLEAN}
+        ELSE
+            {update}
+            {_CLEAN}
+        END IF;
+        RETURN NULL;
+    END $$
+    """
+
+
+def upgrade() -> None:
+    # Occurrences, not distinct lexemes: a lexeme's positions are its
+    # occurrences, and one stripped of positions counts once.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION tsvector_term_count(tsvector) RETURNS integer
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT coalesce(sum(coalesce(array_length(positions, 1), 1)), 0)::integer
+            FROM unnest($1)
+        $$
+        """
+    )
+    # From content rather than from tsv, because a generated column cannot
+    # read another one. Same configuration, so the same lexemes.
+    op.execute(
+        """
+        ALTER TABLE chunks
+        ADD COLUMN term_count integer
+        GENERATED ALWAYS AS (
+            tsvector_term_count(to_tsvector('english', coalesce(content, '')))
+        ) STORED
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TABLE workspace_term_stats (
+            workspace_id integer NOT NULL,
+            lexeme text NOT NULL,
+            df integer NOT NULL,
+            PRIMARY KEY (workspace_id, lexeme)
+        )
+        """
+    )
+    # Only ever holds rows on their way out, so the cleanup after a delete does
+    # not read the workspace's whole vocabulary to find them.
+    op.execute(
+        "CREATE INDEX ix_workspace_term_stats_spent ON workspace_term_stats (workspace_id) "
+        "WHERE df <= 0"
+    )
+    op.execute(
+        """
+        CREATE TABLE workspace_text_stats (
+            workspace_id integer PRIMARY KEY,
+            chunk_count integer NOT NULL,
+            term_count bigint NOT NULL
+        )
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO workspace_term_stats (workspace_id, lexeme, df)
+        SELECT c.workspace_id, u.lexeme, count(*)
+        FROM chunks c CROSS JOIN LATERAL unnest(c.tsv) AS u
+        WHERE c.workspace_id IS NOT NULL
+        GROUP BY c.workspace_id, u.lexeme
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO workspace_text_stats (workspace_id, chunk_count, term_count)
+        SELECT workspace_id, count(*), coalesce(sum(term_count), 0)
+        FROM chunks
+        WHERE workspace_id IS NOT NULL
+        GROUP BY workspace_id
+        """
+    )
+
+    op.execute(_function())
+    for operation, referencing in (
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("DELETE", "OLD TABLE AS old_rows"),
+        ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ):
+        op.execute(
+            f"CREATE TRIGGER chunks_term_stats_{operation.lower()} "
+            f"AFTER {operation} ON chunks REFERENCING {referencing} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION maintain_workspace_term_stats()"
+        )
+
+
+def downgrade() -> None:
+    for operation in ("insert", "delete", "update"):
+        op.execute(f"DROP TRIGGER IF EXISTS chunks_term_stats_{operation} ON chunks")
+    op.execute("DROP FUNCTION IF EXISTS maintain_workspace_term_stats()")
+    op.execute("DROP TABLE IF EXISTS workspace_text_stats")
+    op.execute("DROP TABLE IF EXISTS workspace_term_stats")
+    op.execute("ALTER TABLE chunks DROP COLUMN IF EXISTS term_count")
+    op.execute("DROP FUNCTION IF EXISTS tsvector_term_count(tsvector)")
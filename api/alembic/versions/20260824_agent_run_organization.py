@@ -0,0 +1,52 @@
+"""Record the organization a run belongs to on the run.
+
+The claim groups every queued and running run by organization, and worked the
+organization out on every claim: a join to workspaces, and for a run with no
+workspace a lookup of its user's own organization, per row per claim. It never
+changes for the life of a run, so enqueue_run now resolves it once and writes
+it here.
+
+Only the live queue is backfilled, because that is all the claim reads. Rows
+left null are still resolved the old way, so a run queued by a process that
+predates this column is claimed like any other.
+
+Revision ID: 20260824_agent_run_organization
+Revises: 20260823_workspace_term_stats
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260824_agent_run_organization"
+down_revision = "20260823_workspace_term_stats"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "agent_runs",
+        sa.Column(
+            "organization_id",
+            sa.Integer(),
+            sa.ForeignKey("organizations.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+    )
+    op.execute(
+        """
+        UPDATE agent_runs r
+        SET organization_id = COALESCE(
+            (SELECT w.organization_id FROM workspaces w WHERE w.id = r.workspace_id),
+            (SELECT m.organization_id
+             FROM organization_members m
+             WHERE m.user_id = r.user_id AND r.workspace_id IS NULL
+             ORDER BY (m.role = 'owner') DESC, m.id
+             LIMIT 1)
+        )
+        WHERE r.status IN ('queued', 'running')
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("agent_runs", "organization_id")
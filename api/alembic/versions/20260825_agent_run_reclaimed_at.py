@@ -0,0 +1,32 @@
+"""Record when a run's lease was last reclaimed.
+
+The queue metrics reported reclaims as the sum of `attempts` over runs created
+in the window. That missed a reclaim in the window of a run created before it,
+and counted a run's earlier reclaims again on every scrape until the run aged
+out. The lease sweeper now stamps the run when it reclaims it, and the metric
+counts the stamps that fall in the window.
+
+Null for every existing row: a reclaim that happened before this has no time
+to be counted at.
+
+Revision ID: 20260825_agent_run_reclaimed_at
+Revises: 20260824_agent_run_organization
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260825_agent_run_reclaimed_at"
+down_revision = "20260824_agent_run_organization"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "agent_runs",
+        sa.Column("reclaimed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("agent_runs", "reclaimed_at")
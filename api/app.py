@@ -14,7 +14,7 @@ import os
 import logging
 
 from api.core.log_safety import safe_text
-from .core.utils import decode_firebase_token
+from .core.utils import verify_firebase_token
 # Load environment variables
 load_dotenv()
 
@@ -262,7 +262,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             await websocket.close(code=1008, reason="Token required")
             return
 
-        success, user_info = decode_firebase_token(token)
+        success, user_info = await verify_firebase_token(token)
         if not success:
             await websocket.close(code=1008, reason="Invalid token")
             return
@@ -0,0 +1,86 @@
+"""Which workspaces a user may read, remembered for a minute.
+
+WHY
+
+accessible_workspace_ids is three queries, and it runs on nearly every request
+that touches documents: /search, sending a message, the worker answering it,
+every retrieval the query agent makes, listing history. The answer changes when
+somebody is added, removed, rescoped or promoted, or a workspace is created or
+deleted, which is a handful of times a week in a tenant that asks hundreds of
+questions a day.
+
+WHAT IS KEPT
+
+Per user and organization filter, the sorted id list, for TTL_SECONDS. Beside
+it, per user, an epoch: every change to that user's reach replaces the epoch,
+and an entry is only believed if it was written under the epoch that is
+current. core/epoch_cache keeps both and reads them in one MGET, so an
+authorised request costs one round trip to Redis, and it is the epoch that
+keeps an answer read before a change from being served after it.
+
+FAILING CLOSED
+
+This is authorisation, so a doubt is always resolved against the cache. A
+Redis that is unset, unreachable, slow or returning something unreadable
+means the database answers, and nothing is written back without an epoch to
+write it under. An entry without a current epoch is a miss. If an invalidation
+itself cannot reach Redis, the TTL is the bound on how long a removed member
+keeps reading, which is why it is short.
+
+Callers invalidate after their commit, never before it, or a read between the
+two caches the old answer under the new epoch.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from . import epoch_cache
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = int(os.getenv("ACCESS_CACHE_TTL", "60"))
+
+_KEY_PREFIX = "syntext:access:"
+
+
+def epoch_key(user_id: int) -> str:
+    """The key of this user's epoch, which every change to their reach replaces."""
+    return f"{_KEY_PREFIX}{int(user_id)}:epoch"
+
+
+def _entry_key(user_id: int, organization_id: Optional[int]) -> str:
+    scope = "all" if organization_id is None else int(organization_id)
+    return f"{_KEY_PREFIX}{int(user_id)}:{scope}"
+
+
+async def get(user_id: int, organization_id: Optional[int]) -> Tuple[Optional[List[int]], Optional[str]]:
+    """(workspace ids, epoch), as epoch_cache.get."""
+    if user_id is None:
+        return None, None
+    ids, epoch = await epoch_cache.get(epoch_key(user_id), _entry_key(user_id, organization_id))
+    if ids is None:
+        return None, epoch
+    return [int(w) for w in ids], epoch
+
+
+async def put(
+    user_id: int, organization_id: Optional[int], ids: List[int], epoch: Optional[str],
+) -> None:
+    """Keep this answer, under the epoch get returned before it was read."""
+    if epoch is None:
+        return
+    await epoch_cache.put(
+        _entry_key(user_id, organization_id), [int(w) for w in ids], epoch, TTL_SECONDS,
+    )
+
+
+async def invalidate(user_ids: Iterable[Optional[int]]) -> None:
+    """Forget what these users could read. Call after the change commits."""
+    users = sorted({int(u) for u in user_ids if u is not None})
+    if not await epoch_cache.renew(epoch_key(u) for u in users):
+        logger.error(
+            "Could not invalidate cached workspace access for users %s; it expires "
+            "within %ss", users, TTL_SECONDS,
+        )
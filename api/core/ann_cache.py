@@ -0,0 +1,303 @@
+"""Nearest neighbours for the busiest workspaces, answered in-process.
+
+WHY
+
+With the text arms on GIN and the vector arm on HNSW, hybrid_search is a
+handful of milliseconds of work, and for a busy workspace most of what is left
+of a /search is the vector arm's round trip and its walk of an index shared
+with every other tenant. A workspace of a few thousand chunks is a few
+megabytes of vectors. Held in the process, its nearest neighbours are a matrix
+product, and the vector arm becomes a list of ids handed to the SQL that still
+runs the text and literal arms and the fusion.
+
+WHAT IS HELD
+
+Per workspace, on first use: its chunk ids and unit-length float32 vectors,
+written to ANN_CACHE_DIR as .npy files and read back memory-mapped, so every
+worker process on the machine shares one copy in the page cache and a restart
+does not reload from Postgres. Up to ANN_BRUTE_FORCE_MAX chunks the search is
+brute force, which is exact. Past that, an hnswlib graph is built and saved
+beside the vectors if hnswlib is installed; otherwise the workspace stays on
+SQL. Past ANN_CACHE_MAX_CHUNKS nothing is held at all. At most
+ANN_CACHE_WORKSPACES workspaces stay loaded, least recently searched first out.
+
+The directory outlives what any one process holds, so it is bounded on its
+own: every load touches its workspace's files, and after it the workspaces
+least recently loaded by any process are deleted until the directory fits in
+ANN_CACHE_DIR_MB. Those held by this process are never deleted by it. A file
+deleted under another process's map stays readable to that process, which
+loads it from Postgres again the next time it needs it.
+
+The first search of a workspace starts the load in the background and is
+answered by SQL, so nobody waits for a cache to warm.
+
+WHEN IT IS STALE
+
+The version is the `syntext:docsver:` counter query_cache already bumps when a
+workspace's documents change, paired with an epoch kept in Redis. The epoch is
+there because a Redis restart resets every counter to zero, and a file written
+at version 3 before the restart must not be taken for version 3 after it. Both
+are read on every search, in one round trip. If Redis cannot be reached this
+returns None and SQL answers: without the counter there is no way to know the
+cache is current, and a cache that might be stale is worse than a slower one.
+
+Off unless ANN_CACHE is set. Every function here swallows its own errors.
+"""
+from __future__ import annotations
+
+import asyncio
+import glob
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .events import _get_client
+from .query_cache import _VERSION_PREFIX
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("ANN_CACHE", "").lower() in ("1", "true", "yes")
+CACHE_DIR = os.getenv("ANN_CACHE_DIR", "/tmp/syntext-ann")
+MAX_WORKSPACES = int(os.getenv("ANN_CACHE_WORKSPACES", "8"))
+# Exact search over this many 1024-dimension rows is a few milliseconds.
+BRUTE_FORCE_MAX = int(os.getenv("ANN_BRUTE_FORCE_MAX", "20000"))
+MAX_CHUNKS = int(os.getenv("ANN_CACHE_MAX_CHUNKS", "100000"))
+# Room for a few of the largest workspaces, at 1024 dimensions and float32.
+MAX_DIR_BYTES = int(os.getenv("ANN_CACHE_DIR_MB", "2048")) * 1024 * 1024
+# hnswlib's query-time breadth, as a multiple of the neighbours asked for.
+EF_FACTOR = 2
+
+_EPOCH_KEY = "syntext:ann:epoch"
+
+# (chunk_ids, vectors) for one workspace, at most `limit` of them.
+Loader = Callable[[int], Awaitable[Tuple[List[int], List[Any]]]]
+
+
+@dataclass
+class _Entry:
+    version: str
+    ids: Any = None
+    vectors: Any = None
+    index: Any = None
+    # Loaded, but too large to serve; remembered so it is not loaded again
+    # until the documents change.
+    usable: bool = True
+
+    def nearest(self, query: Any, k: int) -> List[Tuple[int, float]]:
+        """(chunk_id, cosine distance), nearest first."""
+        k = min(k, len(self.ids))
+        if k == 0:
+            return []
+        if self.index is not None:
+            self.index.set_ef(max(k * EF_FACTOR, 50))
+            labels, distances = self.index.knn_query(query, k=k)
+            return [
+                (int(self.ids[label]), float(distance))
+                for label, distance in zip(labels[0], distances[0])
+            ]
+        # Rows and query are unit length, so the product is cosine similarity
+        # and 1 - similarity is exactly what pgvector's <=> returns.
+        similarity = self.vectors @ query
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top])]
+        return [(int(self.ids[i]), float(1.0 - similarity[i])) for i in top]
+
+
+_entries: "OrderedDict[int, _Entry]" = OrderedDict()
+_loading: Dict[int, asyncio.Task] = {}
+
+
+def is_enabled() -> bool:
+    return ENABLED and NUMPY_AVAILABLE
+
+
+async def _version(workspace_id: int) -> Optional[str]:
+    """epoch:docsver for this workspace, or None if Redis cannot say."""
+    client = await _get_client()
+    if client is None:
+        return None
+    try:
+        epoch, docs = await client.mget([_EPOCH_KEY, f"{_VERSION_PREFIX}{int(workspace_id)}"])
+        if epoch is None:
+            await client.set(_EPOCH_KEY, uuid.uuid4().hex[:12], nx=True)
+            epoch = await client.get(_EPOCH_KEY)
+            if epoch is None:
+                return None
+        if isinstance(epoch, bytes):
+            epoch = epoch.decode()
+        return f"{epoch}-{int(docs or 0)}"
+    except Exception as e:
+        logger.warning("Could not read the ANN cache version: %s", e)
+        return None
+
+
+def _unit(vector: Any) -> Any:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+async def nearest(
+    workspace_id: int, query_embedding: List[float], k: int, *, load: Loader,
+) -> Optional[List[Tuple[int, float]]]:
+    """The k nearest chunks of this workspace, or None to ask Postgres.
+
+    None means not enabled, not loaded yet (a load is started), too large to
+    hold, or unable to confirm the cache is current.
+    """
+    if not is_enabled() or not query_embedding:
+        return None
+    try:
+        version = await _version(workspace_id)
+        if version is None:
+            return None
+        entry = _entries.get(workspace_id)
+        if entry is None or entry.version != version:
+            _entries.pop(workspace_id, None)
+            _start_load(workspace_id, version, load)
+            return None
+        _entries.move_to_end(workspace_id)
+        if not entry.usable:
+            return None
+        query = _unit(query_embedding)
+        return await asyncio.to_thread(entry.nearest, query, k)
+    except Exception as e:
+        logger.warning("ANN cache search failed for workspace %s: %s", workspace_id, e)
+        return None
+
+
+def _start_load(workspace_id: int, version: str, load: Loader) -> None:
+    running = _loading.get(workspace_id)
+    if running is not None and not running.done():
+        return
+    _loading[workspace_id] = asyncio.create_task(_load(workspace_id, version, load))
+
+
+def _paths(workspace_id: int, version: str) -> Dict[str, str]:
+    base = os.path.join(CACHE_DIR, f"ws{int(workspace_id)}-{version}")
+    return {"ids": base + ".ids.npy", "vectors": base + ".vectors.npy", "hnsw": base + ".hnsw"}
+
+
+def _save(path: str, array: Any) -> None:
+    # Written aside and renamed, so another process never maps half a file.
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as f:
+        np.save(f, array)
+    os.replace(partial, path)
+
+
+def _build(workspace_id: int, version: str, ids: List[int], rows: List[Any]) -> _Entry:
+    """Normalise, persist, map back and index. Runs in a thread."""
+    paths = _paths(workspace_id, version)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if not os.path.exists(paths["vectors"]):
+        vectors = np.vstack([np.asarray(r, dtype=np.float32) for r in rows])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        _save(paths["ids"], np.asarray(ids, dtype=np.int64))
+        _save(paths["vectors"], vectors / norms)
+    return _open(workspace_id, version)
+
+
+def _open(workspace_id: int, version: str) -> _Entry:
+    paths = _paths(workspace_id, version)
+    # Marks it as recently used, for _trim in this and every other process.
+    for path in paths.values():
+        if os.path.exists(path):
+            os.utime(path)
+    ids = np.load(paths["ids"], mmap_mode="r")
+    vectors = np.load(paths["vectors"], mmap_mode="r")
+    entry = _Entry(version=version, ids=ids, vectors=vectors)
+    if len(ids) > BRUTE_FORCE_MAX:
+        if not HNSWLIB_AVAILABLE:
+            entry.usable = False
+            return entry
+        index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+        if os.path.exists(paths["hnsw"]):
+            index.load_index(paths["hnsw"], max_elements=len(ids))
+        else:
+            index.init_index(max_elements=len(ids), ef_construction=200, M=16)
+            index.add_items(vectors, np.arange(len(ids)))
+            partial = f"{paths['hnsw']}.{os.getpid()}.partial"
+            index.save_index(partial)
+            os.replace(partial, paths["hnsw"])
+        entry.index = index
+    return entry
+
+
+def _forget_older(workspace_id: int, version: str) -> None:
+    keep = set(_paths(workspace_id, version).values())
+    for path in glob.glob(os.path.join(CACHE_DIR, f"ws{int(workspace_id)}-*")):
+        if path not in keep and not path.endswith(".partial"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _trim(keep: Iterable[int]) -> None:
+    """Delete the least recently loaded workspaces until CACHE_DIR fits in MAX_DIR_BYTES."""
+    keep = {f"ws{int(w)}" for w in keep}
+    workspaces: Dict[str, List[Tuple[str, os.stat_result]]] = {}
+    for path in glob.glob(os.path.join(CACHE_DIR, "ws*-*")):
+        if path.endswith(".partial"):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        workspaces.setdefault(os.path.basename(path).split("-", 1)[0], []).append((path, stat))
+
+    total = sum(stat.st_size for files in workspaces.values() for _, stat in files)
+    oldest_first = sorted(
+        workspaces.items(), key=lambda item: max(stat.st_mtime for _, stat in item[1])
+    )
+    for name, files in oldest_first:
+        if total <= MAX_DIR_BYTES:
+            break
+        if name in keep:
+            continue
+        for path, stat in files:
+            try:
+                os.remove(path)
+                total -= stat.st_size
+            except OSError:
+                pass
+
+
+async def _load(workspace_id: int, version: str, load: Loader) -> None:
+    try:
+        if os.path.exists(_paths(workspace_id, version)["vectors"]):
+            entry = await asyncio.to_thread(_open, workspace_id, version)
+        else:
+            ids, rows = await load(MAX_CHUNKS + 1)
+            if not ids or len(ids) > MAX_CHUNKS:
+                entry = _Entry(version=version, usable=False)
+            else:
+                entry = await asyncio.to_thread(_build, workspace_id, version, ids, rows)
+        await asyncio.to_thread(_forget_older, workspace_id, version)
+
+        _entries[workspace_id] = entry
+        _entries.move_to_end(workspace_id)
+        while len(_entries) > MAX_WORKSPACES:
+            _entries.popitem(last=False)
+        await asyncio.to_thread(_trim, list(_entries))
+    except Exception as e:
+        logger.warning("Could not load the ANN cache for workspace %s: %s", workspace_id, e)
+    finally:
+        _loading.pop(workspace_id, None)
@@ -32,6 +32,10 @@ valid Google account that their email is unknown to us, and would tell a real
 user whose row is missing that their credentials are wrong. Both are worse.
 
 Token verification itself lives in core/utils.get_user_id and is not repeated.
+Both halves are cached: a verified token until it expires, in process
+(core/utils.verify_firebase_token), and the email's user id in Redis
+(core/user_cache). A request with a token already seen costs no RSA check and
+no query here.
 """
 from __future__ import annotations
 
@@ -67,7 +71,7 @@ async def authenticate_user(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
         )
 
-    success, user_info = get_user_id(authorization)
+    success, user_info = await get_user_id(authorization)
     if not success or not user_info:
         logger.info("Token failed verification")
         raise HTTPException(
@@ -0,0 +1,96 @@
+"""Who is paying, remembered for a minute.
+
+WHY
+
+assert_can_ask runs before every question and every search, and
+assert_can_create_doc before every upload. Each looked the workspace's
+organization up and then its subscription status, and resolve_entitlement
+read every membership and then a status per organization. The answer changes
+when Stripe says so or when somebody joins or leaves a company, which is rare
+beside the number of times it is asked.
+
+WHAT IS KEPT
+
+Entries belong to a user or to an organization:
+
+    organization  its subscription status, for assert_can_ask and friends
+    user          their own subscription status, for a workspace-less check,
+                  and their resolved entitlement
+
+Each is written under the epoch of its owner and only believed while that
+epoch is current, through core/epoch_cache as core/access_cache is, and the
+entry and its epoch come back in one MGET. A user's epoch is the one access_cache already keeps:
+every membership change replaces it, and membership is all a user's answer
+depends on besides the subscriptions. So nothing that changes who belongs
+where has to remember this cache too.
+
+A subscription that changes, whether through the Stripe webhook or a checkout,
+goes through the user repository, which calls invalidate after committing with
+the organization, its members and the subscriber. The members matter: a staff
+member's resolved entitlement is their company's status, read on their behalf.
+
+ONLY PAYING ANSWERS ARE KEPT
+
+The repositories answer 'none' when the database fails, and an organization
+that is not paying is rarely asking anything. Keeping only 'active' and
+'trialing' means a database hiccup can never shut a paying customer out for a
+minute, and a customer who has just paid is let in at once even if an
+invalidation was lost. A lapse is the one direction that depends on
+invalidation, and TTL_SECONDS bounds it if Redis missed one.
+
+A Redis that is unset, down or returning something unreadable means the
+database answers, as before this existed.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Iterable, Optional, Tuple
+
+from . import access_cache, epoch_cache
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = int(os.getenv("ENTITLEMENT_CACHE_TTL", "60"))
+
+_KEY_PREFIX = "syntext:entitlement:"
+
+USER = "user"
+ORGANIZATION = "org"
+
+
+def _epoch_key(owner: str, owner_id: int) -> str:
+    if owner == USER:
+        return access_cache.epoch_key(owner_id)
+    return f"{_KEY_PREFIX}{owner}:{int(owner_id)}:epoch"
+
+
+def _entry_key(owner: str, owner_id: int, name: str) -> str:
+    return f"{_KEY_PREFIX}{owner}:{int(owner_id)}:{name}"
+
+
+async def get(owner: str, owner_id: int, name: str) -> Tuple[Optional[Any], Optional[str]]:
+    """(value, epoch), as epoch_cache.get."""
+    if owner_id is None:
+        return None, None
+    return await epoch_cache.get(_epoch_key(owner, owner_id), _entry_key(owner, owner_id, name))
+
+
+async def put(owner: str, owner_id: int, name: str, value: Any, epoch: Optional[str]) -> None:
+    """Keep this answer, under the epoch get returned before it was read."""
+    if epoch is None:
+        return
+    await epoch_cache.put(_entry_key(owner, owner_id, name), value, epoch, TTL_SECONDS)
+
+
+async def invalidate(
+    organization_ids: Iterable[Optional[int]] = (), user_ids: Iterable[Optional[int]] = (),
+) -> None:
+    """Forget what these organizations and users were entitled to. Call after the commit."""
+    organizations = sorted({int(o) for o in organization_ids if o is not None})
+    if not await epoch_cache.renew(_epoch_key(ORGANIZATION, o) for o in organizations):
+        logger.error(
+            "Could not invalidate cached entitlement for organizations %s; it "
+            "expires within %ss", organizations, TTL_SECONDS,
+        )
+    await access_cache.invalidate(user_ids)
@@ -0,0 +1,93 @@
+"""Entries that are only believed under the epoch they were written in.
+
+core/access_cache and core/entitlement_cache keep answers that a change
+elsewhere has to be able to take back at once. Each answer sits beside an
+epoch key belonging to whoever owns it, a user or an organization, and carries
+the epoch that was current when it was read from the database. A change
+replaces the epoch, which retires every entry written under the old one
+without having to know which entries exist.
+
+The epoch is read before the database is, in the same MGET as the entry, so a
+hit is one round trip. It is also what makes a fill safe against the change it
+raced: a change that commits and renews the epoch while the database read is
+in flight leaves the late entry under an epoch that is already gone, so it is
+never served. Deleting keys instead would let that late write land after the
+delete and be served for its full TTL.
+
+Every function here swallows its own errors. A Redis that is unset, down or
+returning something unreadable is a miss, and nothing is written back without
+an epoch to write it under.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Iterable, Optional, Tuple
+
+from .events import _get_client, is_enabled
+
+logger = logging.getLogger(__name__)
+
+# Outlives every entry written under the epoch before it, by a wide margin.
+_EPOCH_TTL_SECONDS = 86400
+
+
+async def get(epoch_key: str, entry_key: str) -> Tuple[Optional[Any], Optional[str]]:
+    """(value, epoch).
+
+    The value is None on a miss. The epoch is what put needs to store the
+    answer the caller reads instead, or None if nothing may be stored.
+    """
+    if not is_enabled():
+        return None, None
+    client = await _get_client()
+    if client is None:
+        return None, None
+    try:
+        epoch, raw = await client.mget([epoch_key, entry_key])
+        epoch = epoch or ""
+        if raw:
+            entry = json.loads(raw)
+            if entry.get("epoch") == epoch:
+                return entry.get("value"), epoch
+        return None, epoch
+    except Exception as e:
+        logger.warning("Could not read cached %s: %s", entry_key, e)
+        return None, None
+
+
+async def put(entry_key: str, value: Any, epoch: Optional[str], ttl: int) -> None:
+    """Keep this answer, under the epoch get returned before it was read."""
+    if epoch is None:
+        return
+    client = await _get_client()
+    if client is None:
+        return
+    try:
+        await client.set(entry_key, json.dumps({"epoch": epoch, "value": value}), ex=ttl)
+    except Exception as e:
+        logger.warning("Could not cache %s: %s", entry_key, e)
+
+
+async def renew(epoch_keys: Iterable[str]) -> bool:
+    """Replace these epochs, retiring everything written under them.
+
+    False if Redis could not be told, for the caller to log what that leaves
+    cached and for how long.
+    """
+    keys = list(epoch_keys)
+    if not keys or not is_enabled():
+        return True
+    client = await _get_client()
+    if client is None:
+        return True
+    try:
+        await asyncio.gather(*(
+            client.set(key, uuid.uuid4().hex, ex=_EPOCH_TTL_SECONDS) for key in keys
+        ))
+        return True
+    except Exception as e:
+        logger.warning("Could not renew %d cache epochs: %s", len(keys), e)
+        return False
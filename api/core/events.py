@@ -41,6 +41,21 @@ is a working product with a slower start.
 **An unset REDIS_URL means off, not broken.** A local checkout with no Redis
 running behaves exactly as it did before, and says so once rather than warning
 on every publish.
+
+POSTGRES AS THE WAKE PATH
+
+WORK_WAKE=postgres swaps Redis out of the work announcement only. The enqueue
+issues `pg_notify('syntext_work', run_id)` inside its own transaction, and
+Postgres delivers a notification at commit and not before, so the "publish after
+the commit" rule above holds by construction rather than by the order of two
+lines. A rolled-back enqueue announces nothing. The worker holds one dedicated
+asyncpg connection that LISTENs on the channel; it is outside the SQLAlchemy
+pool, because a pooled connection is handed back between uses and a LISTEN
+registered on it would be heard by whoever borrows it next, or by nobody.
+
+Client events (file ready, message received) stay on Redis either way. This is
+for deployments that want one fewer moving part between an enqueue and the
+worker, not a replacement for the pub/sub the API relays to browsers.
 """
 from __future__ import annotations
 
@@ -61,6 +76,18 @@ REDIS_URL = os.getenv("REDIS_URL", "").strip()
 WORK_CHANNEL = "syntext:work"
 CLIENT_CHANNEL = "syntext:client"
 
+# "redis" (the default) or "postgres". Read by enqueue_run and by the worker's
+# main(), which must agree: an API notifying through Postgres and a worker
+# listening on Redis hear nothing from each other, and fall back to the poll.
+WORK_WAKE = os.getenv("WORK_WAKE", "redis").strip().lower()
+
+# A Postgres channel is an identifier, so no colon.
+PG_WORK_CHANNEL = "syntext_work"
+
+# How often the LISTEN connection is pinged. asyncpg only notices a dead socket
+# when it next uses it, and an idle LISTEN connection otherwise never does.
+_PG_PING_SECONDS = 30
+
 # Short timeouts on purpose. Every call here sits in front of something a
 # customer is waiting on, so failing fast and falling back to the old behaviour
 # beats blocking an upload while a dead Redis is dialled.
@@ -76,6 +103,11 @@ def is_enabled() -> bool:
     return bool(REDIS_URL)
 
 
+def wakes_via_postgres() -> bool:
+    """Whether work is announced with NOTIFY rather than over Redis."""
+    return WORK_WAKE == "postgres"
+
+
 async def _get_client():
     """The process-wide client, built on first use."""
     global _client
@@ -137,6 +169,22 @@ async def announce_work(run_id: str) -> bool:
     return await _publish(WORK_CHANNEL, {"run_id": str(run_id)})
 
 
+async def notify_work(session, run_id: str) -> None:
+    """Queue a NOTIFY for `run_id` on the caller's open transaction.
+
+    Nothing is sent until that transaction commits, and nothing at all if it
+    rolls back. Unlike the rest of this module this can raise, and is meant to:
+    it shares a transaction with the enqueue, so a failure here is a failure of
+    that statement, and the caller already handles those.
+    """
+    from sqlalchemy import text
+
+    await session.execute(
+        text("SELECT pg_notify(:channel, :run_id)"),
+        {"channel": PG_WORK_CHANNEL, "run_id": str(run_id)},
+    )
+
+
 async def announce_client_event(
     user_id: int, event_type: str, data: Dict[str, Any]
 ) -> bool:
@@ -211,6 +259,81 @@ async def listen(
                     logger.debug("Could not close the subscription", exc_info=True)
 
 
+async def _connect_for_listen():
+    """A bare asyncpg connection with the same settings as the engine's."""
+    import asyncpg
+
+    from api.models.async_db import get_connect_args, get_database_url
+
+    args = get_connect_args()
+    args["server_settings"] = {
+        **args.get("server_settings", {}),
+        "application_name": f"syntextai-listen-{os.getpid()}",
+    }
+    # asyncpg takes a libpq URL, not SQLAlchemy's dialect-qualified one.
+    dsn = get_database_url().replace("postgresql+asyncpg://", "postgresql://", 1)
+    return await asyncpg.connect(dsn, **args)
+
+
+async def listen_postgres(
+    channel: str,
+    handler: Callable[[Dict[str, Any]], Awaitable[None]],
+) -> None:
+    """Run `handler` for every NOTIFY on `channel`, forever.
+
+    The Postgres counterpart of listen(), with the same promises: reconnects
+    with backoff, a failing handler never ends the loop, and it exits only on
+    cancellation. The handler gets `{"run_id": payload}`, the same shape the
+    Redis message has, so one handler serves both.
+
+    Notifications sent while the connection was down are gone, as with Redis.
+    The handler is called once on every (re)connect to cover that gap with a
+    single look rather than leaving it to the poll.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def _handle(payload: Dict[str, Any]) -> None:
+        try:
+            await handler(payload)
+        except Exception:
+            logger.exception("The handler for %s failed", channel)
+
+    def _on_notify(_conn, _pid, _channel, payload) -> None:
+        # asyncpg calls this synchronously from its protocol, so the handler
+        # runs as its own task rather than inside the callback.
+        loop.create_task(_handle({"run_id": payload}))
+
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            conn = await _connect_for_listen()
+            await conn.add_listener(channel, _on_notify)
+            logger.info("Listening for NOTIFY on %s", channel)
+            backoff = 1
+            await _handle({"run_id": None})
+
+            while True:
+                await asyncio.sleep(_PG_PING_SECONDS)
+                await conn.execute("SELECT 1")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(
+                "Lost the LISTEN connection for %s (%s), retrying in %ss",
+                channel, e, backoff,
+            )
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            if conn is not None:
+                try:
+                    await asyncio.wait_for(conn.close(), timeout=_CONNECT_TIMEOUT)
+                except Exception:
+                    conn.terminate()
+
+
 async def aclose() -> None:
     """Release the connection at shutdown."""
     await _reset_client()
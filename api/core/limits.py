@@ -2,6 +2,7 @@ from typing import Any, Dict, Optional
 
 from fastapi import HTTPException, status
 
+from . import entitlement_cache, workspace_organizations
 from ..repositories.repository_manager import RepositoryManager
 
 # An organization has a subscription or it has nothing.
@@ -23,11 +24,29 @@ _NO_SUBSCRIPTION = {
 }
 
 
-async def _get_subscription_status(store: RepositoryManager, user_id: int) -> str:
-    """Return the current subscription status string for a user.
+async def _cached_status(owner: str, owner_id: int, load) -> str:
+    """A subscription status from core/entitlement_cache, loaded on a miss.
 
-    Falls back to 'none' if no subscription is found.
+    Only a paying status is kept; see entitlement_cache for why.
     """
+    cached, epoch = await entitlement_cache.get(owner, owner_id, "status")
+    if cached is not None:
+        return cached
+    status_str = await load()
+    if _is_premium_plan(status_str):
+        await entitlement_cache.put(owner, owner_id, "status", status_str, epoch)
+    return status_str
+
+
+async def _organization_status(store: RepositoryManager, organization_id: int) -> str:
+    """Subscription status for an organization, 'none' when there is none."""
+    return await _cached_status(
+        entitlement_cache.ORGANIZATION, organization_id,
+        lambda: store.org_repo.get_subscription_status(organization_id),
+    )
+
+
+async def _load_subscription_status(store: RepositoryManager, user_id: int) -> str:
     subscription_data = await store.user_repo.get_subscription(user_id)
     if not subscription_data:
         return "none"
@@ -36,6 +55,16 @@ async def _get_subscription_status(store: RepositoryManager, user_id: int) -> st
     return subscription.get("status") or "none"
 
 
+async def _get_subscription_status(store: RepositoryManager, user_id: int) -> str:
+    """Return the current subscription status string for a user.
+
+    Falls back to 'none' if no subscription is found.
+    """
+    return await _cached_status(
+        entitlement_cache.USER, user_id, lambda: _load_subscription_status(store, user_id),
+    )
+
+
 def _is_premium_plan(status: str) -> bool:
     """Return True if the status represents an entitled (paid/trial) plan.
 
@@ -69,7 +98,22 @@ async def resolve_entitlement(store: RepositoryManager, user_id: int) -> Dict[st
         is_member_only  True if they belong to workspaces but own none. A pure
                         invitee. They must never be shown billing, and must
                         never be asked to fix somebody else's lapsed plan.
+
+    An entitled answer is cached per user (core/entitlement_cache) until their
+    memberships or one of their organizations' subscriptions change.
     """
+    cached, epoch = await entitlement_cache.get(entitlement_cache.USER, user_id, "entitlement")
+    if cached is not None:
+        return cached
+    entitlement = await _resolve_entitlement(store, user_id)
+    if entitlement["entitled"]:
+        await entitlement_cache.put(
+            entitlement_cache.USER, user_id, "entitlement", entitlement, epoch,
+        )
+    return entitlement
+
+
+async def _resolve_entitlement(store: RepositoryManager, user_id: int) -> Dict[str, Any]:
     memberships = await store.org_repo.get_memberships(user_id)
 
     # Read straight off organization_members. This used to be inferred from
@@ -84,7 +128,7 @@ async def resolve_entitlement(store: RepositoryManager, user_id: int) -> Dict[st
     ordered = administers + [m for m in memberships if m not in administers]
     for m in ordered:
         org_id = m["organization_id"]
-        org_status = await store.org_repo.get_subscription_status(org_id)
+        org_status = await _organization_status(store, org_id)
         if _is_premium_plan(org_status):
             return {
                 "entitled": True,
@@ -152,7 +196,13 @@ async def _organization_for_workspace(
     """Return the organization whose plan and usage govern this workspace."""
     if workspace_id is None:
         return None
-    return await store.org_repo.get_organization_for_workspace(workspace_id)
+    workspace_id = int(workspace_id)
+    known = workspace_organizations.known([workspace_id])
+    if workspace_id in known:
+        return known[workspace_id]
+    organization_id = await store.org_repo.get_organization_for_workspace(workspace_id)
+    workspace_organizations.remember({workspace_id: organization_id})
+    return organization_id
 
 
 async def _assert_subscribed(
@@ -166,7 +216,7 @@ async def _assert_subscribed(
     had already paid for.
     """
     if organization_id is not None:
-        status_str = await store.org_repo.get_subscription_status(organization_id)
+        status_str = await _organization_status(store, organization_id)
     else:
         status_str = await _get_subscription_status(store, user_id)
 
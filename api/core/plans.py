@@ -24,6 +24,10 @@ class Plan:
     # Charged per member beyond included_seats, in cents.
     overage_cents: int
     description: str
+    # Share of the worker this plan's organization gets when several are
+    # waiting at once. Relative, not a reservation: an organization alone in
+    # the queue gets everything whatever its weight. See fetch_pending_runs.
+    queue_weight: float = 1.0
 
     def seats_price_cents(self, members: int) -> int:
         """What Stripe will bill for `members` seats, in cents.
@@ -60,6 +64,7 @@ BUSINESS = Plan(
     included_seats=30,
     overage_cents=700,
     description="For multi-location groups, with a lower rate per added seat.",
+    queue_weight=2.0,
 )
 
 PLANS: Dict[str, Plan] = {p.key: p for p in (STARTER, BUSINESS)}
@@ -112,7 +112,8 @@ async def bump_document_version(workspace_id: Optional[int]) -> None:
     """Call when a workspace's documents change: ingested, deleted, moved.
 
     Every cached answer for the workspace becomes unreachable at once, because
-    the version is part of the key. The old entries are not deleted; they expire
+    the version is part of the key, and core/ann_cache stops serving the
+    vectors it holds for it. The old entries are not deleted; they expire
     on their own TTL, which is cheaper than finding them and no less correct.
     """
     if workspace_id is None:
@@ -0,0 +1,74 @@
+"""Email to user id, remembered, for authenticate_user.
+
+Every authenticated request turns the token's email into this system's user
+id, and that was a query against users on every call. The mapping only changes
+when an account is created or deleted, and both are here: add_user stores the
+new id, and delete_user_account forgets it after committing, so a deleted
+account's still-valid token stops resolving as soon as the row is gone.
+
+Only hits are kept. An email with no account is asked again every time,
+because the next request may well be the one that signs it up.
+
+Keys are a hash of the address, so the cache holds no customer email. Lookups
+are exact, like the query they stand in for.
+
+Every function here swallows its own errors. A Redis that is unset or down
+means users is asked, as before this existed.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from typing import Optional
+
+from .events import _get_client, is_enabled
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = int(os.getenv("USER_CACHE_TTL", "3600"))
+
+_KEY_PREFIX = "syntext:userid:"
+
+
+def _key(email: str) -> str:
+    return _KEY_PREFIX + hashlib.sha256(email.encode("utf-8")).hexdigest()
+
+
+async def get(email: str) -> Optional[int]:
+    if not email or not is_enabled():
+        return None
+    client = await _get_client()
+    if client is None:
+        return None
+    try:
+        raw = await client.get(_key(email))
+        return int(raw) if raw else None
+    except Exception as e:
+        logger.warning("Could not read a cached user id: %s", e)
+        return None
+
+
+async def put(email: str, user_id: int) -> None:
+    if not email or not is_enabled():
+        return
+    client = await _get_client()
+    if client is None:
+        return
+    try:
+        await client.set(_key(email), int(user_id), ex=TTL_SECONDS)
+    except Exception as e:
+        logger.warning("Could not cache a user id: %s", e)
+
+
+async def forget(email: Optional[str]) -> None:
+    """Call after the account is deleted."""
+    if not email or not is_enabled():
+        return
+    client = await _get_client()
+    if client is None:
+        return
+    try:
+        await client.delete(_key(email))
+    except Exception as e:
+        logger.error("Could not forget a cached user id; it expires within %ss: %s", TTL_SECONDS, e)
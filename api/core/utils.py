@@ -1,12 +1,16 @@
 from firebase_admin import auth
 import asyncio
+import hashlib
 import re
+import time
+from collections import OrderedDict
 from google.cloud import storage
 import logging
 from fastapi import UploadFile
-from llama_index.core.node_parser import SentenceSplitter as RecursiveTextSplitter
 from tiktoken import get_encoding
 import json
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import timedelta
 from urllib.parse import urlparse, unquote, quote
@@ -116,7 +120,8 @@ def generate_signed_url(file_url: str, ttl: timedelta = SIGNED_URL_TTL) -> Optio
         logger.error(f"Error signing URL for {object_path}: {e}")
         return None
 
-def decode_firebase_token(token):
+def _verify_firebase_token(token) -> Tuple[bool, Dict[str, Any], Optional[float]]:
+    """decode_firebase_token, plus the token's expiry for the cache below."""
     try:
         logger.debug("Decoding Firebase token...")
         # Verify the token
@@ -126,22 +131,62 @@ def decode_firebase_token(token):
         email = decoded_token.get('email', None)
         user_id = decoded_token.get('user_id', None)
         logger.info(f"Successfully decoded token for user: {email}")
-        return True, {'name': display_name, 'email': email, 'user_id': user_id}
+        return True, {'name': display_name, 'email': email, 'user_id': user_id}, decoded_token.get('exp')
     except auth.ExpiredIdTokenError:
         logger.error("Token has expired")
-        return False, {'error': 'Token has expired'}
+        return False, {'error': 'Token has expired'}, None
     except auth.InvalidIdTokenError as e:
         logger.error(f"Invalid Token Error: {e}")
-        return False, {'error': 'Invalid token'}
+        return False, {'error': 'Invalid token'}, None
     except Exception as e:
         logger.error(f"Unexpected error decoding token: {e}")
-        return False, {'error': str(e)}
+        return False, {'error': str(e)}, None
 
-def get_user_id(token):
+def decode_firebase_token(token):
+    success, user_info, _ = _verify_firebase_token(token)
+    return success, user_info
+
+# Tokens that have verified, by SHA-256 of the token, until the expiry the
+# token itself states. Every authenticated request verified its token again:
+# an RSA signature check, and now and then a fetch of Google's certificates,
+# run synchronously on the event loop, so every other request in the process
+# waited for it. A Firebase ID token is good for an hour and a client sends the
+# same one for all of it. Nothing is lost by remembering: verify_id_token is
+# called without check_revoked, so it never consulted revocation either, and
+# the expiry is the token's own.
+#
+# Per process, and hashed so a dump of the process holds no usable token.
+_verified_tokens: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_VERIFIED_TOKENS_MAX = 10_000
+
+async def verify_firebase_token(token: str) -> Tuple[bool, Dict[str, Any]]:
+    """decode_firebase_token, remembered until the token expires.
+
+    A token not seen before is verified in a thread, off the event loop.
+    """
+    if not token:
+        return False, {'error': 'Token required'}
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    remembered = _verified_tokens.get(key)
+    if remembered is not None:
+        expires, user_info = remembered
+        if time.time() < expires:
+            _verified_tokens.move_to_end(key)
+            return True, dict(user_info)
+        _verified_tokens.pop(key, None)
+
+    success, user_info, expires = await asyncio.to_thread(_verify_firebase_token, token)
+    if success and expires:
+        _verified_tokens[key] = (float(expires), dict(user_info))
+        while len(_verified_tokens) > _VERIFIED_TOKENS_MAX:
+            _verified_tokens.popitem(last=False)
+    return success, user_info
+
+async def get_user_id(token):
     try:
         logger.debug("Extracting user ID from token...")
         token = token.split("Bearer ")[1]
-        success, user_info = decode_firebase_token(token)
+        success, user_info = await verify_firebase_token(token)
         if success:
             logger.info(f"Successfully extracted user ID: {user_info['user_id']}")
         else:
@@ -442,6 +487,106 @@ def clean_text(text: str, content_type: str) -> str:
         text = re.sub(r'#.*?\n', '', text)
     return text.strip()
 
+@lru_cache(maxsize=1)
+def _encoding():
+    """cl100k_base, loaded once per process.
+
+    Both chunkers used to call get_encoding per page. tiktoken caches the
+    encoding itself, but the lookup, and the closure wrapped around it, were
+    rebuilt for every page of every document.
+    """
+    return get_encoding("cl100k_base")
+
+
+def _count_tokens(content: str) -> int:
+    return len(_encoding().encode(content, disallowed_special=()))
+
+
+# Where a chunk may end, best first, as (pattern, whether the break falls at
+# the end of the match rather than its start). A sentence ends after its
+# punctuation; a paragraph, a line or a word ends where the whitespace begins,
+# and that whitespace is stripped from both sides of the cut.
+_BREAKS = (
+    (re.compile(r"\n[ \t]*\n"), False),
+    (re.compile(r"[.!?][\"')\]]?(?=\s)"), True),
+    (re.compile(r"\n"), False),
+    (re.compile(r"[ \t]"), False),
+)
+
+
+def _split_on_tokens(text: str, chunk_tokens: int, overlap_tokens: int) -> List[str]:
+    """Cut text into pieces of at most `chunk_tokens`, overlapping by about
+    `overlap_tokens`, encoding the text exactly once.
+
+    This replaced llama-index's SentenceSplitter, which splits into sentences
+    and then words and re-tokenises every candidate while it merges them back
+    up to size, so a page was encoded many times over to be cut into three. On
+    a 69-page manual that was most of the CPU ingestion spends outside the
+    vision model.
+
+    Here the page is encoded once, every break is mapped to the token it falls
+    on, and each piece ends at the last break of the best kind that still
+    leaves it at least half full: a paragraph if there is one, else a sentence,
+    a line, a word, and only failing all of those mid-word at the budget. The
+    next piece starts at the earliest break of the best kind inside the overlap
+    window, so it opens on a sentence rather than half a word. Pieces are
+    slices of the original string, so nothing is re-joined or re-spaced.
+
+    evals/chunk_benchmark.py compares the boundaries against the splitter this
+    replaced on the benchmark corpora.
+    """
+    enc = _encoding()
+    tokens = enc.encode(text, disallowed_special=())
+    total = len(tokens)
+    if total <= chunk_tokens:
+        piece = text.strip()
+        return [piece] if piece else []
+
+    # Character offset of every token, plus one past the end, so a piece
+    # running from token a to token b is text[offsets[a]:offsets[b]].
+    _, offsets = enc.decode_with_offsets(tokens)
+    offsets.append(len(text))
+
+    breaks = [
+        sorted({
+            bisect_left(offsets, m.end() if at_end else m.start())
+            for m in pattern.finditer(text)
+        })
+        for pattern, at_end in _BREAKS
+    ]
+
+    pieces: List[str] = []
+    start = 0
+    while start < total:
+        limit = start + chunk_tokens
+        end = total
+        if limit < total:
+            end = limit
+            floor = start + chunk_tokens // 2
+            for points in breaks:
+                i = bisect_right(points, limit) - 1
+                if i >= 0 and points[i] > floor:
+                    end = points[i]
+                    break
+
+        piece = text[offsets[start]:offsets[end]].strip()
+        if piece:
+            pieces.append(piece)
+        if end >= total:
+            break
+
+        window = end - overlap_tokens
+        next_start = window
+        for points in breaks:
+            i = bisect_left(points, window)
+            if i < len(points) and points[i] < end:
+                next_start = points[i]
+                break
+        start = max(next_start, start + 1)
+
+    return pieces
+
+
 _TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
 
 
@@ -501,7 +646,7 @@ def _split_markdown_blocks(text: str) -> List[Dict[str, Any]]:
     return blocks
 
 
-def _chunk_table(block: Dict[str, Any], count_tokens, target_chunk_tokens: int) -> List[str]:
+def _chunk_table(block: Dict[str, Any], target_chunk_tokens: int) -> List[str]:
     """Cut a table on row boundaries, repeating its header in every piece.
 
     WHY THIS EXISTS
@@ -539,13 +684,13 @@ def _chunk_table(block: Dict[str, Any], count_tokens, target_chunk_tokens: int)
         return ["\n".join(caption + rows)]
 
     prefix = caption + header
-    prefix_tokens = count_tokens("\n".join(prefix))
+    prefix_tokens = _count_tokens("\n".join(prefix))
 
     out: List[str] = []
     current: List[str] = []
     current_tokens = prefix_tokens
     for row in body:
-        row_tokens = count_tokens(row)
+        row_tokens = _count_tokens(row)
         if current and current_tokens + row_tokens > target_chunk_tokens:
             out.append("\n".join(prefix + current))
             current = []
@@ -564,30 +709,16 @@ def chunk_markdown(text: str, target_chunk_tokens: int = 400) -> List[Dict[str,
     ordinary prose and that splitter handles it well; the prose questions in the
     HVAC benchmark score 4/4 on citations today and must not move.
     """
-    from tiktoken import get_encoding
-
-    enc = get_encoding("cl100k_base")
-
-    def count_tokens(content: str) -> int:
-        return len(enc.encode(content))
-
     blocks = _split_markdown_blocks(text)
     pieces: List[str] = []
     for block in blocks:
         if block["kind"] == "table":
-            pieces.extend(_chunk_table(block, count_tokens, target_chunk_tokens))
+            pieces.extend(_chunk_table(block, target_chunk_tokens))
             continue
         prose = "\n".join(block["lines"]).strip()
         if not prose:
             continue
-        if count_tokens(prose) <= target_chunk_tokens:
-            pieces.append(prose)
-            continue
-        splitter = RecursiveTextSplitter(
-            chunk_size=target_chunk_tokens,
-            chunk_overlap=int(target_chunk_tokens * 0.2),
-        )
-        pieces.extend(splitter.split_text(prose))
+        pieces.extend(_split_on_tokens(prose, target_chunk_tokens, int(target_chunk_tokens * 0.2)))
 
     return [
         {"content": p, "metadata": {"section": i + 1, "doc_type": "markdown"}}
@@ -603,8 +734,8 @@ def chunk_text(
     target_chunk_tokens: int = 400
 ) -> List[Dict[str, Any]]:
     """
-    Universal text chunker using LlamaIndex RecursiveTextSplitter for semantic splitting.
-    Produces overlapping chunks for RAG or QA.
+    Universal text chunker: token-budgeted pieces cut on paragraph and sentence
+    breaks, overlapping for RAG or QA. See _split_on_tokens.
     """
     try:
         if not text.strip():
@@ -614,13 +745,6 @@ def chunk_text(
         text = clean_text(text, content_type)
         logger.debug(f"Chunking {content_type} text of length {len(text)}")
 
-        # Use tiktoken for accurate token counting
-        
-        tiktoken_enc = get_encoding("cl100k_base")  # OpenAI's tokenizer, good approximation
-
-        def count_tokens(content: str) -> int:
-            return len(tiktoken_enc.encode(content))
-
         # chunk_size is in tokens. It used to be multiplied by four for PDFs,
         # so the splitter fired at 800 tokens against pages averaging about 520
         # and almost never fired: a chunk became a page, which nobody chose and
@@ -629,12 +753,7 @@ def chunk_text(
         # 400 with 20% overlap, the same for every format. A page becomes two or
         # three retrieval units instead of one, and the page is still what gets
         # cited because that is what a reader opens.
-        splitter = RecursiveTextSplitter(
-            chunk_size=target_chunk_tokens,
-            chunk_overlap=int(target_chunk_tokens * 0.2),
-        )
-
-        split_chunks = splitter.split_text(text)
+        split_chunks = _split_on_tokens(text, target_chunk_tokens, int(target_chunk_tokens * 0.2))
         chunks = [
             {"content": chunk, "metadata": {"section": i + 1, "doc_type": content_type}}
             for i, chunk in enumerate(split_chunks)
@@ -0,0 +1,33 @@
+"""Which organization owns a workspace, remembered for the life of the process.
+
+The billing checks in core/limits and the partition pruning in the file
+repository both turn a workspace into its organization on every request. A
+workspace never changes organization and ids are not reused, so an answer
+cannot go stale; a deleted workspace only leaves a harmless one behind. No
+Redis and no TTL: the memo is cleared wholesale if it ever grows past
+_MAX_ENTRIES, and refilled by the next few requests.
+
+Callers look up what is known, ask the database for the rest, and remember
+what it said. A workspace without an organization is not remembered.
+"""
+from typing import Dict, Iterable, Mapping, Optional
+
+_MAX_ENTRIES = 50_000
+
+_organizations: Dict[int, int] = {}
+
+
+def known(workspace_ids: Iterable[int]) -> Dict[int, int]:
+    """workspace id -> organization id, for those already remembered."""
+    return {
+        int(w): _organizations[int(w)] for w in workspace_ids if int(w) in _organizations
+    }
+
+
+def remember(organizations: Mapping[int, Optional[int]]) -> None:
+    """Keep these workspace id -> organization id answers."""
+    if len(_organizations) > _MAX_ENTRIES:
+        _organizations.clear()
+    for workspace_id, organization_id in organizations.items():
+        if organization_id is not None:
+            _organizations[int(workspace_id)] = int(organization_id)
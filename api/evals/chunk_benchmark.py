@@ -0,0 +1,123 @@
+"""The token chunker against the splitter it replaced, on the benchmark corpora.
+
+    python api/evals/chunk_benchmark.py --corpus /path/to/hvac --corpus /path/to/citation
+
+Each corpus is a directory of the PDFs its benchmark yaml lists. Every page is
+extracted with the same get_text call ingestion makes, cleaned the same way, and
+cut twice: once by llama-index's SentenceSplitter at 400 tokens with 20%
+overlap, which is what chunk_text did until it was replaced, and once by
+_split_on_tokens, which is what it does now.
+
+WHAT IT REPORTS, PER CORPUS
+
+    pages, chunks     how many of each, old and new
+    same count        pages cut into the same number of pieces
+    ends agree        chunk ends within 5% of the budget of an old chunk end
+    largest           the biggest chunk either produced, in tokens
+    time              wall clock for the whole corpus, each chunker
+
+"Equivalent" means the same count on nearly every page and ends that agree:
+retrieval was measured on the old cuts, and a chunker that moved them would be
+a retrieval change wearing a performance change's clothes. Byte-identical cuts
+are not the bar, because the old splitter's own boundaries depend on how it
+happened to merge sentences back up.
+
+No database and no model. It reads files and counts, so it runs anywhere the
+requirements are installed.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import List, Tuple
+
+import fitz
+from llama_index.core.node_parser import SentenceSplitter
+
+from api.core.utils import _count_tokens, _split_on_tokens, clean_text, detect_content_type
+
+CHUNK_TOKENS = 400
+OVERLAP_TOKENS = int(CHUNK_TOKENS * 0.2)
+# How far apart two chunk ends can sit and still count as the same cut.
+AGREE_CHARS = int(CHUNK_TOKENS * 0.05 * 4)
+
+
+def _pages(corpus: Path) -> List[str]:
+    pages = []
+    for pdf in sorted(corpus.glob("*.pdf")):
+        with fitz.open(pdf) as doc:
+            for page in doc:
+                text = page.get_text()
+                if text.strip():
+                    pages.append(clean_text(text, detect_content_type(text)))
+    return pages
+
+
+def _ends(page: str, pieces: List[str]) -> List[int]:
+    """Where each piece ends in the page, found by searching forward."""
+    ends, cursor = [], 0
+    for piece in pieces:
+        at = page.find(piece[:64], max(cursor - CHUNK_TOKENS * 8, 0))
+        if at < 0:
+            continue
+        cursor = at + len(piece)
+        ends.append(cursor)
+    return ends
+
+
+def _agreement(old: List[int], new: List[int]) -> Tuple[int, int]:
+    old = sorted(old)
+    hits = 0
+    for end in new:
+        i = bisect_left(old, end)
+        near = [old[j] for j in (i - 1, i) if 0 <= j < len(old)]
+        if any(abs(end - o) <= AGREE_CHARS for o in near):
+            hits += 1
+    return hits, len(new)
+
+
+def run(corpus: Path) -> None:
+    pages = _pages(corpus)
+    splitter = SentenceSplitter(chunk_size=CHUNK_TOKENS, chunk_overlap=OVERLAP_TOKENS)
+
+    t0 = time.perf_counter()
+    old = [splitter.split_text(p) for p in pages]
+    old_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new = [_split_on_tokens(p, CHUNK_TOKENS, OVERLAP_TOKENS) for p in pages]
+    new_s = time.perf_counter() - t0
+
+    same = sum(len(a) == len(b) for a, b in zip(old, new))
+    hits = total = 0
+    for page, a, b in zip(pages, old, new):
+        h, t = _agreement(_ends(page, a), _ends(page, b))
+        hits += h
+        total += t
+    largest_old = max((_count_tokens(c) for cs in old for c in cs), default=0)
+    largest_new = max((_count_tokens(c) for cs in new for c in cs), default=0)
+
+    print(f"\n{corpus.name}")
+    print(f"  pages          {len(pages)}")
+    print(f"  chunks         old {sum(map(len, old))}   new {sum(map(len, new))}")
+    print(f"  same count     {same}/{len(pages)}")
+    print(f"  ends agree     {hits}/{total}")
+    print(f"  largest        old {largest_old}   new {largest_new} tokens")
+    print(f"  time           old {old_s:.2f}s   new {new_s:.2f}s   ({old_s / max(new_s, 1e-9):.1f}x)")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", type=Path, action="append", required=True,
+                    help="a directory of PDFs; repeat for each corpus")
+    args = ap.parse_args()
+    for corpus in args.corpus:
+        run(corpus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
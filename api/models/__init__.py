@@ -2,4 +2,4 @@
 SQLAlchemy ORM models for the database tables.
 """
 
-from .orm_models import Base, User, Subscription, CardDetails, File, Workspace, Organization, OrganizationMember, Segment, PageRead, Chunk, ChatHistory, Message, MessageFeedback, AgentRun
+from .orm_models import Base, User, Subscription, CardDetails, File, Workspace, Organization, OrganizationMember, Segment, PageRead, Chunk, WorkspaceTermStats, WorkspaceTextStats, ChatHistory, Message, MessageFeedback, AgentRun, AgentRunArchive
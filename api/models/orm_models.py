@@ -2,7 +2,7 @@
 ORM models for database tables.
 This file contains SQLAlchemy ORM models extracted from the original docsynth_store.py.
 """
-from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, ForeignKey, Text, JSON, Float, Boolean, CheckConstraint, UniqueConstraint, TIMESTAMP, text, Enum, Index
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, DateTime, ForeignKey, ForeignKeyConstraint, Text, JSON, Float, Boolean, CheckConstraint, UniqueConstraint, TIMESTAMP, text, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -260,7 +260,12 @@ class File(Base):
     file_size_bytes = Column(Integer, nullable=True)  # Size of the original source file in bytes
 
     # Relationships
-    chunks = relationship("Chunk", back_populates="file", cascade="all, delete-orphan")
+    #
+    # passive_deletes on chunks: the database's ON DELETE CASCADE removes them,
+    # and the repositories delete them first by organization so a partitioned
+    # chunks table is touched in one partition. Without it, deleting a file
+    # loaded every chunk, embedding and all, to delete them one id at a time.
+    chunks = relationship("Chunk", back_populates="file", cascade="all, delete-orphan", passive_deletes=True)
     segments = relationship("Segment", back_populates="file", cascade="all, delete-orphan")
     user = relationship("User", back_populates="files")
     workspace = relationship("Workspace", back_populates="files")
@@ -284,7 +289,7 @@ class Segment(Base):
     file = relationship("File", back_populates="segments")
     
     # Relationship to chunks
-    chunks = relationship("Chunk", back_populates="segment", cascade="all, delete-orphan")
+    chunks = relationship("Chunk", back_populates="segment", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Segment(id={self.id}, file_id={self.file_id}, page_number={self.page_number}, content={self.content[:50]}...)>"
@@ -308,6 +313,10 @@ class PageRead(Base):
     # "vision", "text" or "ocr".
     source = Column(String(16), nullable=False)
     flags = Column(JSON, nullable=True)
+    # sha256 of the rendered PNG the vision model read. What lets the same
+    # page image in another file of the same organization skip the model.
+    # See alembic/versions/20260816_page_read_image_hash.py.
+    image_hash = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime, default=func.now(), nullable=False)
 
     __table_args__ = (
@@ -317,10 +326,29 @@ class PageRead(Base):
 
 class Chunk(Base):
     __tablename__ = "chunks"
-    
+    # Named as the migration creates it, so autogenerate does not propose a
+    # duplicate. See 20260820_chunk_tenant_columns.
+    __table_args__ = (
+        Index("ix_chunks_workspace_id", "workspace_id"),
+    )
+
+    # The model's identity. When chunks is partitioned by organization
+    # (20260821_partition_chunks) the table has no primary key, because one
+    # would have to include the nullable organization_id, and id is unique by
+    # its sequence alone.
     id = Column(Integer, primary_key=True, autoincrement=True)
     file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"))
     segment_id = Column(Integer, ForeignKey("segments.id", ondelete="CASCADE"))  # Link to the segment
+
+    # Copies of the file's workspace and that workspace's organization, so
+    # retrieval can filter on the chunk it is ranking instead of joining every
+    # candidate to files first. Written at ingest, and rewritten together with
+    # files.workspace_id when a document moves (update_file_workspace); both
+    # null for a document in no workspace. No foreign keys: the file's own
+    # cascade already removes these rows, and a second one would only add a
+    # check to every insert.
+    workspace_id = Column(Integer, nullable=True)
+    organization_id = Column(Integer, nullable=True)
     
     # Vector embedding for each chunk
     embedding = Column(Vector(1024), nullable=True)  # Example size (e.g., 1536 for OpenAI embeddings)
@@ -352,6 +380,33 @@ class Chunk(Base):
     def __repr__(self):
         return f"<Chunk(id={self.id}, file_id={self.file_id}, segment_id={self.segment_id}, embedding={self.embedding[:50]}...)>"
 
+class WorkspaceTermStats(Base):
+    """In how many of a workspace's chunks each lexeme appears: BM25's df.
+
+    Written only by the trigger on chunks (20260823_workspace_term_stats), never
+    by the application, so every path that adds or removes chunks, the
+    cascades included, keeps it current. No foreign key, for the reason given
+    there.
+    """
+    __tablename__ = "workspace_term_stats"
+    __table_args__ = (
+        Index("ix_workspace_term_stats_spent", "workspace_id", postgresql_where=text("df <= 0")),
+    )
+
+    workspace_id = Column(Integer, primary_key=True)
+    lexeme = Column(Text, primary_key=True)
+    df = Column(Integer, nullable=False)
+
+
+class WorkspaceTextStats(Base):
+    """A workspace's chunk count and total term count: BM25's N and avgdl."""
+    __tablename__ = "workspace_text_stats"
+
+    workspace_id = Column(Integer, primary_key=True)
+    chunk_count = Column(Integer, nullable=False)
+    term_count = Column(BigInteger, nullable=False)
+
+
 class ChatHistory(Base):
     __tablename__ = "chat_histories"
     # Declared here as well as in the migration, or autogenerate sees an index
@@ -439,15 +494,26 @@ class AgentRun(Base):
     # against idx_agent_runs_* in the database, so autogenerate proposed
     # dropping four live indexes and recreating identical ones under new names.
     #
-    # idx_agent_runs_queue is the one that matters: the worker's poll filters
-    # and orders on exactly these four columns and runs continuously, so losing
-    # it turns every poll into a sequential scan. It was invisible to the model
-    # entirely, which meant autogenerate wanted it gone with no replacement.
+    # idx_agent_runs_hot is the one that matters: the worker's claim and lease
+    # sweep read only queued and running rows, continuously. It is partial on
+    # exactly those, so it stays the size of the queue while the table grows by
+    # a row per question forever. It replaced idx_agent_runs_queue, which
+    # indexed every run ever written. See 20260818_partition_agent_runs.
+    #
+    # Range partitioned by month on created_at, so the database's primary key
+    # is (id, created_at). The model keeps id alone: ids are gen_random_uuid(),
+    # and a composite identity would make every session.get(AgentRun, run_id)
+    # in the worker need a timestamp it does not have.
     __table_args__ = (
-        Index("idx_agent_runs_queue", "status", "priority", "run_after", "created_at"),
+        Index(
+            "idx_agent_runs_hot", "status", "priority", "created_at",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
         Index("idx_agent_runs_user_id", "user_id"),
         Index("idx_agent_runs_file_id", "file_id"),
         Index("idx_agent_runs_chat_history_id", "chat_history_id"),
+        Index("idx_agent_runs_message_id", "message_id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
     id = Column(
@@ -466,11 +532,20 @@ class AgentRun(Base):
 
     payload = Column(JSONB, nullable=False)
     result = Column(JSONB, nullable=True)
+    # How far a running run has got: for a question, the query graph's state
+    # after its last completed node, passages by id rather than text. A run
+    # retried after its worker died resumes from here. Cleared when it finishes.
+    checkpoint = Column(JSONB, nullable=True)
 
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
     workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=True)
     file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), nullable=True)
     chat_history_id = Column(Integer, ForeignKey("chat_histories.id", ondelete="CASCADE"), nullable=True)
+    # Whose queue this run waits in: its workspace's organization, or for a run
+    # with no workspace its user's own. Resolved once by enqueue_run so the
+    # claim does not work it out per row per claim. Null on runs queued before
+    # 20260824_agent_run_organization, which the claim still resolves itself.
+    organization_id = Column(Integer, ForeignKey("organizations.id", ondelete="SET NULL"), nullable=True)
     # The answer this run produced, so a rating on that message can be read
     # next to what was retrieved. Nullable and never backfilled: runs from
     # before 20260808_message_feedback have no message to point at.
@@ -483,7 +558,15 @@ class AgentRun(Base):
     locked_by = Column(String, nullable=True)
     locked_at = Column(DateTime(timezone=True), nullable=True)
     lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    # When the lease sweeper last took this run back from a worker presumed
+    # dead. What the queue metrics count reclaims by.
+    reclaimed_at = Column(DateTime(timezone=True), nullable=True)
     run_after = Column(DateTime(timezone=True), nullable=True)
+    # Optional deadline to *start* by. A run with one is claimed ahead of every
+    # run without, earliest first, and starting after it is reported as an SLO
+    # breach. For surfaces where somebody is visibly waiting, such as a chat
+    # integration that shows nothing until the answer begins.
+    start_by = Column(DateTime(timezone=True), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
@@ -500,19 +583,46 @@ class AgentRun(Base):
             "priority": self.priority,
             "payload": self.payload,
             "result": self.result,
+            "checkpoint": self.checkpoint,
             "user_id": self.user_id,
             "workspace_id": self.workspace_id,
             "file_id": self.file_id,
             "chat_history_id": self.chat_history_id,
+            "organization_id": self.organization_id,
             "attempts": self.attempts,
             "max_attempts": self.max_attempts,
             "last_error": self.last_error,
             "locked_by": self.locked_by,
             "locked_at": self.locked_at,
             "lease_expires_at": self.lease_expires_at,
+            "reclaimed_at": self.reclaimed_at,
             "run_after": self.run_after,
+            "start_by": self.start_by,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
             "started_at": self.started_at,
             "finished_at": self.finished_at,
         }
+
+
+class AgentRunArchive(Base):
+    """The full result of a finished run, moved out of agent_runs when it ages.
+
+    agent_runs keeps the row, and of its result only cited_file_ids plus an
+    "archived" marker. The trace itself, tens of kilobytes per question, lives
+    here compressed, read by nothing but the feedback report and a person
+    investigating an old answer.
+    """
+    __tablename__ = "agent_runs_archive"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["run_id", "created_at"],
+            ["agent_runs.id", "agent_runs.created_at"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    run_id = Column(UUID(as_uuid=True), primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    result = Column(JSONB, nullable=False)
@@ -0,0 +1,119 @@
+"""Rendering PDF pages for the vision model, in other processes.
+
+Rendering a page to an image is pure CPU inside MuPDF, and it used to happen
+inside the vision slot, on the worker's event loop: the slot was held while the
+page rendered, then while the model read it, so the two were serialised per
+slot and every render stalled every other query on the worker for its duration.
+
+Here the pages queued for vision are rendered in a small process pool while
+earlier pages are with the model, and handed over through a bounded buffer. The
+model call is the only thing a slot waits on.
+
+The pool is spawned rather than forked, because forking a process with an event
+loop and open sockets copies both, and this module imports nothing heavier than
+fitz so a spawned child starts quickly. Each child opens the document once, from
+a path rather than from bytes, so a 58-page manual is not pickled 58 times.
+
+A child that dies, out of memory or with MuPDF crashing on a page, breaks the
+whole pool, and every later render would fail with it until the worker
+restarted. render_in_pool replaces a broken pool and tries the page once more
+on the new one.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# PNG is lossless and what every measurement so far was taken on. JPEG at 85 is
+# a fraction of the upload for a scanned page, and whether it costs any digits
+# is a benchmark question, so it is opt-in.
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "png").strip().lower()
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+
+# Rendering is milliseconds to a second a page against seconds to minutes for
+# the read, so two processes keep well ahead of the model.
+VISION_RENDER_PROCESSES = int(os.getenv("VISION_RENDER_PROCESSES", "2"))
+
+# How many rendered pages may wait for a vision slot. Bounded, because a
+# 150-dpi page is about a megabyte and a 500-page scan rendered all at once is
+# half a gigabyte held for nothing.
+VISION_PREFETCH = int(os.getenv("VISION_PREFETCH", "6"))
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+# The document a child process has open, as (path, doc). One at a time: a
+# child serves one extraction's pages in a row, and holding more would keep
+# deleted temp files open.
+_open_doc: Tuple[Optional[str], object] = (None, None)
+
+
+def image_format() -> Tuple[str, str]:
+    """The configured (format, mime type), falling back to PNG on a typo."""
+    fmt = "jpeg" if VISION_IMAGE_FORMAT in ("jpg", "jpeg") else "png"
+    return fmt, MIME_TYPES[fmt]
+
+
+def render_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, VISION_RENDER_PROCESSES),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_render_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Call from the worker's shutdown, alongside the other shared clients.
+
+    Given a pool, only that one is shut down, and only if it is still the
+    current one: every render that was in a broken pool fails at once, and
+    the second of them must not shut down the pool the first just replaced.
+    """
+    global _pool
+    if pool is not None and pool is not _pool:
+        return
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+async def render_in_pool(path: str, page_index: int, dpi: int, fmt: str, quality: int) -> bytes:
+    """render_page in the pool, on a fresh pool once if a child had died."""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = render_pool()
+        try:
+            return await loop.run_in_executor(
+                pool, render_page, path, page_index, dpi, fmt, quality,
+            )
+        except BrokenProcessPool:
+            shutdown_render_pool(pool)
+            if attempt:
+                raise
+            logger.warning(f"A render process died; retrying page {page_index + 1} on a new pool")
+
+
+def render_page(path: str, page_index: int, dpi: int, fmt: str, quality: int) -> bytes:
+    """Render one page to image bytes. Runs in a child process."""
+    import fitz
+
+    global _open_doc
+    open_path, doc = _open_doc
+    if open_path != path:
+        if doc is not None:
+            doc.close()
+        doc = fitz.open(path)
+        _open_doc = (path, doc)
+
+    pix = doc[page_index].get_pixmap(dpi=dpi)
+    if fmt == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=quality)
+    return pix.tobytes("png")
@@ -7,6 +7,8 @@ from ..core.utils import sanitize_extracted_text
 import os
 import asyncio
 import gc
+import hashlib
+import tempfile
 from typing import Dict, List, Any, Optional, Tuple
 from io import BytesIO
 import json
@@ -20,12 +22,90 @@ from api.repositories.repository_manager import RepositoryManager
 from api.processors.base_processor import FileProcessor
 from api.services.llm_service import (
     read_page,
-    VISION_CONCURRENCY,
+    vision_limiter,
+    VISION_CONCURRENCY_MAX,
     VISION_DPI,
 )
+from api.processors.page_render import (
+    image_format,
+    render_in_pool,
+    VISION_JPEG_QUALITY,
+    VISION_PREFETCH,
+)
 from api.core.utils import chunk_text
 logger = logging.getLogger(__name__)
 
+
+class PageReadWriter:
+    """Holds extracted pages briefly and writes them to `page_reads` in batches.
+
+    save_page_read per page was one session, one upsert and one commit per
+    page. For vision pages, at seconds each, that never mattered. For a scanned
+    document OCR lands hundreds of pages in a row, and hundreds of transactions
+    were most of what caching them cost.
+
+    The guarantee that made the cache worth having still holds: a page the
+    vision model was paid for is never held longer than `flush_seconds` before
+    it is written. A batch goes out at `flush_pages`, when the timer fires, and
+    on close, which extraction reaches on success, on failure and on
+    cancellation alike. OCR runs on the event loop, so the timer cannot fire in
+    the middle of an OCR run; those pages wait for the count or the close, and
+    losing some of them to a crash costs a few seconds of local CPU, not money.
+    """
+
+    FLUSH_PAGES = int(os.getenv("PAGE_READ_FLUSH_PAGES", "25"))
+    FLUSH_SECONDS = float(os.getenv("PAGE_READ_FLUSH_SECONDS", "2"))
+
+    def __init__(self, file_repo, file_id: int,
+                 flush_pages: Optional[int] = None, flush_seconds: Optional[float] = None):
+        self.file_repo = file_repo
+        self.file_id = int(file_id)
+        self.flush_pages = flush_pages or self.FLUSH_PAGES
+        self.flush_seconds = self.FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def add(self, page_number: int, text_value: str, source: str,
+                  flags: Optional[Dict] = None, image_hash: Optional[str] = None) -> None:
+        self._pending.append({
+            "page_number": page_number,
+            "text": text_value,
+            "source": source,
+            "flags": flags,
+            "image_hash": image_hash,
+        })
+        if len(self._pending) >= self.flush_pages:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_seconds)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write whatever is waiting. Never raises: this is a cache."""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await self.file_repo.save_page_reads(self.file_id, batch)
+            except Exception as e:
+                logger.warning(
+                    f"Could not cache {len(batch)} page(s) of file {self.file_id}: "
+                    f"{type(e).__name__}: {e}"
+                )
+
+    async def close(self) -> None:
+        # Flush first and cancel after. A timer already writing holds the lock,
+        # so this waits for it rather than cutting its batch off mid-statement.
+        await self.flush()
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+
+
 class PDFProcessor(FileProcessor):
     """
     Processor for PDF documents.
@@ -218,7 +298,17 @@ class PDFProcessor(FileProcessor):
             return True
         return True
 
-    async def _read_page_with_vision(self, page, text_layer: str):
+    def _render_for_vision(self, page) -> Optional[bytes]:
+        """The PNG the vision model is sent, or None if the page will not render."""
+        try:
+            return page.get_pixmap(dpi=VISION_DPI).tobytes("png")
+        except Exception as e:
+            logger.warning(f"Could not render page for vision: {type(e).__name__}")
+            return None
+
+    async def _read_page_with_vision(
+        self, page, text_layer: str, image: Optional[bytes] = None, mime_type: str = "image/png"
+    ):
         """Read a page with the vision model, and check its numbers.
 
         THE GUARDRAIL, AND THE PAGES IT MUST NOT BE APPLIED TO
@@ -260,13 +350,19 @@ class PDFProcessor(FileProcessor):
         in the wrong cell. That is why the model is chosen for accuracy first
         and this is a second line rather than a licence to use a cheap one.
 
+        `image` is the page already rendered, in `mime_type`, when it was
+        rendered ahead of the read; otherwise it is rendered here as PNG.
+
         Returns (markdown, flags). Empty markdown means fall back.
         """
+        if image is None:
+            image = self._render_for_vision(page)
+            if image is None:
+                return "", {}
         try:
-            pix = page.get_pixmap(dpi=VISION_DPI)
-            markdown = await read_page(pix.tobytes("png"), hint=text_layer)
+            markdown = await read_page(image, hint=text_layer, mime_type=mime_type)
         except Exception as e:
-            logger.warning(f"Could not render page for vision: {type(e).__name__}")
+            logger.warning(f"Vision read failed: {type(e).__name__}")
             return "", {}
 
         if not markdown:
@@ -343,12 +439,16 @@ class PDFProcessor(FileProcessor):
             except Exception as e:
                 logger.warning(f"Could not read cached pages for file {file_id}: {e}")
 
-        async def remember(n: int, text_value: str, source: str, flags: Optional[Dict] = None):
-            if file_id is None:
+        writer = (
+            PageReadWriter(self.store.file_repo, int(file_id))
+            if file_id is not None else None
+        )
+
+        async def remember(n: int, text_value: str, source: str, flags: Optional[Dict] = None,
+                           image_hash: Optional[str] = None):
+            if writer is None:
                 return
-            await self.store.file_repo.save_page_read(
-                int(file_id), n, text_value, source, flags
-            )
+            await writer.add(n, text_value, source, flags, image_hash)
 
         try:
             with fitz.open(stream=pdf_data, filetype="pdf") as doc:
@@ -374,37 +474,101 @@ class PDFProcessor(FileProcessor):
 
                 # Concurrently, because a page takes about 146 seconds and
                 # doing 112 of them one after another is four and a half hours
-                # for one corpus. The cap exists because the far end is a
-                # shared inference endpoint and this runs inside a worker slot
-                # that other tenants are queued behind.
+                # for one corpus. How many reach the endpoint at once is
+                # decided inside read_page by vision_limiter, which is shared
+                # with every other document on this worker and follows what the
+                # provider is serving. Rendering happens in other processes,
+                # ahead of the reads, so a slot never waits on MuPDF.
                 if needs_vision:
                     logger.info(
                         f"Reading {len(needs_vision)} of {doc.page_count} pages with "
-                        f"the vision model, {VISION_CONCURRENCY} at a time"
+                        f"the vision model, starting at {int(vision_limiter.limit)} at a time"
                     )
-                    gate = asyncio.Semaphore(VISION_CONCURRENCY)
-
-                    async def read_one(n: int):
-                        async with gate:
-                            markdown, flags = await self._read_page_with_vision(doc[n - 1], layer[n])
-                        # Saved here rather than after the gather, because the
-                        # gather is the hour that keeps getting interrupted.
+                    fmt, mime_type = image_format()
+                    reused: set = set()
+
+                    # Spooled to disk once, so each render process opens the
+                    # document from a path rather than being sent it per page.
+                    spool = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+                    spool.write(pdf_data)
+                    spool.close()
+
+                    # Pages rendered ahead of the reads, oldest first. Bounded,
+                    # so rendering runs at most VISION_PREFETCH pages ahead of
+                    # what the model has taken.
+                    rendered: asyncio.Queue = asyncio.Queue(maxsize=VISION_PREFETCH)
+
+                    async def render(n: int) -> Optional[bytes]:
+                        try:
+                            return await render_in_pool(
+                                spool.name, n - 1, VISION_DPI, fmt, VISION_JPEG_QUALITY,
+                            )
+                        except Exception as e:
+                            logger.warning(f"Could not render page {n} for vision: {type(e).__name__}")
+                            return None
+
+                    async def produce():
+                        for n in needs_vision:
+                            await rendered.put((n, asyncio.ensure_future(render(n))))
+                        for _ in range(VISION_CONCURRENCY_MAX):
+                            await rendered.put(None)
+
+                    async def read_one(n: int, image: bytes):
+                        # The same pixels get the same transcription, so a page
+                        # this organization has already had read, in this file
+                        # or any other, is not bought again.
+                        image_hash = hashlib.sha256(image).hexdigest()
+                        prior = None
+                        if file_id is not None:
+                            prior = await self.store.file_repo.vision_read_for_image(
+                                int(file_id), image_hash
+                            )
+                        if prior:
+                            markdown, flags = prior["text"], prior["flags"]
+                            reused.add(n)
+                        else:
+                            markdown, flags = await self._read_page_with_vision(
+                                doc[n - 1], layer[n], image=image, mime_type=mime_type
+                            )
+                        # Saved here rather than after every page is read,
+                        # because that is the hour that keeps getting
+                        # interrupted.
                         if markdown:
-                            await remember(n, markdown, "vision", flags)
+                            await remember(n, markdown, "vision", flags, image_hash)
                         return n, (markdown, flags)
 
-                    # return_exceptions, because a bare gather aborts on the
-                    # first failure: it returns the moment one page raises,
-                    # while its siblings are still mid-call. Every page already
-                    # read but not yet saved was lost with it, and the whole
-                    # document then fell into the handler below and extracted
-                    # nothing. One page that the vision endpoint refused should
-                    # cost that page its markdown and nothing else, because the
-                    # text layer for it is still right there.
+                    # One failure per page, never per document. A bare gather
+                    # used to abort on the first page that raised, while its
+                    # siblings were still mid-call: every page already read but
+                    # not yet saved was lost with it, and the whole document
+                    # then fell into the handler below and extracted nothing.
+                    # One page that the vision endpoint refused should cost that
+                    # page its markdown and nothing else, because the text layer
+                    # for it is still right there.
+                    outcomes: List[Any] = []
+
+                    async def consume():
+                        while (item := await rendered.get()) is not None:
+                            n, pending = item
+                            try:
+                                image = await pending
+                                outcomes.append(
+                                    await read_one(n, image) if image else (n, ("", {}))
+                                )
+                            except Exception as e:
+                                outcomes.append(e)
+
+                    # As many readers as the limiter could ever admit. How many
+                    # are actually with the model is its decision, not this one.
+                    try:
+                        await asyncio.gather(
+                            produce(), *(consume() for _ in range(VISION_CONCURRENCY_MAX))
+                        )
+                    finally:
+                        os.unlink(spool.name)
+
                     failed = 0
-                    for outcome in await asyncio.gather(
-                        *(read_one(n) for n in needs_vision), return_exceptions=True
-                    ):
+                    for outcome in outcomes:
                         if isinstance(outcome, BaseException):
                             failed += 1
                             logger.warning(f"A page could not be read by vision: {outcome}")
@@ -421,6 +585,16 @@ class PDFProcessor(FileProcessor):
                             f"{failed} of {len(needs_vision)} pages fell back to the "
                             f"text layer because the vision call failed"
                         )
+                    if reused:
+                        logger.info(
+                            f"{len(reused)} of {len(needs_vision)} page image(s) were "
+                            f"already read for this organization and were not sent again"
+                        )
+
+                # Every vision page is bought by now. OCR below blocks the loop,
+                # so write them before it starts rather than after it ends.
+                if writer is not None:
+                    await writer.flush()
 
                 for page_num in range(1, doc.page_count + 1):
                     text = layer[page_num]
@@ -473,6 +647,9 @@ class PDFProcessor(FileProcessor):
         except Exception as e:
             logger.error(f"Error extracting text (Tesseract fallback): {e}", exc_info=True)
             return []
+        finally:
+            if writer is not None:
+                await writer.close()
     
     async def extract_content(self, **kwargs) -> Dict[str, Any]:
         """
@@ -2,20 +2,132 @@
 
 from __future__ import annotations
 
+from datetime import datetime, timedelta
 from typing import Any, Dict, Optional
 import uuid
 
 import logging
 
-from sqlalchemy import select
+from sqlalchemy import select, text, update
 from sqlalchemy.exc import IntegrityError
 
 from .async_base_repository import AsyncBaseRepository
-from ..core.events import announce_work
+from ..core.events import announce_work, notify_work, wakes_via_postgres
 from ..models import AgentRun as AgentRunORM
 
 logger = logging.getLogger(__name__)
 
+# Moves the full result of finished runs past the retention window into
+# agent_runs_archive, leaving cited_file_ids (which the usage dashboard reads)
+# and a marker on the row. One batch per execution; locked rows are skipped.
+_ARCHIVE_SQL = text(
+    """
+    WITH old AS (
+        SELECT id, created_at, result
+        FROM agent_runs
+        WHERE created_at < :cutoff
+          AND status IN ('succeeded', 'failed')
+          AND result IS NOT NULL
+          AND result ->> 'archived' IS NULL
+        ORDER BY created_at
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        INSERT INTO agent_runs_archive (run_id, created_at, result)
+        SELECT id, created_at, result FROM old
+        ON CONFLICT (run_id) DO NOTHING
+    )
+    UPDATE agent_runs r
+    SET result = jsonb_build_object('archived', true)
+                 || jsonb_strip_nulls(
+                        jsonb_build_object('cited_file_ids', old.result -> 'cited_file_ids')
+                    )
+    FROM old
+    WHERE r.id = old.id AND r.created_at = old.created_at
+    """
+)
+
+# The organization a run is queued under: its workspace's, or for a question
+# across everything, its user's own. Resolved once at enqueue and stored on the
+# run, rather than by the claim for every live row on every pass.
+_RUN_ORGANIZATION_SQL = text(
+    """
+    SELECT COALESCE(
+        (SELECT w.organization_id FROM workspaces w WHERE w.id = :workspace_id),
+        (SELECT m.organization_id
+         FROM organization_members m
+         WHERE m.user_id = :user_id AND CAST(:workspace_id AS integer) IS NULL
+         ORDER BY (m.role = 'owner') DESC, m.id
+         LIMIT 1)
+    )
+    """
+)
+
+# The live queue by status, run type and organization. The organization is the
+# one stored on the run, or for a run queued before it was stored, worked out
+# the way the claim works it out.
+_LIVE_METRICS_SQL = text(
+    """
+    SELECT r.status, r.run_type,
+           COALESCE(r.organization_id, w.organization_id, own.organization_id) AS org_id,
+           count(*) AS n,
+           max(extract(epoch FROM (:now - r.created_at)))
+               FILTER (WHERE r.status = 'queued') AS oldest_seconds
+    FROM agent_runs r
+    LEFT JOIN workspaces w ON r.organization_id IS NULL AND w.id = r.workspace_id
+    LEFT JOIN LATERAL (
+        SELECT m.organization_id
+        FROM organization_members m
+        WHERE r.organization_id IS NULL AND r.workspace_id IS NULL
+          AND m.user_id = r.user_id
+        ORDER BY (m.role = 'owner') DESC, m.id
+        LIMIT 1
+    ) own ON true
+    WHERE r.status IN ('queued', 'running')
+    GROUP BY 1, 2, 3
+    """
+)
+
+# What happened in the window, per run type: claims, reclaims, and the
+# distribution of queue wait and run time. Reclaims are runs the lease sweeper
+# took back in the window, by reclaimed_at, so a run taken back twice in one
+# window counts once. The created_at bound lets the planner skip every month
+# but the last one or two; a run created longer than :horizon ago is not
+# counted, and is a page of its own long before that.
+_WINDOW_METRICS_SQL = text(
+    """
+    SELECT run_type,
+           count(*) FILTER (WHERE started_at >= :since) AS claimed,
+           percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (
+               ORDER BY extract(epoch FROM (started_at - created_at))
+           ) FILTER (WHERE started_at >= :since) AS wait,
+           count(*) FILTER (WHERE finished_at >= :since AND started_at IS NOT NULL) AS finished,
+           percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (
+               ORDER BY extract(epoch FROM (finished_at - started_at))
+           ) FILTER (WHERE finished_at >= :since AND started_at IS NOT NULL) AS duration,
+           count(*) FILTER (WHERE reclaimed_at >= :since) AS reclaims
+    FROM agent_runs
+    WHERE created_at >= :horizon
+      AND (created_at >= :since OR started_at >= :since OR finished_at >= :since
+           OR reclaimed_at >= :since)
+    GROUP BY run_type
+    """
+)
+
+# Only one replica needs to do this, and two at once would race to create the
+# same partition.
+_MAINTENANCE_LOCK = "SELECT pg_try_advisory_xact_lock(hashtext('agent_runs_maintenance'))"
+
+# How long creating a partition may wait for its lock on agent_runs. Waiting
+# longer queues every enqueue and claim behind the waiting DDL.
+_DDL_LOCK_TIMEOUT = "2s"
+
+
+def _add_months(d: datetime, n: int) -> datetime:
+    y, m = divmod(d.month - 1 + n, 12)
+    return d.replace(year=d.year + y, month=m + 1)
+
 
 class AsyncAgentRunRepository(AsyncBaseRepository):
     """Async repository for durable agent run enqueuing."""
@@ -33,9 +145,19 @@ class AsyncAgentRunRepository(AsyncBaseRepository):
         chat_history_id: Optional[int] = None,
         priority: int = 100,
         max_attempts: int = 3,
+        start_within: Optional[float] = None,
     ) -> Optional[str]:
+        """Queue a run and tell the worker. Returns its id, or None on failure.
+
+        `start_within` is a deadline in seconds for the run to *start*. Runs
+        with one are claimed ahead of every run without; leave it unset unless
+        somebody is visibly waiting on this particular run.
+        """
         async with self.get_async_session() as session:
             try:
+                organization_id = (await session.execute(
+                    _RUN_ORGANIZATION_SQL, {"workspace_id": workspace_id, "user_id": user_id}
+                )).scalar()
                 run = AgentRunORM(
                     run_type=run_type,
                     agent_name=agent_name,
@@ -47,13 +169,24 @@ class AsyncAgentRunRepository(AsyncBaseRepository):
                     workspace_id=workspace_id,
                     file_id=file_id,
                     chat_history_id=chat_history_id,
+                    organization_id=organization_id,
                     max_attempts=max_attempts,
                     attempts=0,
+                    start_by=(
+                        datetime.utcnow() + timedelta(seconds=start_within)
+                        if start_within is not None else None
+                    ),
                 )
                 session.add(run)
                 await session.flush()
                 run_id = str(run.id)
+                if wakes_via_postgres():
+                    # Delivered by Postgres at the commit below, so the row is
+                    # visible before anyone hears about it.
+                    await notify_work(session, run_id)
                 await session.commit()
+                if wakes_via_postgres():
+                    return run_id
 
                 # Tap the worker on the shoulder, strictly after the commit.
                 # Before it, the worker can wake, run its SELECT against a row
@@ -72,3 +205,132 @@ class AsyncAgentRunRepository(AsyncBaseRepository):
                 logger.error(f"Error enqueuing agent run: {e}", exc_info=True)
                 return None
 
+
+    async def run_maintenance(
+        self,
+        *,
+        months_ahead: int = 3,
+        archive_after_days: int = 90,
+        batch: int = 500,
+        max_batches: int = 20,
+    ) -> Dict[str, int]:
+        """Keep agent_runs' partitions ahead of time and its old traces archived.
+
+        Two jobs, both idempotent and both cheap when there is nothing to do:
+
+          - create the monthly partitions for this month and `months_ahead`
+            after it, so new rows land in their own month rather than the
+            default partition
+          - move the result of finished runs older than `archive_after_days`
+            into agent_runs_archive, up to `max_batches` batches a call
+
+        Every partition and every batch is its own transaction. CREATE TABLE
+        ... PARTITION OF locks agent_runs against every enqueue and claim until
+        it commits; this used to create them and then archive up to twenty
+        batches in the same transaction, so the queue stood still for the whole
+        archive. Now the lock lasts one statement, and gives up after
+        _DDL_LOCK_TIMEOUT rather than queueing everyone behind a long
+        transaction it is waiting for.
+
+        Each transaction takes the advisory lock, so with several workers only
+        one does any of it at a time. Never raises: this is housekeeping, and
+        the queue works without it.
+        """
+        done = {"partitions_created": 0, "results_archived": 0}
+        try:
+            month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            for i in range(months_ahead + 1):
+                lo = _add_months(month, i)
+                name = f"agent_runs_y{lo:%Y}m{lo:%m}"
+                async with self.get_async_session() as session:
+                    exists = (await session.execute(
+                        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+                    )).scalar()
+                    if exists:
+                        continue
+                    if not (await session.execute(text(_MAINTENANCE_LOCK))).scalar():
+                        return done
+                    try:
+                        await session.execute(text(f"SET LOCAL lock_timeout = '{_DDL_LOCK_TIMEOUT}'"))
+                        # Identifiers and bounds cannot be bound parameters in
+                        # DDL. Both are formatted from a datetime here, never
+                        # from input.
+                        await session.execute(text(
+                            f"CREATE TABLE {name} PARTITION OF agent_runs "
+                            f"FOR VALUES FROM ('{lo.isoformat()}+00:00') "
+                            f"TO ('{_add_months(lo, 1).isoformat()}+00:00')"
+                        ))
+                        await session.commit()
+                        done["partitions_created"] += 1
+                    except Exception as e:
+                        await session.rollback()
+                        # Most likely rows for that month already sit in the
+                        # default partition. They are still served from there;
+                        # say so, because the month will not get its own
+                        # partition until somebody moves them. Or the lock
+                        # timed out, and the next pass tries again.
+                        logger.warning(f"Could not create partition {name}: {e}")
+
+            cutoff = datetime.utcnow() - timedelta(days=archive_after_days)
+            for _ in range(max_batches):
+                async with self.get_async_session() as session:
+                    if not (await session.execute(text(_MAINTENANCE_LOCK))).scalar():
+                        break
+                    res = await session.execute(_ARCHIVE_SQL, {"cutoff": cutoff, "batch": batch})
+                    await session.commit()
+                moved = res.rowcount or 0
+                done["results_archived"] += moved
+                if moved < batch:
+                    break
+        except Exception as e:
+            logger.error(f"agent_runs maintenance failed: {e}", exc_info=True)
+        return done
+
+    async def queue_metrics(self, *, window_seconds: int = 900) -> Dict[str, Any]:
+        """The queue as it stands, and what it did over the last `window_seconds`.
+
+        Returns {"live": [...], "window": [...]}, one dict per row of
+        _LIVE_METRICS_SQL and _WINDOW_METRICS_SQL. Reclaims are counted by
+        when they happened, from the stamp the lease sweeper leaves. Raises:
+        the caller is a metrics endpoint, and a scrape that fails says more
+        than one that reports an empty queue.
+        """
+        now = datetime.utcnow()
+        since = now - timedelta(seconds=window_seconds)
+        async with self.get_async_session() as session:
+            live = await session.execute(_LIVE_METRICS_SQL, {"now": now})
+            window = await session.execute(
+                _WINDOW_METRICS_SQL,
+                {"since": since, "horizon": since - timedelta(days=1)},
+            )
+            return {
+                "live": [dict(row._mapping) for row in live],
+                "window": [dict(row._mapping) for row in window],
+            }
+
+    async def save_checkpoint(
+        self, run_id: uuid.UUID, checkpoint: Dict[str, Any], *, locked_by: str
+    ) -> bool:
+        """Record how far a running run has got. False if it is no longer ours.
+
+        Conditional on the lease, like renewal: a run reclaimed by the sweeper
+        belongs to whoever claims it next, and this worker's progress must not
+        overwrite theirs. Never raises; a checkpoint that fails to write only
+        means a retry starts further back.
+        """
+        try:
+            async with self.get_async_session() as session:
+                res = await session.execute(
+                    update(AgentRunORM)
+                    .where(
+                        AgentRunORM.id == run_id,
+                        AgentRunORM.status == "running",
+                        AgentRunORM.locked_by == locked_by,
+                    )
+                    .values(checkpoint=checkpoint, updated_at=datetime.utcnow())
+                )
+                await session.commit()
+                return (res.rowcount or 0) > 0
+        except Exception as e:
+            logger.warning(f"Could not checkpoint run {run_id}: {e}")
+            return False
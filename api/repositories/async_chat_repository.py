@@ -15,6 +15,7 @@ from ..models import ChatHistory as ChatHistoryORM
 from ..models import Message as MessageORM
 from ..models import MessageFeedback as MessageFeedbackORM
 from ..models import AgentRun as AgentRunORM
+from ..models import AgentRunArchive as AgentRunArchiveORM
 
 # Import SQLAlchemy async components
 from sqlalchemy import select, and_, or_, desc, func
@@ -437,10 +438,13 @@ class AsyncChatRepository(AsyncBaseRepository):
                 # single link, written by the worker when it saves the answer.
                 # Outer join because answers from before that column existed
                 # have no run to reach, which the report says rather than hides.
+                # And a run old enough to have had its trace archived keeps
+                # only a stub in agent_runs; the trace is in the archive.
                 stmt = (
-                    select(MessageFeedbackORM, MessageORM, AgentRunORM)
+                    select(MessageFeedbackORM, MessageORM, AgentRunORM, AgentRunArchiveORM.result)
                     .join(MessageORM, MessageORM.id == MessageFeedbackORM.message_id)
                     .outerjoin(AgentRunORM, AgentRunORM.message_id == MessageFeedbackORM.message_id)
+                    .outerjoin(AgentRunArchiveORM, AgentRunArchiveORM.run_id == AgentRunORM.id)
                     .order_by(desc(MessageFeedbackORM.created_at))
                     .limit(limit)
                 )
@@ -450,7 +454,7 @@ class AsyncChatRepository(AsyncBaseRepository):
                 rows = (await session.execute(stmt)).all()
 
                 out = []
-                for feedback, answer, run in rows:
+                for feedback, answer, run, archived in rows:
                     payload = (run.payload if run is not None else None) or {}
                     out.append({
                         "message_id": feedback.message_id,
@@ -462,7 +466,7 @@ class AsyncChatRepository(AsyncBaseRepository):
                         "question": payload.get("message"),
                         "answer": answer.content,
                         "workspace_id": payload.get("workspace_id"),
-                        "run": (run.result if run is not None else None) or {},
+                        "run": archived or (run.result if run is not None else None) or {},
                     })
                 return out
             except Exception as e:
@@ -1,8 +1,10 @@
 """
 Async File repository for managing file-related database operations.
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import logging
+from ..core import ann_cache, workspace_organizations
+from ..core.timing import emit
 from ..core.utils import sanitize_extracted_text
 import asyncio
 
@@ -10,6 +12,7 @@ from .async_base_repository import AsyncBaseRepository
 from ..models import File as FileORM, Chunk as ChunkORM
 from ..models import Segment as SegmentORM
 from ..models import PageRead as PageReadORM
+from ..models import Workspace as WorkspaceORM
 
 # Import SQLAlchemy async components
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -56,6 +59,12 @@ logger = logging.getLogger(__name__)
 # Ranking by the rare token alone puts the right page first. So this arm exists
 # to give those tokens a vote of their own, rather than trying to teach
 # ts_rank_cd about rarity, which it has no mechanism for.
+#
+# Since 20260823_workspace_term_stats the text arm is BM25, scored from
+# per-workspace document frequencies, so rarity is in the score for every term.
+# The literal list survives as a second ranking of that same pass, restricted
+# to chunks holding one of these tokens, because fusion sees ranks and a rare
+# token's lead in score is only one place in rank.
 _LITERAL_TOKEN = re.compile(r"\b(?:\d+(?:[./]\d+)?|[A-Za-z]{1,2}\d{1,4})\b")
 
 # Letter-digit pairs that are grid references or list markers rather than part
@@ -79,6 +88,59 @@ def literal_tokens(query: str) -> List[str]:
     return seen[:8]
 
 
+def _statement_settings(raw: str) -> Dict[str, Dict[str, str]]:
+    """HYBRID_SEARCH_SETTINGS as {statement: {setting: value}}."""
+    pinned: Dict[str, Dict[str, str]] = {}
+    for item in (raw or "").split(","):
+        if not item.strip():
+            continue
+        statement, _, assignment = item.partition(":")
+        setting, _, value = assignment.partition("=")
+        if not (statement.strip() and setting.strip() and value.strip()):
+            logger.warning(f"Ignoring HYBRID_SEARCH_SETTINGS entry {item.strip()!r}")
+            continue
+        pinned.setdefault(statement.strip(), {})[setting.strip()] = value.strip()
+    return pinned
+
+
+def _search_profile(explained: Any) -> Dict[str, Any]:
+    """Rows, time and buffers per arm, from EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON).
+
+    An arm is a CTE Postgres kept as its own subplan: vec_scan, which is the
+    vector arm, and scored, which is BM25 for both the text and the literal
+    lists. Times are inclusive, and rest_ms is what none of them account for:
+    the fusion and the join out to files and segments.
+    """
+    if isinstance(explained, str):
+        explained = json.loads(explained)
+    if isinstance(explained, list):
+        explained = explained[0]
+    arms: Dict[str, Dict[str, Any]] = {}
+
+    def walk(node: Dict[str, Any]) -> None:
+        name = node.get("Subplan Name") or ""
+        if name.startswith("CTE "):
+            loops = node.get("Actual Loops") or 1
+            arms[name[4:]] = {
+                "rows": round((node.get("Actual Rows") or 0) * loops),
+                "ms": round((node.get("Actual Total Time") or 0) * loops, 2),
+                "shared_hit": node.get("Shared Hit Blocks", 0),
+                "shared_read": node.get("Shared Read Blocks", 0),
+            }
+        for child in node.get("Plans") or []:
+            walk(child)
+
+    walk(explained["Plan"])
+    execution_ms = explained.get("Execution Time") or 0
+    return {
+        "planning_ms": round(explained.get("Planning Time") or 0, 2),
+        "execution_ms": round(execution_ms, 2),
+        "rows": explained["Plan"].get("Actual Rows", 0),
+        "rest_ms": round(max(execution_ms - sum(a["ms"] for a in arms.values()), 0), 2),
+        "arms": arms,
+    }
+
+
 class AsyncFileRepository(AsyncBaseRepository):
     """Async repository for file operations."""
 
@@ -176,39 +238,113 @@ class AsyncFileRepository(AsyncBaseRepository):
     ) -> None:
         """Keep one extracted page, as soon as it exists.
 
-        Called per page rather than per document on purpose. Saving at the end
-        would keep exactly the runs that did not need saving.
-
         Never raises. This is a cache, and failing to write it must not fail an
         ingest that is otherwise going fine.
         """
+        await self.save_page_reads(
+            file_id,
+            [{"page_number": page_number, "text": text_content, "source": source, "flags": flags}],
+        )
+
+    async def save_page_reads(self, file_id: int, pages: List[Dict[str, Any]]) -> None:
+        """Keep a batch of extracted pages in one statement.
+
+        Each page is {"page_number", "text", "source", "flags"}, plus
+        "image_hash" for a page the vision model read. One multi-row
+        upsert and one commit however many pages there are: a scanned document
+        OCRs hundreds of pages in seconds, and a session and a transaction per
+        page was most of what writing them cost. The caller decides how long to
+        hold pages before handing them over; see PageReadWriter.
+
+        Never raises, for the same reason save_page_read does not.
+        """
+        if not pages:
+            return
         try:
             from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+            # ON CONFLICT cannot touch the same row twice in one statement, so a
+            # page handed over twice keeps its latest read.
+            rows = {
+                int(p["page_number"]): {
+                    "file_id": int(file_id),
+                    "page_number": int(p["page_number"]),
+                    "text": p["text"],
+                    "source": p["source"],
+                    "flags": p.get("flags") or None,
+                    "image_hash": p.get("image_hash"),
+                }
+                for p in pages
+            }
             async with self.get_async_session() as session:
-                stmt = (
-                    pg_insert(PageReadORM.__table__)
-                    .values(
-                        file_id=int(file_id),
-                        page_number=int(page_number),
-                        text=text_content,
-                        source=source,
-                        flags=flags or None,
-                    )
-                    # A re-run that got further than a previous one should be
-                    # able to overwrite a page rather than collide with it.
-                    .on_conflict_do_update(
-                        index_elements=["file_id", "page_number"],
-                        set_={"text": text_content, "source": source, "flags": flags or None},
-                    )
+                stmt = pg_insert(PageReadORM.__table__).values(list(rows.values()))
+                # A re-run that got further than a previous one should be
+                # able to overwrite a page rather than collide with it.
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["file_id", "page_number"],
+                    set_={
+                        "text": stmt.excluded.text,
+                        "source": stmt.excluded.source,
+                        "flags": stmt.excluded.flags,
+                        "image_hash": stmt.excluded.image_hash,
+                    },
                 )
                 await session.execute(stmt)
                 await session.commit()
         except Exception as e:
             logger.warning(
-                f"Could not cache page {page_number} of file {file_id}: {type(e).__name__}: {e}"
+                f"Could not cache {len(pages)} page(s) of file {file_id}: {type(e).__name__}: {e}"
             )
 
+    async def vision_read_for_image(self, file_id: int, image_hash: str) -> Optional[Dict[str, Any]]:
+        """A vision read this organization already paid for, of this exact image.
+
+        Keyed on the hash of the rendered page rather than on the file, so the
+        same manual in a second workspace, or the unchanged pages of a revised
+        one, come back from here instead of from a call that takes up to three
+        minutes. Scoped to the organization that owns `file_id` for the reason
+        embeddings_for_hashes gives.
+
+        Returns {"text", "flags"}, or None on a miss. Never raises: a failed
+        lookup is a miss, and a miss is what happened before this existed.
+        """
+        if not image_hash:
+            return None
+        try:
+            async with self.get_async_session() as session:
+                row = (await session.execute(
+                    text(
+                        """
+                        WITH owner AS (
+                          SELECT w.organization_id AS org
+                          FROM files f
+                          JOIN workspaces w ON w.id = f.workspace_id
+                          WHERE f.id = :file_id
+                        )
+                        SELECT pr.text, pr.flags
+                        FROM page_reads pr
+                        JOIN files f ON f.id = pr.file_id
+                        JOIN workspaces w ON w.id = f.workspace_id
+                        WHERE pr.image_hash = :image_hash
+                          AND pr.source = 'vision'
+                          AND w.organization_id = (SELECT org FROM owner)
+                        ORDER BY pr.created_at DESC
+                        LIMIT 1
+                        """
+                    ),
+                    {"file_id": int(file_id), "image_hash": image_hash},
+                )).first()
+        except Exception as e:
+            logger.warning(f"Could not look up a prior vision read for file {file_id}: {e}")
+            return None
+        if row is None:
+            return None
+        flags = row.flags
+        # json, not jsonb, so a raw query hands it back as a string.
+        if isinstance(flags, str):
+            flags = json.loads(flags)
+        return {"text": row.text, "flags": flags or {}}
+
     async def embeddings_for_hashes(self, file_id: int, hashes: List[str]) -> Dict[str, Any]:
         """Vectors this organization has already paid to compute.
 
@@ -240,13 +376,15 @@ class AsyncFileRepository(AsyncBaseRepository):
                       JOIN workspaces w ON w.id = f.workspace_id
                       WHERE f.id = :file_id
                     )
+                    -- On the chunk's own organization_id, which is also what
+                    -- chunks is partitioned by, so only this tenant's
+                    -- partition is read. A document in no workspace has no
+                    -- owner row and reuses nothing, as before.
                     SELECT DISTINCT ON (c.content_hash) c.content_hash, c.embedding
                     FROM chunks c
-                    JOIN files f ON f.id = c.file_id
-                    JOIN workspaces w ON w.id = f.workspace_id
                     WHERE c.content_hash = ANY(:hashes)
                       AND c.embedding IS NOT NULL
-                      AND w.organization_id = (SELECT org FROM owner)
+                      AND c.organization_id = (SELECT org FROM owner)
                     """
                 ),
                 {"file_id": int(file_id), "hashes": list(hashes)},
@@ -289,9 +427,16 @@ class AsyncFileRepository(AsyncBaseRepository):
         async with self.get_async_session() as session:
             file = None
             try:
-                # Get or create the file record
+                # Get or create the file record. Locked until this batch
+                # commits, because its workspace is stamped on every chunk
+                # below: a move that committed between this read and that
+                # commit would rewrite the chunks already there and miss
+                # these, leaving them answering in the workspace the
+                # document left. update_file_workspace takes the same lock.
                 if file_id is not None:
-                    file = await session.get(FileORM, int(file_id))
+                    file = (await session.execute(
+                        select(FileORM).where(FileORM.id == int(file_id)).with_for_update()
+                    )).scalar_one_or_none()
                 else:
                     # Filename is not unique (e.g. repeated YouTube URLs). Select newest match.
                     stmt = (
@@ -299,6 +444,7 @@ class AsyncFileRepository(AsyncBaseRepository):
                         .where(and_(FileORM.user_id == user_id, FileORM.file_name == filename))
                         .order_by(FileORM.created_at.desc())
                         .limit(1)
+                        .with_for_update()
                     )
                     result = await session.execute(stmt)
                     file = result.scalars().first()
@@ -327,6 +473,15 @@ class AsyncFileRepository(AsyncBaseRepository):
                     select(func.count(ChunkORM.id)).where(ChunkORM.file_id == file.id)
                 )).scalar() or 0
 
+                # Stamped on every chunk, so retrieval can filter by tenant
+                # without joining back to files. See Chunk.workspace_id.
+                organization_id = None
+                if file.workspace_id is not None:
+                    organization_id = (await session.execute(
+                        select(WorkspaceORM.organization_id)
+                        .where(WorkspaceORM.id == file.workspace_id)
+                    )).scalar()
+
                 # Every processor emits a flat list of retrieval units:
                 #   {'text': str, 'page_num': int, 'embedding': list[float], ...}
                 #
@@ -409,6 +564,8 @@ class AsyncFileRepository(AsyncBaseRepository):
                         session.add(ChunkORM(
                             file_id=file.id,
                             segment_id=segment.id,
+                            workspace_id=file.workspace_id,
+                            organization_id=organization_id,
                             content=sanitize_extracted_text(
                                 u.get('text') or u.get('content') or ''
                             ),
@@ -576,6 +733,24 @@ class AsyncFileRepository(AsyncBaseRepository):
                 logger.error(f"Error summing storage bytes for user {user_id}: {e}", exc_info=True)
                 return 0
 
+    @staticmethod
+    async def _delete_chunks(session, file_id: int, organization_id: Optional[int]) -> None:
+        """Delete a file's chunks within its organization's partition.
+
+        organization_id None is a document in no workspace, whose chunks have
+        none either; IS NULL prunes as well as equality does.
+        """
+        if organization_id is None:
+            await session.execute(
+                text("DELETE FROM chunks WHERE organization_id IS NULL AND file_id = :file_id"),
+                {"file_id": file_id},
+            )
+            return
+        await session.execute(
+            text("DELETE FROM chunks WHERE organization_id = :organization_id AND file_id = :file_id"),
+            {"organization_id": organization_id, "file_id": file_id},
+        )
+
     async def delete_file_entry(self, file_id: int) -> bool:
         """Delete a file and all associated data.
 
@@ -601,6 +776,15 @@ class AsyncFileRepository(AsyncBaseRepository):
                     logger.warning(f"File {file_id} not found")
                     return False
 
+                # Chunks first, by organization, so a partitioned table is
+                # touched in this tenant's partition only; the cascade from
+                # files would look for them in every partition.
+                organization_id = None
+                if file_obj.workspace_id is not None:
+                    found = await self._organizations_for(session, [file_obj.workspace_id])
+                    organization_id = found[0] if found else None
+                await self._delete_chunks(session, file_id, organization_id)
+
                 # Delete the file (cascade should handle related entities)
                 await session.delete(file_obj)
                 await session.commit()
@@ -612,6 +796,8 @@ class AsyncFileRepository(AsyncBaseRepository):
                 error_msg = f"Error deleting file {file_id}: {str(e)[:1000]}"
                 logger.error(error_msg, exc_info=True)
                 try:
+                    # Every partition: whatever failed above may have been
+                    # finding the organization.
                     await session.execute(text("DELETE FROM chunks WHERE file_id = :file_id"), {"file_id": file_id})
                     await session.execute(text("DELETE FROM segments WHERE file_id = :file_id"), {"file_id": file_id})
                     await session.execute(text("DELETE FROM files WHERE id = :file_id"), {"file_id": file_id})
@@ -638,62 +824,298 @@ class AsyncFileRepository(AsyncBaseRepository):
     # token that token IS the answer's address: 4350 appears in one chunk of
     # 1,528, E4 in two. Measured 2026-08-14.
     DEFAULT_LITERAL_WEIGHT = float(os.getenv("LITERAL_WEIGHT", "0.7"))
+    # The usual BM25 constants: term frequency saturates around k1, and b is
+    # how much a long chunk is discounted for being long.
+    BM25_K1 = 1.2
+    BM25_B = 0.75
     DEFAULT_TOP_K = 10
     # How deep each of the two searches goes before the results are fused. Has
     # to exceed top_k by enough that a chunk ranked well by one search and
     # poorly by the other still survives to be fused.
     CANDIDATE_POOL = 100
 
-    async def hybrid_search(
-        self,
-        user_id: int,
-        query: str,
-        query_embedding: List[float],
-        workspace_id: Optional[int] = None,
-        file_id: Optional[int] = None,
-        vector_weight: float = None,
-        bm25_weight: float = None,
-        top_k: int = None,
-        accessible_workspace_ids: Optional[List[int]] = None,
-    ) -> List[Dict[str, Any]]:
-        """Hybrid search combining vector similarity and BM25 in Postgres.
+    # Whether this server's pgvector can continue a filtered HNSW scan until
+    # it has enough rows (0.8 and later). Looked up once per process.
+    _iterative_scan: Optional[bool] = None
+
+    # A compact HNSW index over chunks.embedding, if the deployment built one
+    # (20260822_compact_vector_index): "halfvec", "bit", or None for the full
+    # float index. Looked up once per process. VECTOR_INDEX picks between them
+    # when both exist, or "float" to ignore them.
+    _compact_index: Optional[str] = None
+    _compact_index_known = False
+    VECTOR_INDEX = os.getenv("VECTOR_INDEX", "auto").lower()
+    # How many compact-index neighbours are rescored against the full vectors
+    # for each candidate kept. Half precision barely reorders anything; one bit
+    # per dimension reorders a lot, so it needs a much deeper first pass.
+    OVERSAMPLE = {
+        "halfvec": int(os.getenv("VECTOR_OVERSAMPLE_HALFVEC", "2")),
+        "bit": int(os.getenv("VECTOR_OVERSAMPLE_BIT", "8")),
+    }
+    # pgvector's ceiling for hnsw.ef_search.
+    _MAX_EF_SEARCH = 1000
+
+    # The first-pass ordering for each compact index. Each is written exactly as
+    # its index expression, or the planner will not use the index. 1024 is the
+    # dimension of Chunk.embedding.
+    _COMPACT_DISTANCE = {
+        "halfvec": "c.embedding::halfvec(1024) <=> CAST(:embedding AS halfvec(1024))",
+        "bit": "binary_quantize(c.embedding)::bit(1024) <~> binary_quantize(CAST(:embedding AS vector))",
+    }
+
+    async def _vector_index(self, session) -> Optional[str]:
+        """The compact index the vector arm should search, or None."""
+        if not AsyncFileRepository._compact_index_known:
+            try:
+                names = set((await session.execute(
+                    text(
+                        "SELECT indexname FROM pg_indexes "
+                        "WHERE tablename = 'chunks' AND indexname IN "
+                        "('ix_chunks_embedding_halfvec', 'ix_chunks_embedding_bit')"
+                    )
+                )).scalars().all())
+            except Exception as e:
+                logger.warning(f"Could not look up the vector indexes: {e}")
+                return None
+            built = [kind for kind in ("halfvec", "bit") if f"ix_chunks_embedding_{kind}" in names]
+            if self.VECTOR_INDEX in built:
+                built = [self.VECTOR_INDEX]
+            AsyncFileRepository._compact_index = (
+                None if self.VECTOR_INDEX == "float" or not built else built[0]
+            )
+            AsyncFileRepository._compact_index_known = True
+        return AsyncFileRepository._compact_index
+
+    async def _ann_settings(self, session) -> Dict[str, str]:
+        """Settings for the vector arm, for this server.
+
+        Without an iterative scan, HNSW visits ef_search neighbours and filters
+        them afterwards, so in a workspace holding one percent of the table a
+        search for a hundred candidates comes back with one or two. relaxed
+        order is enough because vec_scan is re-sorted exactly before it is
+        ranked. On an older pgvector the setting does not exist, and setting an
+        unknown hnsw.* parameter is an error, so it is only sent when known.
+        """
+        if AsyncFileRepository._iterative_scan is None:
+            try:
+                version = (await session.execute(
+                    text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                )).scalar() or "0"
+                parts = tuple(int(p) for p in re.findall(r"\d+", version)[:2])
+                AsyncFileRepository._iterative_scan = parts >= (0, 8)
+            except Exception as e:
+                logger.warning(f"Could not read the pgvector version: {e}")
+                return {}
+        if not AsyncFileRepository._iterative_scan:
+            return {}
+        return {"hnsw.iterative_scan": "relaxed_order"}
 
-        Retrieval is scoped by *workspace*, not by who uploaded the documents.
-        The previous `f.user_id = :user_id` clause meant an invited staff member
-        retrieved zero chunks and therefore got no answers at all, because the
-        rows belong to the owner who uploaded them.
+    async def _organizations_for(self, session, workspace_ids: List[int]) -> List[int]:
+        """The organizations owning these workspaces, for partition pruning.
 
-        Returns a list of { chunk_id, file_id, content, hybrid_score }.
+        Resolved here rather than in a subquery so the planner sees constants
+        and prunes chunks' partitions when it plans, with row estimates for the
+        tenant's partition instead of the whole table.
         """
-        vw = self.DEFAULT_VECTOR_WEIGHT if vector_weight is None else float(vector_weight)
-        bw = self.DEFAULT_BM25_WEIGHT if bm25_weight is None else float(bm25_weight)
-        lw = self.DEFAULT_LITERAL_WEIGHT
-        k = self.DEFAULT_TOP_K if top_k is None else int(top_k)
-
-        async with self.get_async_session() as session:
-            try:
-                if workspace_id is not None:
-                    # Caller authorized this workspace, so scope purely to it.
-                    where_clauses = ["f.workspace_id = :workspace_id"]
-                elif accessible_workspace_ids:
-                    # Everything in the user's workspaces, plus their own
-                    # workspace-less files.
-                    where_clauses = [
-                        "(f.workspace_id = ANY(:accessible_workspace_ids)"
-                        " OR (f.workspace_id IS NULL AND f.user_id = :user_id))"
-                    ]
-                else:
-                    where_clauses = ["f.user_id = :user_id"]
+        organizations = workspace_organizations.known(workspace_ids)
+        missing = [int(w) for w in workspace_ids if int(w) not in organizations]
+        if missing:
+            rows = await session.execute(
+                select(WorkspaceORM.id, WorkspaceORM.organization_id)
+                .where(WorkspaceORM.id.in_(missing))
+            )
+            found = dict(rows.all())
+            workspace_organizations.remember(found)
+            organizations.update((w, o) for w, o in found.items() if o is not None)
+        return sorted(set(organizations.values()))
+
+    # The scopes hybrid_search can search, as the WHERE clause each arm shares.
+    #
+    # On the chunk's own columns, not through files. Each arm used to join every
+    # candidate to files to learn its workspace, which also kept the planner
+    # from using the vector index for a filtered search. A workspace-less file
+    # still has to be found by its uploader, through files, and only those.
+    #
+    # The workspace clauses also name the organization, so that when chunks is
+    # partitioned (20260821_partition_chunks) every arm reads only that
+    # tenant's partition and its indexes.
+    #
+    # A single file is one statement whichever scope authorized it, with the
+    # scope carried in parameters. Its chunks come from the file_id index and
+    # are a page or two of rows, so the plan has nothing left to choose and a
+    # generic one is as good as any.
+    _SCOPES = {
+        # Caller authorized this workspace, so scope purely to it.
+        "workspace": (
+            "c.organization_id = ANY(:organization_ids)"
+            " AND c.workspace_id = :workspace_id"
+        ),
+        # Everything in the user's workspaces, plus their own workspace-less
+        # files.
+        "accessible": (
+            "((c.organization_id = ANY(:organization_ids)"
+            " AND c.workspace_id = ANY(:scope_workspace_ids))"
+            " OR (c.organization_id IS NULL AND c.workspace_id IS NULL"
+            " AND c.file_id IN ("
+            "SELECT id FROM files WHERE workspace_id IS NULL AND user_id = :user_id)))"
+        ),
+        "owner": "c.file_id IN (SELECT id FROM files WHERE user_id = :user_id)",
+        "file": (
+            "c.file_id = :file_id AND ("
+            "c.workspace_id = ANY(:scope_workspace_ids)"
+            " OR (CAST(:scope_unfiled AS boolean) AND c.workspace_id IS NULL"
+            " AND c.file_id IN ("
+            "SELECT id FROM files WHERE workspace_id IS NULL AND user_id = :user_id))"
+            " OR (CAST(:scope_owner AS boolean) AND c.file_id IN ("
+            "SELECT id FROM files WHERE user_id = :user_id)))"
+        ),
+    }
+
+    # hybrid_search's statements, one per scope and vector arm, each built the
+    # first time it is needed and then kept, so every search of a kind sends
+    # the same SQL with only its parameters different. The asyncpg dialect
+    # keeps a prepared statement per connection for each distinct SQL string
+    # it sees. When the text was assembled on every call, each search was
+    # parsed, analysed and planned from scratch, and the plan of a query this
+    # size was a measurable part of a Find. Now it is prepared once per
+    # connection, and after a few executions Postgres can keep a generic plan.
+    _statements: Dict[Tuple[str, str], Any] = {}
+    # The set_config select for each number of settings, kept the same way.
+    _configure_statements: Dict[int, Any] = {}
+
+    # Planner settings pinned per statement, applied before it runs and only
+    # for its transaction. Comma separated statement:setting=value, where the
+    # statement is a key of _SCOPES or * for all of them, for instance
+    #   workspace:hnsw.ef_search=200,*:plan_cache_mode=force_generic_plan
+    # A pinned value wins over one hybrid_search would choose itself.
+    STATEMENT_SETTINGS = _statement_settings(os.getenv("HYBRID_SEARCH_SETTINGS", ""))
+
+    # One search in this many is first run under EXPLAIN (ANALYZE, BUFFERS),
+    # to see where its time went arm by arm before CANDIDATE_POOL or an index
+    # is tuned. 0 is never, 1 is every search, which is the setting for
+    # chasing one slow question. Counted per process.
+    EXPLAIN_EVERY = int(os.getenv("SEARCH_EXPLAIN_EVERY", "0"))
+    _searches_seen = 0
+    _explain_statements: Dict[Tuple[str, str], Any] = {}
+
+    def _statement(self, scope: str, vector: str):
+        """The search statement for a scope and vector arm, built once."""
+        key = (scope, vector)
+        statement = AsyncFileRepository._statements.get(key)
+        if statement is None:
+            statement = text(self._search_sql(self._SCOPES[scope], vector))
+            AsyncFileRepository._statements[key] = statement
+        return statement
+
+    async def _configure(self, session, settings: Dict[str, str]) -> None:
+        """Apply settings for the rest of the transaction, in one round trip.
+
+        set_config with is_local is SET LOCAL, but takes the name and value as
+        parameters, so it is a stable statement of its own rather than a
+        different SET for every value of ef_search.
+        """
+        if not settings:
+            return
+        count = len(settings)
+        statement = AsyncFileRepository._configure_statements.get(count)
+        if statement is None:
+            statement = text("SELECT " + ", ".join(
+                f"set_config(CAST(:setting_{i} AS text), CAST(:value_{i} AS text), true)"
+                for i in range(count)
+            ))
+            AsyncFileRepository._configure_statements[count] = statement
+        params: Dict[str, str] = {}
+        for i, (setting, value) in enumerate(settings.items()):
+            params[f"setting_{i}"] = setting
+            params[f"value_{i}"] = str(value)
+        await session.execute(statement, params)
+
+    def _sampled(self) -> bool:
+        if self.EXPLAIN_EVERY <= 0:
+            return False
+        AsyncFileRepository._searches_seen += 1
+        return AsyncFileRepository._searches_seen % self.EXPLAIN_EVERY == 0
+
+    async def _explain(self, session, scope: str, vector: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The search's profile (see _search_profile), or None if it failed.
+
+        Run before the search rather than after it, so it pays the cold reads
+        the search would have and shows them; the search that follows finds
+        its pages cached. EXPLAIN ANALYZE returns a plan, not rows, so this is
+        a second execution, which is why it is sampled. In a savepoint, so a
+        failure here cannot abort the transaction the search runs in.
+        """
+        key = (scope, vector)
+        statement = AsyncFileRepository._explain_statements.get(key)
+        if statement is None:
+            statement = text(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+                + self._search_sql(self._SCOPES[scope], vector)
+            )
+            AsyncFileRepository._explain_statements[key] = statement
+        try:
+            async with session.begin_nested():
+                explained = (await session.execute(statement, params)).scalar()
+            return {
+                "scope": scope,
+                "vector": vector,
+                "candidates": params["candidates"],
+                "top_k": params["top_k"],
+                **_search_profile(explained),
+            }
+        except Exception as e:
+            logger.warning(f"Could not explain hybrid_search: {e}")
+            return None
 
-                if file_id is not None:
-                    where_clauses.append("f.id = :file_id")
+    def _search_sql(self, where_sql: str, vector: str) -> str:
+        """The whole hybrid_search statement for one scope and vector arm.
 
-                where_sql = " AND ".join(where_clauses)
-                sql = text(
+        vector is "ann" for ids and distances handed in from core/ann_cache,
+        "float" for the full-precision HNSW index, or a key of
+        _COMPACT_DISTANCE for a compact one.
+        """
+        if vector == "ann":
+            # Still joined back through the scope, so an entry can never reach
+            # past what this search was authorized for.
+            vec_scan_sql = """
+                      SELECT c.id AS chunk_id, nearest.distance
+                      FROM unnest(
+                        CAST(:ann_ids AS integer[]), CAST(:ann_distances AS double precision[])
+                      ) AS nearest(chunk_id, distance)
+                      JOIN chunks c ON c.id = nearest.chunk_id
+                      WHERE """ + where_sql + """
+                    """
+        elif vector == "float":
+            vec_scan_sql = """
+                      SELECT c.id AS chunk_id,
+                             c.embedding <=> CAST(:embedding AS vector) AS distance
+                      FROM chunks c
+                      WHERE """ + where_sql + """
+                      ORDER BY c.embedding <=> CAST(:embedding AS vector)
+                      LIMIT :candidates
                     """
+        else:
+            # The compact index finds an oversampled neighbourhood and the
+            # full-precision vectors, read from the heap for those rows only,
+            # decide the order within it. The float HNSW index is not needed,
+            # so only the compact one has to stay in memory.
+            vec_scan_sql = """
+                      SELECT chunk_id,
+                             embedding <=> CAST(:embedding AS vector) AS distance
+                      FROM (
+                        SELECT c.id AS chunk_id, c.embedding
+                        FROM chunks c
+                        WHERE """ + where_sql + """
+                        ORDER BY """ + self._COMPACT_DISTANCE[vector] + """
+                        LIMIT :oversampled
+                      ) neighbourhood
+                      ORDER BY distance
+                      LIMIT :candidates
+                    """
+
+        return """
                     WITH query AS (
                       SELECT
-                        CAST(:embedding AS vector) AS embedding,
                         -- 'english' stems and drops stopwords; 'simple' did
                         -- neither, so "what goes in an executive summary"
                         -- became 'what'&'goes'&'in'&'an'&'executive'&'summary'
@@ -703,11 +1125,7 @@ class AsyncFileRepository(AsyncBaseRepository):
                         -- terms a page contains instead of needing all of them.
                         REPLACE(
                           plainto_tsquery('english', :keywords)::text, ' & ', ' | '
-                        )::tsquery AS keywords,
-                        -- An empty string is not a valid tsquery, so an
-                        -- unmatchable placeholder stands in when a question has
-                        -- no identifying tokens; :has_literals gates the arm.
-                        CAST(:literals AS tsquery) AS literals
+                        )::tsquery AS keywords
                     ),
                     -- Two searches, each in the shape its index can answer,
                     -- rather than one blended expression no index can.
@@ -718,54 +1136,111 @@ class AsyncFileRepository(AsyncBaseRepository):
                     -- scan every chunk in the workspace, recompute to_tsvector
                     -- over text that had not changed since upload, and sort the
                     -- lot: 171ms for 316 chunks, and linear from there.
+                    --
+                    -- The nearest neighbours first, on their own, then ranked.
+                    -- The distance is against the bound parameter, not the
+                    -- query CTE, so the HNSW index sees a constant it can
+                    -- order by. MATERIALIZED because with an iterative scan in
+                    -- relaxed order (see _ann_settings) the index returns
+                    -- approximately sorted rows, and the ranking below puts
+                    -- them in exact order rather than trusting the scan's.
+                    vec_scan AS MATERIALIZED (""" + vec_scan_sql + """),
                     vec AS (
-                      SELECT c.id AS chunk_id,
-                             ROW_NUMBER() OVER (ORDER BY c.embedding <=> q.embedding) AS rank
-                      FROM chunks c
-                      JOIN files f ON f.id = c.file_id
-                      CROSS JOIN query q
-                      WHERE """ + where_sql + """
-                      ORDER BY c.embedding <=> q.embedding
-                      LIMIT :candidates
+                      SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+                      FROM vec_scan
                     ),
-                    -- The identifying tokens, given a vote of their own.
-                    -- ts_rank_cd has no IDF, so in the text arm "251" counts
-                    -- exactly as much as "temperature"; here only the rare
-                    -- tokens are searched, so a chunk containing them cannot
-                    -- be outranked by one merely dense in ordinary words.
-                    lit AS (
-                      SELECT c.id AS chunk_id,
-                             ROW_NUMBER() OVER (
-                               ORDER BY ts_rank_cd(c.tsv, q.literals, 32) DESC
-                             ) AS rank
-                      FROM chunks c
-                      JOIN files f ON f.id = c.file_id
-                      CROSS JOIN query q
-                      WHERE """ + where_sql + """ AND :has_literals
-                        AND c.tsv @@ q.literals
-                      ORDER BY ts_rank_cd(c.tsv, q.literals, 32) DESC
-                      LIMIT :candidates
+                    -- BM25, scored from the workspace's term statistics
+                    -- (20260823_workspace_term_stats). This replaced a
+                    -- ts_rank_cd text arm, which measured how tightly the
+                    -- question's words cluster and had no notion of rarity,
+                    -- and a literal arm that ranked the same chunks a second
+                    -- time, again with ts_rank_cd, to give rare identifying
+                    -- tokens the vote it could not. IDF is that vote for every
+                    -- term. Candidates still come from the GIN index; one
+                    -- pass scores them.
+                    terms AS (
+                      SELECT DISTINCT lexeme
+                      FROM unnest(to_tsvector('english', :keywords))
+                    ),
+                    -- N and the average chunk length over the workspaces being
+                    -- searched. Floored at one, so a corpus without
+                    -- statistics (a document in no workspace) degrades to
+                    -- equal IDF rather than dividing by zero.
+                    corpus AS (
+                      SELECT GREATEST(COALESCE(SUM(chunk_count), 0), 1) AS n,
+                             GREATEST(
+                               COALESCE(SUM(term_count)::double precision
+                                        / NULLIF(SUM(chunk_count), 0), 1), 1
+                             ) AS avgdl
+                      FROM workspace_text_stats
+                      WHERE workspace_id = ANY(:scope_workspace_ids)
+                    ),
+                    idf AS (
+                      SELECT t.lexeme,
+                             GREATEST(LN(1 + (k.n - COALESCE(d.df, 0) + 0.5)
+                                             / (COALESCE(d.df, 0) + 0.5)), 0) AS idf,
+                             t.lexeme IN (
+                               SELECT lexeme FROM unnest(to_tsvector('english', :literals))
+                             ) AS literal
+                      FROM terms t
+                      CROSS JOIN corpus k
+                      LEFT JOIN (
+                        SELECT lexeme, SUM(df) AS df
+                        FROM workspace_term_stats
+                        WHERE workspace_id = ANY(:scope_workspace_ids)
+                          AND lexeme IN (SELECT lexeme FROM terms)
+                        GROUP BY lexeme
+                      ) d ON d.lexeme = t.lexeme
                     ),
-                    -- Ranked on the chunk, like the other two arms. This used
-                    -- to join `segments` and then rank `c.tsv` anyway, left
-                    -- over from when the text arm read `s.tsv`. The join
-                    -- decided nothing: every chunk has a segment, checked
-                    -- 2026-08-15 across 2,633 rows, so it only cost work.
-                    txt AS (
+                    scored AS (
                       SELECT c.id AS chunk_id,
-                             ROW_NUMBER() OVER (
-                               ORDER BY ts_rank_cd(c.tsv, q.keywords, 32) DESC
-                             ) AS rank
+                             SUM(
+                               i.idf * tf.n * (p.k1 + 1)
+                               / (tf.n + p.k1 * (1 - p.b + p.b * c.term_count / k.avgdl))
+                             ) AS score,
+                             BOOL_OR(i.literal) AS literal
                       FROM chunks c
-                      JOIN files f ON f.id = c.file_id
                       CROSS JOIN query q
+                      CROSS JOIN corpus k
+                      -- Cast once: a bare parameter in arithmetic is typed
+                      -- from the other operand, and 1.2 is not an integer.
+                      CROSS JOIN (
+                        SELECT CAST(:bm25_k1 AS double precision) AS k1,
+                               CAST(:bm25_b AS double precision) AS b
+                      ) p
+                      -- Term frequency is the lexeme's position count in the
+                      -- chunk's own tsvector, so nothing is parsed again.
+                      CROSS JOIN LATERAL unnest(c.tsv) AS u(lexeme, positions, weights)
+                      JOIN idf i ON i.lexeme = u.lexeme
+                      CROSS JOIN LATERAL (
+                        SELECT COALESCE(array_length(u.positions, 1), 1)::double precision AS n
+                      ) tf
                       WHERE """ + where_sql + """ AND c.tsv @@ q.keywords
-                      ORDER BY ts_rank_cd(c.tsv, q.keywords, 32) DESC
+                      GROUP BY c.id
+                    ),
+                    bm25 AS (
+                      SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY score DESC) AS rank
+                      FROM scored
+                      ORDER BY score DESC
+                      LIMIT :candidates
+                    ),
+                    -- The same scores, over only the chunks holding one of the
+                    -- question's identifying tokens. Fusion sees ranks, not
+                    -- scores, so without a list of its own the one chunk with
+                    -- "251" in it is first by a wide margin and still only one
+                    -- place ahead of eight pages dense in "liquid pressure",
+                    -- each of which also has the vector arm's vote. The weight
+                    -- is the literal arm's, as measured 2026-08-14.
+                    lit AS (
+                      SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY score DESC) AS rank
+                      FROM scored
+                      WHERE literal
+                      ORDER BY score DESC
                       LIMIT :candidates
                     ),
                     -- Reciprocal rank fusion. Ranks are comparable across the
-                    -- two lists in a way the raw scores never were: a cosine
-                    -- similarity and a ts_rank_cd share no scale, and the old
+                    -- lists in a way the raw scores never were: a cosine
+                    -- similarity and a BM25 score share no scale, and the old
                     -- 0.7/0.3 blend of them was arithmetic on incomparable
                     -- units. Position is the only thing both lists agree on.
                     -- The constant 60 is the usual one; it stops the top result
@@ -781,7 +1256,7 @@ class AsyncFileRepository(AsyncBaseRepository):
                                CAST(:vector_weight AS double precision) AS weight FROM vec
                         UNION ALL
                         SELECT chunk_id, rank,
-                               CAST(:bm25_weight AS double precision) AS weight FROM txt
+                               CAST(:bm25_weight AS double precision) AS weight FROM bm25
                         UNION ALL
                         SELECT chunk_id, rank,
                                CAST(:literal_weight AS double precision) AS weight FROM lit
@@ -805,7 +1280,70 @@ class AsyncFileRepository(AsyncBaseRepository):
                     ORDER BY fused.hybrid_score DESC
                     LIMIT :top_k
                     """
-                )
+
+    async def hybrid_search(
+        self,
+        user_id: int,
+        query: str,
+        query_embedding: List[float],
+        workspace_id: Optional[int] = None,
+        file_id: Optional[int] = None,
+        vector_weight: float = None,
+        bm25_weight: float = None,
+        top_k: int = None,
+        accessible_workspace_ids: Optional[List[int]] = None,
+        profiles: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Hybrid search combining vector similarity and BM25 in Postgres.
+
+        Retrieval is scoped by *workspace*, not by who uploaded the documents.
+        The previous `f.user_id = :user_id` clause meant an invited staff member
+        retrieved zero chunks and therefore got no answers at all, because the
+        rows belong to the owner who uploaded them.
+
+        A search sampled by EXPLAIN_EVERY emits its per-arm profile as
+        `hybrid_search_explain` and appends it to `profiles`, if given.
+
+        Returns a list of { chunk_id, file_id, content, hybrid_score }.
+        """
+        vw = self.DEFAULT_VECTOR_WEIGHT if vector_weight is None else float(vector_weight)
+        bw = self.DEFAULT_BM25_WEIGHT if bm25_weight is None else float(bm25_weight)
+        lw = self.DEFAULT_LITERAL_WEIGHT
+        k = self.DEFAULT_TOP_K if top_k is None else int(top_k)
+
+        if file_id is not None:
+            scope = "file"
+        elif workspace_id is not None:
+            scope = "workspace"
+        elif accessible_workspace_ids:
+            scope = "accessible"
+        else:
+            scope = "owner"
+        if workspace_id is not None:
+            scope_workspace_ids = [workspace_id]
+        else:
+            scope_workspace_ids = list(accessible_workspace_ids or [])
+
+        async with self.get_async_session() as session:
+            try:
+                organization_ids: List[int] = []
+                if scope in ("workspace", "accessible"):
+                    organization_ids = await self._organizations_for(session, scope_workspace_ids)
+
+                candidates = max(self.CANDIDATE_POOL, k * 4)
+
+                # A busy workspace may have its vectors in this process (see
+                # core/ann_cache), in which case the vector arm is a list of
+                # ids and distances and only the text arms run here.
+                ann = None
+                if scope == "workspace":
+                    ann = await ann_cache.nearest(
+                        workspace_id, query_embedding, candidates,
+                        load=lambda limit: self.workspace_vectors(workspace_id, limit),
+                    )
+
+                compact = None if ann is not None else await self._vector_index(session)
+                vector = "ann" if ann is not None else (compact or "float")
 
                 # pgvector's text input format, not a Python list. asyncpg binds
                 # this parameter as text for CAST(... AS vector), so a list is
@@ -813,24 +1351,55 @@ class AsyncFileRepository(AsyncBaseRepository):
                 # search raised before touching the index.
                 embedding_literal = "[" + ",".join(str(float(x)) for x in (query_embedding or [])) + "]"
 
-                tokens = literal_tokens(query)
+                oversampled = candidates * self.OVERSAMPLE.get(compact, 1)
+
                 params = {
-                    "literals": " | ".join(tokens) if tokens else "zzzznomatchzzzz",
-                    "has_literals": bool(tokens),
-                    "literal_weight": lw,
                     "embedding": embedding_literal,
                     "keywords": query,
                     "vector_weight": vw,
                     "bm25_weight": bw,
+                    "literal_weight": lw,
+                    # Parsed by the same configuration as the chunks, so "E4"
+                    # is compared as the lexeme 'e4'. Empty when there are
+                    # none, which leaves lit empty.
+                    "literals": " ".join(literal_tokens(query)),
+                    "bm25_k1": self.BM25_K1,
+                    "bm25_b": self.BM25_B,
                     "top_k": k,
-                    "candidates": max(self.CANDIDATE_POOL, k * 4),
+                    "candidates": candidates,
+                    "oversampled": oversampled,
                     "user_id": user_id,
                     "workspace_id": workspace_id,
                     "file_id": file_id,
-                    "accessible_workspace_ids": list(accessible_workspace_ids or []),
+                    # The workspaces searched, for the BM25 statistics and for
+                    # the scope clauses that take a list.
+                    "scope_workspace_ids": scope_workspace_ids,
+                    "scope_unfiled": workspace_id is None and bool(accessible_workspace_ids),
+                    "scope_owner": workspace_id is None and not accessible_workspace_ids,
+                    "organization_ids": organization_ids,
+                    "ann_ids": [chunk_id for chunk_id, _ in ann or []],
+                    "ann_distances": [distance for _, distance in ann or []],
                 }
 
-                result = await session.execute(sql, params)
+                settings = {} if ann is not None else await self._ann_settings(session)
+                if compact is not None:
+                    # ef_search defaults to 40, and without an iterative scan
+                    # that is all the first pass would return, however deep
+                    # the oversampling asks for.
+                    settings["hnsw.ef_search"] = str(min(oversampled, self._MAX_EF_SEARCH))
+                settings.update(self.STATEMENT_SETTINGS.get("*", {}))
+                settings.update(self.STATEMENT_SETTINGS.get(scope, {}))
+                await self._configure(session, settings)
+
+                if self._sampled():
+                    profile = await self._explain(session, scope, vector, params)
+                    if profile is not None:
+                        emit("hybrid_search_explain", ms=profile["execution_ms"],
+                             **{k: v for k, v in profile.items() if k != "execution_ms"})
+                        if profiles is not None:
+                            profiles.append(profile)
+
+                result = await session.execute(self._statement(scope, vector), params)
                 rows = result.fetchall()
                 out: List[Dict[str, Any]] = []
                 for row in rows:
@@ -850,6 +1419,76 @@ class AsyncFileRepository(AsyncBaseRepository):
                 logger.error(f"Error performing hybrid_search: {e}", exc_info=True)
                 return []
 
+    async def workspace_vectors(self, workspace_id: int, limit: int) -> Tuple[List[int], List[Any]]:
+        """Every embedded chunk of a workspace, as (ids, vectors), for ann_cache.
+
+        At most `limit` rows, so the caller can tell a workspace too large to
+        hold without reading all of it. Vectors come back as pgvector's
+        sequences from the typed column. Raises; the cache handles it.
+        """
+        async with self.get_async_session() as session:
+            organization_ids = await self._organizations_for(session, [workspace_id])
+            rows = (await session.execute(
+                select(ChunkORM.id, ChunkORM.embedding)
+                .where(
+                    ChunkORM.organization_id.in_(organization_ids),
+                    ChunkORM.workspace_id == workspace_id,
+                    ChunkORM.embedding.isnot(None),
+                )
+                .order_by(ChunkORM.id)
+                .limit(limit)
+            )).all()
+        return [r.id for r in rows], [r.embedding for r in rows]
+
+    async def chunks_by_ids(self, chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Chunks by id, shaped the way hybrid_search returns them.
+
+        For a query run resuming from a checkpoint, which records the passages
+        it had found by id rather than by text. No scope check: the ids came
+        from a search that was already scoped. A chunk deleted since is simply
+        absent from the result.
+        """
+        if not chunk_ids:
+            return {}
+
+        async with self.get_async_session() as session:
+            try:
+                rows = await session.execute(
+                    text(
+                        """
+                        SELECT c.id AS id,
+                               c.file_id AS file_id,
+                               c.segment_id AS segment_id,
+                               COALESCE(c.content, '') AS content,
+                               f.file_name AS file_name,
+                               f.file_url AS file_url,
+                               s.page_number AS page_number,
+                               s.meta_data AS meta_data
+                        FROM chunks c
+                        JOIN files f ON f.id = c.file_id
+                        LEFT JOIN segments s ON s.id = c.segment_id
+                        WHERE c.id = ANY(:ids)
+                        """
+                    ),
+                    {"ids": [int(i) for i in chunk_ids]},
+                )
+                return {
+                    row.id: {
+                        "chunk_id": row.id,
+                        "file_id": row.file_id,
+                        "segment_id": row.segment_id,
+                        "content": row.content,
+                        "file_name": row.file_name,
+                        "file_url": row.file_url,
+                        "page_number": row.page_number,
+                        "meta_data": row.meta_data if row.meta_data is not None else {},
+                    }
+                    for row in rows
+                }
+            except Exception as e:
+                logger.error(f"Error reading chunks by id: {e}", exc_info=True)
+                return {}
+
     async def get_file_pages(self, file_id: int) -> List[Dict[str, Any]]:
         """Every page of a document, in order, as extracted.
 
@@ -923,7 +1562,10 @@ class AsyncFileRepository(AsyncBaseRepository):
         """
         async with self.get_async_session() as session:
             try:
-                stmt = select(FileORM).where(FileORM.id == file_id)
+                # Waits for a batch of this file's chunks that is being
+                # stored, so that the UPDATE below sees them. See
+                # update_file_with_chunks.
+                stmt = select(FileORM).where(FileORM.id == file_id).with_for_update()
                 result = await session.execute(stmt)
                 file = result.scalar_one_or_none()
                 
@@ -934,6 +1576,22 @@ class AsyncFileRepository(AsyncBaseRepository):
                 file.workspace_id = workspace_id
                 if file_url:
                     file.file_url = file_url
+                # The chunks carry the workspace too, and retrieval trusts
+                # theirs. Same transaction, or a moved document would answer in
+                # the old workspace and not in the new one.
+                await session.execute(
+                    text(
+                        """
+                        UPDATE chunks
+                        SET workspace_id = :workspace_id,
+                            organization_id = (
+                                SELECT organization_id FROM workspaces WHERE id = :workspace_id
+                            )
+                        WHERE file_id = :file_id
+                        """
+                    ),
+                    {"workspace_id": workspace_id, "file_id": file_id},
+                )
                 await session.commit()
                 logger.info(f"Updated file {file_id} workspace to {workspace_id}")
                 return True
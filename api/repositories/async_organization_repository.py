@@ -8,9 +8,10 @@ they are an invitee" proxy did.
 from typing import Any, Dict, List, Optional
 import logging
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 
 from .async_base_repository import AsyncBaseRepository
+from ..core import access_cache
 from ..models.orm_models import (
     Organization,
     OrganizationMember,
@@ -43,6 +44,7 @@ class AsyncOrganizationRepository(AsyncBaseRepository):
                 )
                 await session.commit()
                 logger.info(f"Created organization {org.id} ('{name}') owned by user {owner_user_id}")
+                await access_cache.invalidate([owner_user_id])
                 return org.id
             except Exception as e:
                 await session.rollback()
@@ -72,9 +74,21 @@ class AsyncOrganizationRepository(AsyncBaseRepository):
                 org = await session.get(Organization, organization_id)
                 if not org:
                     return False
+                members = (await session.execute(
+                    select(OrganizationMember.user_id).where(
+                        OrganizationMember.organization_id == organization_id
+                    )
+                )).scalars().all()
+                # The tenant's whole partition of chunks, when chunks is
+                # partitioned, before the cascade goes looking for it.
+                await session.execute(
+                    text("DELETE FROM chunks WHERE organization_id = :organization_id"),
+                    {"organization_id": organization_id},
+                )
                 await session.delete(org)
                 await session.commit()
                 logger.info(f"Deleted organization {organization_id}")
+                await access_cache.invalidate(members)
                 return True
             except Exception as e:
                 await session.rollback()
@@ -139,6 +153,7 @@ class AsyncOrganizationRepository(AsyncBaseRepository):
                 )
                 await session.commit()
                 logger.info(f"Added user {user_id} to org {organization_id} as {role}")
+                await access_cache.invalidate([user_id])
                 return True
             except Exception as e:
                 await session.rollback()
@@ -203,6 +218,7 @@ class AsyncOrganizationRepository(AsyncBaseRepository):
                     f"Removed user {user_id} from org {organization_id} "
                     f"and {len(assignments)} workspace assignment(s)"
                 )
+                await access_cache.invalidate([user_id])
                 return True
             except Exception as e:
                 await session.rollback()
@@ -366,6 +382,7 @@ class AsyncOrganizationRepository(AsyncBaseRepository):
                     f"Set user {user_id} in org {organization_id} to {scope} "
                     f"({sorted(requested) if scope == 'workspace' else 'all workspaces'})"
                 )
+                await access_cache.invalidate([user_id])
                 return True
             except Exception as e:
                 await session.rollback()
@@ -435,6 +452,7 @@ class AsyncOrganizationRepository(AsyncBaseRepository):
                     f"User {user_id} is now {role} in org {organization_id} "
                     f"({len(assignments)} workspace assignment(s) updated)"
                 )
+                await access_cache.invalidate([user_id])
                 return True
             except Exception as e:
                 await session.rollback()
@@ -11,17 +11,36 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .async_base_repository import AsyncBaseRepository
+from ..core import entitlement_cache, user_cache
 
 # Import ORM models from the new models module
 from ..models import User as UserORM
 from ..models import Subscription as SubscriptionORM
 from ..models import CardDetails as CardDetailsORM
+from ..models import OrganizationMember
 
 logger = logging.getLogger(__name__)
 
 class AsyncUserRepository(AsyncBaseRepository):
     """Async repository for user operations."""
 
+    @staticmethod
+    async def _entitled_by(session: AsyncSession, subscription) -> Tuple[List[int], List[int]]:
+        """(organizations, users) whose cached entitlement this subscription decides.
+
+        The organization it pays for, everyone in it, and the subscriber. Read
+        before the commit, so invalidating after it cannot fail.
+        """
+        organization_id = subscription.organization_id
+        users = [subscription.user_id]
+        if organization_id is not None:
+            users += (await session.execute(
+                select(OrganizationMember.user_id).where(
+                    OrganizationMember.organization_id == organization_id
+                )
+            )).scalars().all()
+        return [organization_id] if organization_id is not None else [], users
+
     async def add_user(self, email: str, username: str) -> Optional[int]:
         """Add a new user to the database.
 
@@ -41,6 +60,8 @@ class AsyncUserRepository(AsyncBaseRepository):
                 user_id = user_orm.id
                 await session.commit()
                 logger.info(f"Successfully added user {username} with email {email}")
+                # Over whatever an account deleted under this address left.
+                await user_cache.put(email, user_id)
                 return user_id
             except IntegrityError as e:
                 await session.rollback()
@@ -84,13 +105,20 @@ class AsyncUserRepository(AsyncBaseRepository):
 
         Returns:
             Optional[int]: User ID if found, None otherwise
+
+        Runs on every authenticated request, so a found id is cached
+        (core/user_cache) until the account is deleted.
         """
+        cached = await user_cache.get(email)
+        if cached is not None:
+            return cached
         async with self.get_async_session() as session:
             try:
-                stmt = select(UserORM).where(UserORM.email == email)
-                result = await session.execute(stmt)
-                user_orm = result.scalar_one_or_none()
-                return user_orm.id if user_orm else None
+                stmt = select(UserORM.id).where(UserORM.email == email)
+                user_id = (await session.execute(stmt)).scalar_one_or_none()
+                if user_id is not None:
+                    await user_cache.put(email, user_id)
+                return user_id
             except Exception as e:
                 logger.error(f"Error getting user ID for email {email}: {e}", exc_info=True)
                 return None
@@ -114,17 +142,22 @@ class AsyncUserRepository(AsyncBaseRepository):
                     logger.warning(f"Attempted to delete non-existent user: {user_id}")
                     return False
 
+                email = user_orm.email
                 await session.delete(user_orm)
                 await session.commit()
                 logger.info(f"Successfully deleted user {user_id} with cascade")
+                await user_cache.forget(email)
                 return True
             except Exception as e:
                 await session.rollback()
                 logger.error(f"Error deleting user {user_id}: {e}", exc_info=True)
                 async with self.get_async_session() as fallback_session:
                     try:
-                        await fallback_session.execute(text(f"DELETE FROM users WHERE id = {user_id}"))
+                        email = (await fallback_session.execute(
+                            text(f"DELETE FROM users WHERE id = {user_id} RETURNING email")
+                        )).scalar()
                         await fallback_session.commit()
+                        await user_cache.forget(email)
                         logger.info(f"Deleted user {user_id} using direct SQL after ORM failure")
                         return True
                     except Exception as sql_error:
@@ -226,8 +259,10 @@ class AsyncUserRepository(AsyncBaseRepository):
                             )
                             session.add(new_card)
 
+                    organizations, users = await self._entitled_by(session, existing_sub)
                     await session.commit()
                     logger.info(f"Updated subscription for user {user_id}")
+                    await entitlement_cache.invalidate(organizations, users)
                     return True
                 else:
                     # Create new subscription
@@ -260,8 +295,10 @@ class AsyncUserRepository(AsyncBaseRepository):
                         )
                         session.add(new_card)
 
+                    organizations, users = await self._entitled_by(session, new_sub)
                     await session.commit()
                     logger.info(f"Created new subscription for user {user_id}")
+                    await entitlement_cache.invalidate(organizations, users)
                     return True
 
             except Exception as e:
@@ -373,8 +410,10 @@ class AsyncUserRepository(AsyncBaseRepository):
                         )
                         session.add(new_card)
 
+                organizations, users = await self._entitled_by(session, subscription)
                 await session.commit()
                 logger.info(f"Updated subscription for customer {stripe_customer_id}")
+                await entitlement_cache.invalidate(organizations, users)
                 return True
 
             except Exception as e:
@@ -464,8 +503,10 @@ class AsyncUserRepository(AsyncBaseRepository):
                     return False
 
                 subscription.status = new_status
+                organizations, users = await self._entitled_by(session, subscription)
                 await session.commit()
                 logger.info(f"Successfully updated subscription status for customer {stripe_customer_id}")
+                await entitlement_cache.invalidate(organizations, users)
                 return True
 
             except Exception as e:
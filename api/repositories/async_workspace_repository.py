@@ -6,6 +6,7 @@ import uuid
 from datetime import datetime, timedelta
 
 from .async_base_repository import AsyncBaseRepository
+from ..core import access_cache
 from ..models import Workspace as WorkspaceORM
 from ..models.orm_models import WorkspaceMember, WorkspaceInvite, Organization, User as UserORM
 
@@ -44,8 +45,11 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                 session.add(workspace)
                 await session.flush()
                 workspace_id = workspace.id
+                # Everyone with organization-wide reach gains it.
+                affected = await self._organization_member_ids(session, organization_id) + [user_id]
                 await session.commit()
                 logger.info(f"Created workspace {name} (ID: {workspace_id}) for user {user_id}")
+                await access_cache.invalidate(affected)
                 return workspace_id
             except Exception as e:
                 await session.rollback()
@@ -93,6 +97,19 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                 logger.error(f"Error resolving organization for user {user_id}: {e}", exc_info=True)
                 return None
 
+    @staticmethod
+    async def _organization_member_ids(session: AsyncSession, organization_id: Optional[int]) -> List[int]:
+        """Everyone in an organization, whose reach a new or deleted workspace changes."""
+        from ..models.orm_models import OrganizationMember
+
+        if organization_id is None:
+            return []
+        return list((await session.execute(
+            select(OrganizationMember.user_id).where(
+                OrganizationMember.organization_id == organization_id
+            )
+        )).scalars().all())
+
     async def count_workspaces_for_user(self, user_id: int) -> int:
         """Return the number of workspaces owned by a user."""
         async with self.get_async_session() as session:
@@ -410,7 +427,13 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
         membership is still required, but the boundary between two clients'
         knowledge bases stops being visible, which is exactly what a dental or
         legal customer is trusting us with.
+
+        Cached per user for a minute (core/access_cache). Everything here that
+        changes somebody's reach invalidates it after committing.
         """
+        cached, epoch = await access_cache.get(user_id, organization_id)
+        if cached is not None:
+            return cached
         async with self.get_async_session() as session:
             try:
                 from ..models.orm_models import OrganizationMember
@@ -472,6 +495,9 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                     explicit = explicit.where(WorkspaceORM.organization_id == organization_id)
                 ids |= set((await session.execute(explicit)).scalars().all())
 
+                # Not on the error path below: an empty list from a failure
+                # must not be remembered as the answer.
+                await access_cache.put(user_id, organization_id, sorted(ids), epoch)
                 return sorted(ids)
             except Exception as e:
                 logger.error(f"Error listing accessible workspaces for user {user_id}: {e}", exc_info=True)
@@ -575,9 +601,26 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                     logger.warning(f"Workspace {workspace_id} not found for deletion")
                     return False
 
+                affected = await self._organization_member_ids(
+                    session, workspace.organization_id
+                ) + [workspace.user_id]
+                affected += (await session.execute(
+                    select(WorkspaceMember.user_id).where(WorkspaceMember.workspace_id == workspace_id)
+                )).scalars().all()
+
+                # In the organization's partition of chunks, in one statement,
+                # rather than file by file through the cascade.
+                await session.execute(
+                    text(
+                        "DELETE FROM chunks "
+                        "WHERE organization_id = :organization_id AND workspace_id = :workspace_id"
+                    ),
+                    {"organization_id": workspace.organization_id, "workspace_id": workspace_id},
+                )
                 await session.delete(workspace)
                 await session.commit()
                 logger.info(f"Deleted workspace {workspace_id}")
+                await access_cache.invalidate(affected)
                 return True
 
             except Exception as e:
@@ -636,6 +679,7 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                 member = WorkspaceMember(workspace_id=workspace_id, user_id=user_id, role=role)
                 session.add(member)
                 await session.commit()
+                await access_cache.invalidate([user_id])
                 return True
             except Exception as e:
                 await session.rollback()
@@ -655,6 +699,7 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                     return False
                 await session.delete(member)
                 await session.commit()
+                await access_cache.invalidate([user_id])
                 return True
             except Exception as e:
                 await session.rollback()
@@ -917,6 +962,7 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                 await session.commit()
                 if joined:
                     logger.info(f"User {user_id} joined organizations {joined} via invites at signup")
+                    await access_cache.invalidate([user_id])
                 return joined
             except Exception as e:
                 await session.rollback()
@@ -1005,6 +1051,7 @@ class AsyncWorkspaceRepository(AsyncBaseRepository):
                         logger.info(f"User {user_id} joined organization {org_id} with {scope} scope")
 
                 await session.commit()
+                await access_cache.invalidate([user_id])
                 # A dict, not the workspace id: an organization-wide invite has
                 # no workspace, and returning None for it made a successful
                 # accept indistinguishable from a failure. The invite was
@@ -723,6 +723,11 @@ async def move_file_to_workspace(
                 detail="Failed to move file"
             )
         
+        # Both sets of documents changed: the one it left still has answers
+        # and vectors that include it, the one it joined has neither.
+        await query_cache.bump_document_version(file.get('workspace_id'))
+        await query_cache.bump_document_version(target_workspace_id)
+
         logger.info(f"File {file_id} moved to workspace {target_workspace_id} by user {user_id}")
         
         return {
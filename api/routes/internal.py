@@ -1,8 +1,11 @@
+import asyncio
 import hmac
 import logging
 import os
+import time
 
 from fastapi import APIRouter, HTTPException, Request, status, Header
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 
@@ -47,6 +50,77 @@ def _assert_from_worker(supplied: Optional[str]) -> None:
             detail="Not permitted.",
         )
 
+# Queue metrics for Prometheus. Rates and percentiles cover the last
+# METRICS_WINDOW_SECONDS; a scrape within METRICS_CACHE_SECONDS of the last one
+# is answered from memory, so several scrapers, or one scraping every second,
+# cost the database one aggregate every few seconds at most.
+METRICS_WINDOW_SECONDS = int(os.getenv("METRICS_WINDOW_SECONDS", "900"))
+METRICS_CACHE_SECONDS = float(os.getenv("METRICS_CACHE_SECONDS", "5"))
+
+_metrics_cache: Dict[str, Any] = {"body": None, "at": 0.0}
+_metrics_lock = asyncio.Lock()
+
+_QUANTILES = ("0.5", "0.95", "0.99")
+
+
+def _label(value: Any) -> str:
+    return str(value if value is not None else "").replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _render_metrics(data: Dict[str, Any], window_seconds: int) -> str:
+    """Prometheus text exposition format, version 0.0.4."""
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def sample(name: str, value: Any, **labels: Any) -> None:
+        rendered = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+        lines.append(f"{name}{{{rendered}}} {float(value or 0):g}")
+
+    family("syntext_agent_runs", "gauge",
+           "Runs queued or running, by run type and organization.")
+    for row in data["live"]:
+        sample("syntext_agent_runs", row["n"], status=row["status"],
+               run_type=row["run_type"], organization_id=row["org_id"])
+
+    family("syntext_agent_runs_oldest_queued_seconds", "gauge",
+           "Age of the oldest queued run, by run type.")
+    oldest: Dict[str, float] = {}
+    for row in data["live"]:
+        if row.get("oldest_seconds") is not None:
+            oldest[row["run_type"]] = max(oldest.get(row["run_type"], 0.0),
+                                          float(row["oldest_seconds"]))
+    for run_type, seconds in sorted(oldest.items()):
+        sample("syntext_agent_runs_oldest_queued_seconds", seconds, run_type=run_type)
+
+    family("syntext_agent_runs_claims_per_second", "gauge",
+           f"Runs claimed per second over the last {window_seconds}s.")
+    for row in data["window"]:
+        sample("syntext_agent_runs_claims_per_second",
+               (row["claimed"] or 0) / window_seconds, run_type=row["run_type"])
+
+    family("syntext_agent_runs_lease_reclaims", "gauge",
+           f"Runs whose lease was reclaimed in the last {window_seconds}s.")
+    for row in data["window"]:
+        sample("syntext_agent_runs_lease_reclaims", row["reclaims"], run_type=row["run_type"])
+
+    for name, column, count, help_text in (
+        ("syntext_agent_run_queue_wait_seconds", "wait", "claimed",
+         "Time from enqueue to claim"),
+        ("syntext_agent_run_duration_seconds", "duration", "finished",
+         "Time from claim to finish"),
+    ):
+        family(name, "summary", f"{help_text}, over the last {window_seconds}s.")
+        for row in data["window"]:
+            for q, value in zip(_QUANTILES, row[column] or ()):
+                sample(name, value, run_type=row["run_type"], quantile=q)
+            sample(f"{name}_count", row[count], run_type=row["run_type"])
+
+    return "\n".join(lines) + "\n"
+
+
 class WorkerNotification(BaseModel):
     user_id: str
     event_type: str  # e.g., "file_status_update"
@@ -83,7 +157,7 @@ async def eval_query_endpoint(
     if not authorization:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    success, user_info = get_user_id(authorization)
+    success, user_info = await get_user_id(authorization)
     if not success:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -159,3 +233,49 @@ async def notify_client_endpoint(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to relay notification to client"
         )
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Queue metrics in Prometheus text format",
+    tags=["Internal"],
+)
+async def metrics_endpoint(
+    request: Request,
+    x_internal_secret: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None),
+):
+    """The agent_runs queue, for deciding when to add a worker replica.
+
+    Behind the same secret as the worker's notifications, sent either as
+    X-Internal-Secret or as a bearer token, which is what a Prometheus scrape
+    config can send. Everything is aggregated from agent_runs, so it is the same
+    from whichever API replica answers.
+    """
+    bearer = None
+    if authorization and authorization.lower().startswith("bearer "):
+        bearer = authorization[7:]
+    _assert_from_worker(x_internal_secret or bearer)
+
+    async with _metrics_lock:
+        if (
+            _metrics_cache["body"] is None
+            or time.monotonic() - _metrics_cache["at"] >= METRICS_CACHE_SECONDS
+        ):
+            store: RepositoryManager = request.app.state.store
+            try:
+                data = await store.agent_run_repo.queue_metrics(
+                    window_seconds=METRICS_WINDOW_SECONDS
+                )
+            except Exception as e:
+                logger.error(f"Could not aggregate queue metrics: {e}", exc_info=True)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Metrics unavailable.",
+                )
+            _metrics_cache["body"] = _render_metrics(data, METRICS_WINDOW_SECONDS)
+            _metrics_cache["at"] = time.monotonic()
+        body = _metrics_cache["body"]
+
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
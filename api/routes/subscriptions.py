@@ -787,6 +787,10 @@ async def webhook(request: Request, store: RepositoryManager = Depends(get_store
             # two rows sharing a customer id made scalar_one_or_none raise
             # MultipleResultsFound: their webhooks broke entirely, and before
             # that the wrong organization's row could be updated.
+            #
+            # The update also invalidates the cached entitlement of the
+            # organization and its members (core/entitlement_cache), so a lapse
+            # is refused on their next request, not when the cache expires.
             await store.user_repo.update_subscription(
                 stripe_customer_id=stripe_customer_id,
                 stripe_subscription_id=_read(data_object, 'id'),
@@ -3,7 +3,7 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
 from typing import Dict, Optional
-from ..core.utils import decode_firebase_token
+from ..core.utils import verify_firebase_token
 from ..core.auth import authenticate_user, get_store
 from api.workflows.tasks import delete_user_task
 from api.repositories.repository_manager import RepositoryManager
@@ -43,7 +43,7 @@ async def get_firebase_user_info_from_token(authorization: str = Header(None)):
         logger.warning("POST /users: Invalid or missing Authorization token for new user registration flow.")
         raise HTTPException(status_code=401, detail="Unauthorized: Missing or invalid token")
     token = authorization.split("Bearer ")[1]
-    success, user_info = decode_firebase_token(token)
+    success, user_info = await verify_firebase_token(token)
     if not success or not user_info: # Ensure user_info is not None
         logger.warning(f"POST /users: Failed to decode Firebase token or token yielded no user_info.")
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid or unparseable token")
@@ -294,10 +294,17 @@ async def main() -> int:
         await aclose_client()
         return 0
 
+    from api.core import query_cache
+
     total = 0
     for ws in targets:
         logger.info(f"\nworkspace {ws}")
-        total += await _repair(repo, ws, args.dry_run, get_text_embeddings_in_batches)
+        repaired = await _repair(repo, ws, args.dry_run, get_text_embeddings_in_batches)
+        if repaired:
+            # New vectors: cached answers and in-process vectors for this
+            # workspace were computed from the old ones.
+            await query_cache.bump_document_version(ws)
+        total += repaired
 
     logger.info(f"\nDone. {total} chunk(s) re-embedded.")
     await aclose_client()
@@ -23,6 +23,7 @@ rather than per call. Close it on shutdown with `aclose_client()`.
 import asyncio
 import json
 import logging
+from contextlib import asynccontextmanager
 from typing import Callable, List, Dict, Any, Optional
 import base64
 import httpx
@@ -30,6 +31,8 @@ import os
 import time
 from dotenv import load_dotenv
 
+from api.core.timing import emit
+
 # Load environment variables
 load_dotenv()
 MODEL_ACCESS_KEY = os.getenv("MODEL_ACCESS_KEY")
@@ -157,7 +160,130 @@ VISION_DEADLINE = float(os.getenv("VISION_DEADLINE", "600"))
 #
 # Three, with a timeout long enough that a queued request still lands. The real
 # ceiling is the endpoint, not this process.
+#
+# Now only the STARTING point. Three was right for the endpoint that queued
+# server side and wrong for a healthy one, and no single number is right for a
+# provider whose capacity changes by the hour, so the limit moves: see
+# AdaptiveLimiter below. MIN and MAX bound how far it may move.
 VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "3"))
+VISION_CONCURRENCY_MIN = int(os.getenv("VISION_CONCURRENCY_MIN", "1"))
+VISION_CONCURRENCY_MAX = int(os.getenv("VISION_CONCURRENCY_MAX", "12"))
+
+# A successful read slower than this multiple of the running typical latency
+# means the far end is queueing, and the limit stops growing.
+VISION_LATENCY_TOLERANCE = float(os.getenv("VISION_LATENCY_TOLERANCE", "2.0"))
+
+def _is_overload(error: BaseException) -> bool:
+    """Whether an exception is the far end saying it cannot keep up."""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return isinstance(status, int) and (status in (408, 429) or status >= 500)
+
+
+class AdaptiveLimiter:
+    """A concurrency limit that follows what the far end can actually serve.
+
+    Additive increase, multiplicative decrease, the way TCP finds a link's
+    capacity. Every read that succeeds at a normal latency grows the limit by
+    1/limit, so about one slot per full window of good reads. A timeout, a 408,
+    a 429 or a 5xx halves it, once per window: the calls that were already in
+    flight when it was halved are reporting on the old limit, and a burst of
+    them timing out together must not halve it once each. A success that took more than
+    VISION_LATENCY_TOLERANCE times the typical latency holds it where it is,
+    because that is the endpoint queueing, which is how the eight-at-once
+    experiment failed: every request slowed together until all of them timed
+    out.
+
+    One per process, shared by every document the worker is extracting, since
+    the capacity being measured belongs to the provider and not to a document.
+    Each change of the whole-number limit is emitted as `vision_concurrency`,
+    and each read as `vision_read`, through core/timing.
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int,
+                 latency_tolerance: float):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self._typical_latency: Optional[float] = None
+        # When the limit was last halved. An overload from a call that started
+        # before then has already been answered.
+        self._decreased_at = float("-inf")
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot for one call.
+
+        Yields a dict for the caller to mark: set "overload" when the far end
+        said it was overwhelmed, "failed" for any other failure. Unmarked means
+        it worked. An exception escaping the block counts as overload if it is
+        a timeout or a 408, 429 or 5xx, and as a failure otherwise; a
+        cancellation is neither.
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        outcome: Dict[str, Any] = {}
+        started = time.monotonic()
+        try:
+            yield outcome
+        except asyncio.CancelledError:
+            # Shutdown, not the far end. Says nothing about its capacity.
+            outcome["failed"] = True
+            raise
+        except Exception as e:
+            outcome["overload" if _is_overload(e) else "failed"] = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            async with self._changed:
+                self.in_flight -= 1
+                self._record(started, elapsed, outcome)
+                self._changed.notify_all()
+
+    def _record(self, started: float, elapsed: float, outcome: Dict[str, Any]) -> None:
+        before = int(self.limit)
+        if outcome.get("overload"):
+            if started >= self._decreased_at:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._decreased_at = time.monotonic()
+            verdict = "overload"
+        elif outcome.get("failed"):
+            verdict = "failed"
+        else:
+            typical = self._typical_latency
+            if typical is not None and elapsed > typical * self.latency_tolerance:
+                verdict = "slow"
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                verdict = "ok"
+            # Slow reads feed the average too, or a provider that has settled
+            # at a slower speed would be called congested forever.
+            self._typical_latency = (
+                elapsed if typical is None else typical * 0.9 + elapsed * 0.1
+            )
+
+        emit(f"{self.name}_read", ms=elapsed * 1000, outcome=verdict,
+             limit=int(self.limit), in_flight=self.in_flight)
+        if int(self.limit) != before:
+            emit(f"{self.name}_concurrency", limit=int(self.limit), previous=before,
+                 reason=verdict)
+
+
+vision_limiter = AdaptiveLimiter(
+    "vision",
+    initial=VISION_CONCURRENCY,
+    minimum=VISION_CONCURRENCY_MIN,
+    maximum=VISION_CONCURRENCY_MAX,
+    latency_tolerance=VISION_LATENCY_TOLERANCE,
+)
+
 
 VISION_PROMPT = (
     "Transcribe this page as markdown. Reproduce every table as a real markdown "
@@ -300,7 +426,7 @@ TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0"))
 MIN_COMPLETION_TOKENS = 500
 
 
-async def read_page(image_png: bytes, hint: str = "") -> str:
+async def read_page(image: bytes, hint: str = "", mime_type: str = "image/png") -> str:
     """Read one rendered page and return it as markdown.
 
     WHY THIS EXISTS
@@ -321,6 +447,8 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
     An empty string means "use the text layer", and every caller must treat it
     that way. A page that fails here should cost accuracy, never the document.
 
+    `image` is the rendered page, PNG unless `mime_type` says otherwise.
+
     `hint` is the text layer for this page, passed to the model as a
     transcription aid rather than as truth: the characters are all correct, it
     is only their order that is wrong.
@@ -343,7 +471,7 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
     content.append({
         "type": "image_url",
         "image_url": {
-            "url": "data:image/png;base64," + base64.b64encode(image_png).decode()
+            "url": f"data:{mime_type};base64," + base64.b64encode(image).decode()
         },
     })
 
@@ -378,6 +506,19 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
     }
     url = f"{VISION_BASE_URL.rstrip('/')}/chat/completions"
 
+    # Every read goes through the process-wide limiter, which is what decides
+    # how many of these are in flight at once across all documents.
+    async with vision_limiter.slot() as outcome:
+        return await _stream_vision_read(url, headers, data, outcome)
+
+
+async def _stream_vision_read(
+    url: str, headers: Dict[str, str], data: Dict[str, Any], outcome: Dict[str, Any]
+) -> str:
+    """The streamed request behind read_page, marking `outcome` for the limiter.
+
+    Never raises, like read_page.
+    """
     try:
         parts: List[str] = []
         finish_reason = None
@@ -391,6 +532,12 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
                     # httpx refuses to look at it until it has been.
                     await response.aread()
                     logger.warning("Vision read refused: %s", response.status_code)
+                    # 408 and 429 are the far end saying it is overwhelmed, and
+                    # so is a 5xx. Anything else is about this request.
+                    if response.status_code in (408, 429) or response.status_code >= 500:
+                        outcome["overload"] = True
+                    else:
+                        outcome["failed"] = True
                     return ""
                 async for line in response.aiter_lines():
                     if time.monotonic() - started > VISION_DEADLINE:
@@ -403,6 +550,7 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
                             "Vision read exceeded %ss and was discarded; the page "
                             "keeps its text layer", VISION_DEADLINE,
                         )
+                        outcome["overload"] = True
                         return ""
                     if not line.startswith("data: "):
                         continue
@@ -432,6 +580,7 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
                 "Vision read returned nothing (finish_reason=%s). Falling back "
                 "to the text layer.", finish_reason
             )
+            outcome["failed"] = True
         else:
             logger.debug(
                 "Vision page read in %.0fs (first token %.1fs, %d chars)",
@@ -440,6 +589,11 @@ async def read_page(image_png: bytes, hint: str = "") -> str:
         return text.strip()
     except Exception as e:
         logger.warning("Vision read failed: %s", type(e).__name__)
+        # Timeouts and dropped connections are what an overloaded endpoint
+        # looks like from here; measured 2026-08-13, that is what the eight
+        # concurrent reads died of.
+        outcome["overload"] = isinstance(e, (httpx.TimeoutException, httpx.TransportError))
+        outcome["failed"] = True
         return ""
 
 
@@ -9,12 +9,17 @@ as written. Point them at the local stack:
 
 Every test creates its own organization and users and removes them afterwards,
 so a run leaves no trace in whatever database it was pointed at.
+
+The Redis caches are the exception: their tests are about what each cache
+believes and when, which a dictionary answers as well as Redis does, so they
+share the stand-in below rather than needing a server.
 """
 import uuid
 
 import pytest
 import pytest_asyncio
 
+from api.core import ann_cache, epoch_cache, user_cache
 from api.models.async_db import get_database_url
 from api.repositories.repository_manager import RepositoryManager
 
@@ -114,3 +119,56 @@ async def client(store):
         yield Client()
 
     app.dependency_overrides.clear()
+
+
+class FakeRedis:
+    """The few Redis commands the caches use, over a dictionary.
+
+    Values are kept as strings, as the real client returns them. Set down to
+    make every command fail as an unreachable server would.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.reads = 0
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis is down")
+
+    async def get(self, key):
+        self._check()
+        self.reads += 1
+        return self.values.get(key)
+
+    async def mget(self, keys):
+        self._check()
+        self.reads += 1
+        return [self.values.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None, nx=False):
+        self._check()
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value)
+        return True
+
+    async def delete(self, *keys):
+        self._check()
+        return sum(self.values.pop(k, None) is not None for k in keys)
+
+
+@pytest.fixture
+def redis(monkeypatch) -> FakeRedis:
+    """A FakeRedis that every cache module talks to, as if Redis were configured."""
+    fake = FakeRedis()
+
+    async def client():
+        return fake
+
+    for module in (epoch_cache, user_cache, ann_cache):
+        monkeypatch.setattr(module, "_get_client", client)
+    for module in (epoch_cache, user_cache):
+        monkeypatch.setattr(module, "is_enabled", lambda: True)
+    return fake
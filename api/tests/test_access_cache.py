@@ -0,0 +1,72 @@
+"""Cached workspace access, which decides what a user may read.
+
+This cache is authorisation, so the failures that matter are the ones that
+let somebody keep reading what they were just removed from: a change to their
+reach that is not seen on the next request, or a database read that began
+before the change landing in the cache after it. The rest hold it to its
+purpose, a hit costing one Redis read, and to failing closed when Redis fails.
+"""
+import pytest
+
+from api.core import access_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def test_a_stored_answer_is_one_read(redis):
+    ids, epoch = await access_cache.get(7, None)
+    assert ids is None
+    await access_cache.put(7, None, [3, 1], epoch)
+
+    redis.reads = 0
+    ids, _ = await access_cache.get(7, None)
+    assert ids == [3, 1]
+    assert redis.reads == 1
+
+
+async def test_the_organization_filter_is_its_own_answer(redis):
+    _, epoch = await access_cache.get(7, None)
+    await access_cache.put(7, None, [1, 2, 3], epoch)
+
+    ids, _ = await access_cache.get(7, 5)
+    assert ids is None, "the unfiltered list answered for one organization"
+
+
+async def test_a_change_to_their_reach_is_seen_at_once(redis):
+    _, epoch = await access_cache.get(7, None)
+    await access_cache.put(7, None, [1, 2], epoch)
+
+    await access_cache.invalidate([7])
+
+    ids, _ = await access_cache.get(7, None)
+    assert ids is None, "a removed member kept reading from the cache"
+
+
+async def test_an_answer_read_before_a_change_is_never_served_after_it(redis):
+    # Read the epoch, then the database, and meanwhile the member is removed
+    # and the cache invalidated. The late write must not be believed.
+    _, epoch = await access_cache.get(7, None)
+    await access_cache.invalidate([7])
+    await access_cache.put(7, None, [1, 2], epoch)
+
+    ids, _ = await access_cache.get(7, None)
+    assert ids is None
+
+
+async def test_other_users_are_untouched(redis):
+    _, epoch = await access_cache.get(8, None)
+    await access_cache.put(8, None, [4], epoch)
+
+    await access_cache.invalidate([7, None])
+
+    ids, _ = await access_cache.get(8, None)
+    assert ids == [4]
+
+
+async def test_a_redis_that_fails_is_a_miss_and_stores_nothing(redis):
+    redis.down = True
+
+    assert await access_cache.get(7, None) == (None, None)
+    # Neither raises into the membership change that called them.
+    await access_cache.put(7, None, [1], "epoch")
+    await access_cache.invalidate([7])
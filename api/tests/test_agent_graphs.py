@@ -0,0 +1,42 @@
+"""The agent graphs are built once per process and cost next to nothing to run.
+
+Two regressions worth catching: an ingest that fails being run a second time
+(the fallback that used to download and parse the document again), and the
+orchestration around the nodes growing into something that matters next to a
+model call.
+"""
+import pytest
+
+from api.agents.overhead import measure_graph_overhead
+from api.workflows import tasks
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def test_a_failing_ingest_is_not_run_twice(monkeypatch):
+    calls = []
+
+    async def broken(**kwargs):
+        calls.append(kwargs["file_id"])
+        raise RuntimeError("parser crashed")
+
+    monkeypatch.setattr(tasks.ingestion_agent, "_process_fn", broken)
+    graph = tasks.ingestion_agent._graph
+
+    with pytest.raises(RuntimeError):
+        await tasks.process_file_data(
+            user_id=1, file_id=42, filename="a.pdf", file_url="gs://b/a.pdf", workspace_id=None,
+        )
+
+    assert calls == [42], "the ingest ran again after the agent raised"
+    assert tasks.ingestion_agent._graph is graph
+
+
+async def test_orchestration_is_measured_and_small():
+    overhead = await measure_graph_overhead(runs=5)
+
+    assert set(overhead) == {"ingestion", "query"}
+    for numbers in overhead.values():
+        # A model call is seconds. Tens of milliseconds outside the nodes would
+        # mean something is being rebuilt per run.
+        assert numbers["ainvoke_us"] < 50_000
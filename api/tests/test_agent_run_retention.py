@@ -0,0 +1,121 @@
+"""Old traces leave agent_runs; what the dashboard reads stays.
+
+The retention job moves the full result of a finished run past the window into
+agent_runs_archive. Two things must survive it: the trace itself, which the
+feedback report still joins to, and cited_file_ids on the row, which the usage
+dashboard reads to say which documents have never answered anything. Losing
+the second would list every document in an old account as unused.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.models.orm_models import AgentRun, AgentRunArchive
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+_TRACE = {
+    "mode": "retrieve",
+    "rewritten_query": "charging chart for R-410A",
+    "context_chunks": 12,
+    "cited_file_ids": [7, 9],
+}
+
+
+async def _run(store, tenant, *, status: str, age_days: int) -> AgentRun:
+    async with store.agent_run_repo.get_async_session() as session:
+        run = AgentRun(
+            run_type="answer_query", agent_name="test", status=status,
+            payload={}, result=dict(_TRACE), user_id=tenant.owner,
+            created_at=datetime.utcnow() - timedelta(days=age_days),
+        )
+        session.add(run)
+        await session.commit()
+        return run.id
+
+
+async def test_an_old_trace_is_archived_and_the_citations_stay(store, tenant):
+    old = await _run(store, tenant, status="succeeded", age_days=200)
+    recent = await _run(store, tenant, status="succeeded", age_days=1)
+
+    await store.agent_run_repo.run_maintenance(archive_after_days=90)
+
+    async with store.agent_run_repo.get_async_session() as session:
+        old_row = await session.get(AgentRun, old)
+        recent_row = await session.get(AgentRun, recent)
+        archived = await session.get(AgentRunArchive, old)
+
+    assert old_row.result == {"archived": True, "cited_file_ids": [7, 9]}
+    assert archived is not None and archived.result == _TRACE
+    assert recent_row.result == _TRACE, "a run inside the window was archived"
+
+
+async def test_a_run_still_in_the_queue_is_never_archived(store, tenant):
+    """However old. Its result is not final yet, if it has one at all."""
+    stuck = await _run(store, tenant, status="running", age_days=200)
+
+    await store.agent_run_repo.run_maintenance(archive_after_days=90)
+
+    async with store.agent_run_repo.get_async_session() as session:
+        row = await session.get(AgentRun, stuck)
+    assert row.result == _TRACE
+
+
+class _Result:
+    def __init__(self, value=None, rowcount=0):
+        self._value = value
+        self.rowcount = rowcount
+
+    def scalar(self):
+        return self._value
+
+
+class _Transaction:
+    """A session that records what it sent, standing in for one transaction."""
+
+    def __init__(self, log):
+        self.sent = []
+        log.append(self.sent)
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.sent.append(sql)
+        if "to_regclass" in sql:
+            return _Result(False)
+        if "advisory" in sql:
+            return _Result(True)
+        if "agent_runs_archive" in sql:
+            return _Result(rowcount=params["batch"])
+        return _Result()
+
+    async def commit(self):
+        self.sent.append("COMMIT")
+
+    async def rollback(self):
+        self.sent.append("ROLLBACK")
+
+
+async def test_the_queue_is_locked_one_statement_at_a_time():
+    """A partition's lock on agent_runs is never held across the archive.
+
+    Creating them and archiving twenty batches used to be one transaction, so
+    every enqueue and claim waited for all of it.
+    """
+    from contextlib import asynccontextmanager
+
+    from api.repositories.async_agent_run_repository import AsyncAgentRunRepository
+
+    transactions = []
+    repo = AsyncAgentRunRepository.__new__(AsyncAgentRunRepository)
+
+    @asynccontextmanager
+    async def session():
+        yield _Transaction(transactions)
+
+    repo.get_async_session = session
+    done = await repo.run_maintenance(months_ahead=1, batch=10, max_batches=3)
+
+    assert done == {"partitions_created": 2, "results_archived": 30}
+    for sent in transactions:
+        work = [s for s in sent if "PARTITION OF" in s or "agent_runs_archive" in s]
+        assert len(work) == 1 and sent[-1] == "COMMIT", sent
@@ -0,0 +1,95 @@
+"""The in-process vector arm, which answers a search without Postgres.
+
+It must rank exactly as pgvector's cosine distance would, or a warm workspace
+returns different chunks from a cold one. It must also never answer from
+vectors older than the workspace's documents, so a bumped documents counter in
+Redis drops it, and with no Redis to ask there is no cache at all. The first
+search only starts the load and is answered by the database meanwhile. And the
+files it leaves on disk must not grow with every workspace ever searched.
+"""
+import asyncio
+import os
+
+import pytest
+
+from api.core import ann_cache
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+IDS = [11, 12, 13, 14]
+ROWS = [[1.0, 0.0, 0.0], [0.6, 0.8, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 2.0]]
+
+
+@pytest.fixture
+def cache(redis, monkeypatch, tmp_path):
+    monkeypatch.setattr(ann_cache, "ENABLED", True)
+    monkeypatch.setattr(ann_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ann_cache, "_entries", ann_cache.OrderedDict())
+    monkeypatch.setattr(ann_cache, "_loading", {})
+    return redis
+
+
+def _loader(calls):
+    async def load(limit):
+        calls.append(limit)
+        return IDS, ROWS
+    return load
+
+
+async def _warm(load, k=2, workspace_id=7):
+    assert await ann_cache.nearest(workspace_id, [1.0, 0.0, 0.0], k, load=load) is None
+    await asyncio.gather(*ann_cache._loading.values())
+
+
+async def test_a_warm_workspace_ranks_by_exact_cosine_distance(cache):
+    calls = []
+    await _warm(_loader(calls))
+
+    hits = await ann_cache.nearest(7, [2.0, 0.0, 0.0], 3, load=_loader(calls))
+
+    assert [chunk_id for chunk_id, _ in hits] == [11, 12, 13]
+    assert [round(d, 6) for _, d in hits] == [0.0, 0.4, 1.0]
+    assert calls == [ann_cache.MAX_CHUNKS + 1], "loaded from the database more than once"
+
+
+async def test_a_document_change_drops_the_workspace(cache):
+    calls = []
+    await _warm(_loader(calls))
+
+    cache.values[f"{ann_cache._VERSION_PREFIX}7"] = "1"
+
+    assert await ann_cache.nearest(7, [1.0, 0.0, 0.0], 2, load=_loader(calls)) is None
+    await asyncio.gather(*ann_cache._loading.values())
+    assert len(calls) == 2
+    assert await ann_cache.nearest(7, [1.0, 0.0, 0.0], 2, load=_loader(calls)) is not None
+
+
+async def test_without_redis_postgres_answers(cache, monkeypatch):
+    await _warm(_loader([]))
+
+    async def no_client():
+        return None
+
+    monkeypatch.setattr(ann_cache, "_get_client", no_client)
+    assert await ann_cache.nearest(7, [1.0, 0.0, 0.0], 2, load=_loader([])) is None
+
+
+async def test_too_large_to_brute_force_without_hnswlib_stays_in_sql(cache, monkeypatch):
+    monkeypatch.setattr(ann_cache, "BRUTE_FORCE_MAX", 2)
+    monkeypatch.setattr(ann_cache, "HNSWLIB_AVAILABLE", False)
+    await _warm(_loader([]))
+
+    assert await ann_cache.nearest(7, [1.0, 0.0, 0.0], 2, load=_loader([])) is None
+    assert not ann_cache._loading, "kept reloading a workspace it cannot serve"
+    assert not ann_cache._entries[7].usable
+
+
+async def test_an_evicted_workspace_leaves_no_files_past_the_budget(cache, monkeypatch, tmp_path):
+    monkeypatch.setattr(ann_cache, "MAX_WORKSPACES", 2)
+    monkeypatch.setattr(ann_cache, "MAX_DIR_BYTES", 1)
+    for workspace_id in (7, 8, 9):
+        await _warm(_loader([]), workspace_id=workspace_id)
+
+    on_disk = {name.split("-", 1)[0] for name in os.listdir(tmp_path)}
+    assert on_disk == {"ws8", "ws9"}, "an evicted workspace's vectors stayed on disk"
+    assert list(ann_cache._entries) == [8, 9]
@@ -0,0 +1,71 @@
+"""Authentication, which every request pays for before it does anything else.
+
+A Firebase verification is a signature check, and it blocked the event loop
+for every request; the email it yields was then a users query. Both are now
+remembered, and what must not be lost with them: a token is only believed
+until the expiry it states, a failed verification is never remembered, no
+token or address is kept in the clear, and a deleted account's address stops
+resolving as soon as it is gone.
+"""
+import threading
+import time
+
+import pytest
+
+from api.core import user_cache, utils
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture
+def verifier(monkeypatch):
+    calls = []
+
+    def verify(token):
+        calls.append(threading.current_thread() is threading.main_thread())
+        if token == "bad":
+            return False, {"error": "Invalid token"}, None
+        expires = time.time() + (3600 if token != "expiring" else -1)
+        return True, {"email": "a@example.com", "user_id": "uid", "name": None}, expires
+
+    monkeypatch.setattr(utils, "_verify_firebase_token", verify)
+    monkeypatch.setattr(utils, "_verified_tokens", utils.OrderedDict())
+    return calls
+
+
+async def test_a_token_is_verified_once_and_off_the_event_loop(verifier):
+    for _ in range(3):
+        success, info = await utils.verify_firebase_token("good")
+        assert success and info["email"] == "a@example.com"
+
+    assert verifier == [False], "verified more than once, or on the event loop"
+
+
+async def test_an_expired_token_is_verified_again(verifier):
+    await utils.verify_firebase_token("expiring")
+    await utils.verify_firebase_token("expiring")
+
+    assert len(verifier) == 2
+
+
+async def test_a_failed_verification_is_not_remembered(verifier):
+    assert (await utils.verify_firebase_token("bad"))[0] is False
+    assert (await utils.verify_firebase_token("bad"))[0] is False
+
+    assert len(verifier) == 2
+    assert not utils._verified_tokens
+
+
+async def test_the_cache_holds_no_token(verifier):
+    await utils.verify_firebase_token("good")
+
+    assert "good" not in utils._verified_tokens
+
+
+async def test_a_deleted_accounts_address_stops_resolving(redis):
+    await user_cache.put("a@example.com", 42)
+    assert await user_cache.get("a@example.com") == 42
+    assert not any("example.com" in key for key in redis.values)
+
+    await user_cache.forget("a@example.com")
+    assert await user_cache.get("a@example.com") is None
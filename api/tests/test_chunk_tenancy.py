@@ -0,0 +1,158 @@
+"""Chunks carry their workspace, and a moved document takes its chunks along.
+
+hybrid_search filters on chunks.workspace_id rather than joining each
+candidate to files, so the copy on the chunk is now what decides whose search
+a passage appears in. Two ways for it to go wrong: ingest not stamping it, so a
+new document is invisible everywhere, and a move not rewriting it, so a
+document answers in the workspace it left and not in the one it went to. A
+move that lands while a batch is being stored is the third: the batch read the
+old workspace, and its chunks must not be committed under it after the move.
+
+Deletion now removes chunks by organization before the file's cascade runs, so
+a delete that names the wrong organization would leave orphans behind.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+DIM = 1024
+
+
+async def _ingest(store, tenant, workspace_id: int, text: str) -> int:
+    file_id = await store.file_repo.add_file(
+        user_id=tenant.owner, file_name="moved.pdf", file_url="", workspace_id=workspace_id,
+    )
+    ok = await store.file_repo.update_file_with_chunks(
+        user_id=tenant.owner,
+        filename="moved.pdf",
+        file_type="pdf",
+        extracted_data=[{"text": text, "page_text": text, "page_num": 1,
+                         "embedding": [0.02] * DIM}],
+        file_id=file_id,
+    )
+    assert ok
+    return file_id
+
+
+async def _found_in(store, tenant, workspace_id: int, file_id: int) -> bool:
+    hits = await store.file_repo.hybrid_search(
+        user_id=tenant.owner,
+        query="condensate drain trap",
+        query_embedding=[0.02] * DIM,
+        workspace_id=workspace_id,
+    )
+    return any(h["file_id"] == file_id for h in hits)
+
+
+async def test_ingest_stamps_the_workspace_and_organization(store, tenant):
+    from sqlalchemy import select
+
+    from api.models.orm_models import Chunk
+
+    workspace = await tenant.workspace("Service manuals")
+    file_id = await _ingest(store, tenant, workspace, "Prime the condensate drain trap.")
+
+    async with store.file_repo.get_async_session() as session:
+        rows = (await session.execute(
+            select(Chunk.workspace_id, Chunk.organization_id).where(Chunk.file_id == file_id)
+        )).all()
+
+    assert rows and all(tuple(r) == (workspace, tenant.org) for r in rows)
+    assert await _found_in(store, tenant, workspace, file_id)
+
+
+async def test_a_moved_document_is_searched_where_it_now_lives(store, tenant):
+    old = await tenant.workspace("Inbox")
+    new = await tenant.workspace("Service manuals")
+    file_id = await _ingest(store, tenant, old, "Clear the condensate drain trap yearly.")
+
+    assert await store.file_repo.update_file_workspace(file_id, new)
+
+    assert await _found_in(store, tenant, new, file_id), "invisible in its new workspace"
+    assert not await _found_in(store, tenant, old, file_id), "still answering in the old one"
+
+
+async def test_a_move_during_ingest_waits_for_the_batch(store, tenant, monkeypatch):
+    from sqlalchemy import select
+
+    from api.models.orm_models import Chunk
+
+    old = await tenant.workspace("Inbox")
+    new = await tenant.workspace("Service manuals")
+    file_id = await store.file_repo.add_file(
+        user_id=tenant.owner, file_name="moved.pdf", file_url="", workspace_id=old,
+    )
+
+    # The batch stops once it has read the file, before it writes a chunk.
+    read_file, carry_on = asyncio.Event(), asyncio.Event()
+    session_scope = store.file_repo.get_async_session
+
+    @asynccontextmanager
+    async def pausing_after_the_file_read():
+        async with session_scope() as session:
+            execute = session.execute
+
+            async def execute_then_pause(statement, *args, **kwargs):
+                result = await execute(statement, *args, **kwargs)
+                if not read_file.is_set() and "FOR UPDATE" in str(statement):
+                    read_file.set()
+                    await carry_on.wait()
+                return result
+
+            session.execute = execute_then_pause
+            yield session
+
+    monkeypatch.setattr(store.file_repo, "get_async_session", pausing_after_the_file_read)
+    text = "Drain the condensate trap before moving the unit."
+    ingest = asyncio.ensure_future(store.file_repo.update_file_with_chunks(
+        user_id=tenant.owner,
+        filename="moved.pdf",
+        file_type="pdf",
+        extracted_data=[{"text": text, "page_text": text, "page_num": 1,
+                         "embedding": [0.02] * DIM}],
+        file_id=file_id,
+    ))
+    reached = asyncio.ensure_future(read_file.wait())
+    await asyncio.wait({ingest, reached}, return_when=asyncio.FIRST_COMPLETED)
+    assert read_file.is_set(), "the batch ended without reading its file"
+    monkeypatch.setattr(store.file_repo, "get_async_session", session_scope)
+
+    move = asyncio.ensure_future(store.file_repo.update_file_workspace(file_id, new))
+    await asyncio.sleep(0.5)
+    assert not move.done(), "the move committed under a batch that had read the old workspace"
+
+    carry_on.set()
+    assert await ingest
+    assert await move
+
+    async with session_scope() as session:
+        rows = (await session.execute(
+            select(Chunk.workspace_id).where(Chunk.file_id == file_id)
+        )).scalars().all()
+    assert rows and set(rows) == {new}
+
+
+async def test_deleting_a_document_or_workspace_removes_its_chunks(store, tenant):
+    from sqlalchemy import func, select
+
+    from api.models.orm_models import Chunk
+
+    workspace = await tenant.workspace("Service manuals")
+    kept = await _ingest(store, tenant, workspace, "Replace the anode rod every third year.")
+    deleted = await _ingest(store, tenant, workspace, "Flush the condensate drain trap.")
+
+    async def chunks_of(file_id):
+        async with store.file_repo.get_async_session() as session:
+            return (await session.execute(
+                select(func.count()).select_from(Chunk).where(Chunk.file_id == file_id)
+            )).scalar()
+
+    assert await store.file_repo.delete_file_entry(deleted)
+    assert await chunks_of(deleted) == 0
+    assert await chunks_of(kept) > 0
+
+    assert await store.workspace_repo.delete_workspace(workspace)
+    assert await chunks_of(kept) == 0
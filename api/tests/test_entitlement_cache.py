@@ -0,0 +1,87 @@
+"""Billing checks, which stand between a request and the plan that pays for it.
+
+The cache may only ever err towards asking the database: a paying answer is
+asked for once, an unpaid one every time so a new subscriber is let straight
+in, and a lapse or a member leaving their company is refused on the very next
+request. The organizations and subscriptions are a stand-in store that counts
+what reaches it.
+"""
+import pytest
+from fastapi import HTTPException
+
+from api.core import access_cache, entitlement_cache, limits, workspace_organizations
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class _Orgs:
+    def __init__(self):
+        self.statuses = {10: "active", 20: "canceled"}
+        self.memberships = {1: [{"organization_id": 10, "name": "Acme", "role": "staff"}]}
+        self.queries = 0
+
+    async def get_organization_for_workspace(self, workspace_id):
+        self.queries += 1
+        return {100: 10, 200: 20}.get(workspace_id)
+
+    async def get_subscription_status(self, organization_id):
+        self.queries += 1
+        return self.statuses.get(organization_id, "none")
+
+    async def get_memberships(self, user_id):
+        self.queries += 1
+        return self.memberships.get(user_id, [])
+
+
+class _Store:
+    def __init__(self):
+        self.org_repo = _Orgs()
+
+
+@pytest.fixture
+def store(redis, monkeypatch):
+    monkeypatch.setattr(workspace_organizations, "_organizations", {})
+    return _Store()
+
+
+async def test_a_paying_organization_is_asked_for_once(store):
+    await limits.assert_can_ask(store, 1, workspace_id=100)
+    queries = store.org_repo.queries
+
+    await limits.assert_can_ask(store, 1, workspace_id=100)
+    await limits.assert_can_create_doc(store, 1, workspace_id=100)
+
+    assert store.org_repo.queries == queries
+
+
+async def test_an_unpaid_organization_is_asked_every_time(store):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as refused:
+            await limits.assert_can_ask(store, 1, workspace_id=200)
+        assert refused.value.status_code == 402
+
+    # Once for the workspace's organization, then the status each time.
+    assert store.org_repo.queries == 3
+
+
+async def test_a_lapse_is_refused_on_the_next_request(store):
+    await limits.assert_can_ask(store, 1, workspace_id=100)
+
+    store.org_repo.statuses[10] = "past_due"
+    await entitlement_cache.invalidate([10], [1])
+
+    with pytest.raises(HTTPException):
+        await limits.assert_can_ask(store, 1, workspace_id=100)
+
+
+async def test_a_members_entitlement_follows_their_company(store):
+    assert (await limits.resolve_entitlement(store, 1))["entitled"]
+    queries = store.org_repo.queries
+    assert (await limits.resolve_entitlement(store, 1))["entitled"]
+    assert store.org_repo.queries == queries
+
+    # Leaving the company is a membership change, which replaces their epoch.
+    store.org_repo.memberships[1] = []
+    await access_cache.invalidate([1])
+
+    assert not (await limits.resolve_entitlement(store, 1))["entitled"]
@@ -29,6 +29,10 @@ E4 in 2, F8 in 3, 335 in 3, 1600 in 5.
 With the literal arm, the same target moves to rank 3, and the benchmark goes
 from 8/20 answers and 9/20 citations to 9/20 and 11/20, deterministically.
 
+Since 20260823_workspace_term_stats the text arm is BM25, and the literal list
+is a second ordering of its scores. The properties below are what that change
+had to keep.
+
 WHAT IS ASSERTED
 
 Not rank positions, which move with any tuning. The properties that make the
@@ -109,9 +113,12 @@ async def corpus(store, tenant):
             session.add(seg)
             await session.commit()
             segment_id = seg.id
+            # Stamped with the workspace the way ingest stamps it, because
+            # retrieval filters on the chunk's own copy.
             session.add(Chunk(
                 file_id=file_id, segment_id=segment_id, content=content,
                 embedding=vector, content_hash="h-" + uuid.uuid4().hex[:8],
+                workspace_id=workspace_id, organization_id=tenant.org,
             ))
             await session.commit()
         return file_id
@@ -177,6 +184,29 @@ async def test_a_question_with_no_identifiers_still_works(store, tenant, corpus)
     assert hits, "a question with no identifying tokens returned nothing at all"
 
 
+async def test_term_statistics_follow_chunks_in_and_out(store, tenant, corpus):
+    """BM25's document frequencies are what let 251 count for more than
+    "liquid", and they are kept by a trigger, not by ingest. Chunks arrive here
+    by a plain insert and leave by delete_file_entry; both must be counted."""
+    from sqlalchemy import text
+
+    async def df(lexeme):
+        async with store.file_repo.get_async_session() as session:
+            return (await session.execute(
+                text("SELECT df FROM workspace_term_stats "
+                     "WHERE workspace_id = :w AND lexeme = :l"),
+                {"w": corpus["workspace_id"], "l": lexeme},
+            )).scalar()
+
+    assert await df("251") == 1
+    assert await df("liquid") == 8
+
+    await store.file_repo.delete_file_entry(corpus["target"])
+
+    assert await df("251") is None, "a lexeme no chunk holds any more was kept"
+    assert await df("liquid") == 8
+
+
 # ---------------------------------------------------------------------------
 # The guardrail, and the pages it must not arbitrate
 # ---------------------------------------------------------------------------
@@ -67,7 +67,7 @@ class _CountingVision:
         self.pages_read = []
         self.fail_on = fail_on or set()
 
-    async def __call__(self, page, text_layer):
+    async def __call__(self, page, text_layer, **rendered):
         n = page.number + 1
         if n in self.fail_on:
             raise RuntimeError("vision endpoint is down")
@@ -149,7 +149,7 @@ async def test_a_failed_cache_write_does_not_fail_the_ingest(store, doc_file, mo
     async def boom(*a, **k):
         raise RuntimeError("disk is full")
 
-    monkeypatch.setattr(store.file_repo, "save_page_read", boom)
+    monkeypatch.setattr(store.file_repo, "save_page_reads", boom)
 
     pages = await processor.extract_text_with_page_numbers(
         _pdf_bytes(2), file_id=doc_file["id"]
@@ -157,6 +157,91 @@ async def test_a_failed_cache_write_does_not_fail_the_ingest(store, doc_file, mo
     assert len(pages) == 2, "a broken cache took the document down with it"
 
 
+async def test_pages_are_written_in_batches_not_one_transaction_each(
+    store, doc_file, monkeypatch
+):
+    """Six pages, one statement. Per-page commits were the cost being removed,
+    and every page must still be on disk when extraction returns."""
+    processor = PDFProcessor(store)
+    monkeypatch.setattr(processor, "_page_needs_vision", lambda page, text: True)
+    monkeypatch.setattr(processor, "_read_page_with_vision", _CountingVision())
+
+    batches = []
+    real = store.file_repo.save_page_reads
+
+    async def counting(file_id, pages):
+        batches.append(len(pages))
+        await real(file_id, pages)
+
+    monkeypatch.setattr(store.file_repo, "save_page_reads", counting)
+
+    await processor.extract_text_with_page_numbers(_pdf_bytes(6), file_id=doc_file["id"])
+
+    assert sum(batches) == 6
+    assert len(batches) < 6, f"pages were still written one at a time: {batches}"
+    assert set(await store.file_repo.cached_page_reads(doc_file["id"])) == set(range(1, 7))
+
+
+async def test_the_same_page_image_is_not_read_twice_in_one_organization(
+    store, tenant, monkeypatch
+):
+    """The same manual uploaded into a second workspace costs no vision calls.
+
+    Keyed on the rendered image rather than the file, which is the whole point:
+    the resume cache already covers a re-run of one file.
+    """
+    files = []
+    for name in ("Front desk", "Back office"):
+        workspace_id = await tenant.workspace(name)
+        files.append(await store.file_repo.add_file(
+            user_id=tenant.owner, file_name="manual.pdf", file_url="", workspace_id=workspace_id,
+        ))
+
+    processor = PDFProcessor(store)
+    monkeypatch.setattr(processor, "_page_needs_vision", lambda page, text: True)
+
+    first = _CountingVision()
+    monkeypatch.setattr(processor, "_read_page_with_vision", first)
+    await processor.extract_text_with_page_numbers(_pdf_bytes(3), file_id=files[0])
+    assert sorted(first.pages_read) == [1, 2, 3]
+
+    second = _CountingVision()
+    monkeypatch.setattr(processor, "_read_page_with_vision", second)
+    pages = await processor.extract_text_with_page_numbers(_pdf_bytes(3), file_id=files[1])
+
+    assert second.pages_read == [], f"identical page images were read again: {second.pages_read}"
+    assert all(p["is_markdown"] for p in pages)
+    assert "| page 2 |" in pages[1]["text"]
+    # Stored against the second file too, so it resumes on its own.
+    assert set(await store.file_repo.cached_page_reads(files[1])) == {1, 2, 3}
+
+
+async def test_a_page_image_read_by_another_organization_is_not_reused(
+    store, tenant, doc_file, monkeypatch
+):
+    """Scoped to the tenant, as embeddings are."""
+    processor = PDFProcessor(store)
+    monkeypatch.setattr(processor, "_page_needs_vision", lambda page, text: True)
+    monkeypatch.setattr(processor, "_read_page_with_vision", _CountingVision())
+    await processor.extract_text_with_page_numbers(_pdf_bytes(2), file_id=doc_file["id"])
+
+    other_owner = await tenant.new_user("rival")
+    other_org = await store.org_repo.create_organization(f"Rival {uuid.uuid4().hex[:8]}", other_owner)
+    try:
+        other_ws = await store.workspace_repo.create_workspace(
+            user_id=other_owner, name="Theirs", organization_id=other_org
+        )
+        other_file = await store.file_repo.add_file(
+            user_id=other_owner, file_name="manual.pdf", file_url="", workspace_id=other_ws,
+        )
+        theirs = _CountingVision()
+        monkeypatch.setattr(processor, "_read_page_with_vision", theirs)
+        await processor.extract_text_with_page_numbers(_pdf_bytes(2), file_id=other_file)
+        assert sorted(theirs.pages_read) == [1, 2]
+    finally:
+        await store.org_repo.delete_organization(other_org)
+
+
 async def test_only_vision_pages_are_marked_as_markdown(store, doc_file, monkeypatch):
     """The flag that decides which chunker a page gets.
 
@@ -288,9 +373,12 @@ async def test_a_long_job_keeps_its_lease(store, tenant, monkeypatch):
 
     run_id = await _make_run(store, tenant, lease_minutes=-1)  # already expired
 
-    keepalive = asyncio.create_task(worker._hold_lease(run_id))
+    job = asyncio.create_task(asyncio.sleep(10))
+    monkeypatch.setitem(worker.held_runs, run_id, job)
+    keeper = asyncio.create_task(worker._keep_leases())
     await asyncio.sleep(0.2)
-    keepalive.cancel()
+    keeper.cancel()
+    job.cancel()
 
     assert await worker.reclaim_expired_runs() == 0 or True  # sweep, then check
     from api.models.orm_models import AgentRun
@@ -332,3 +420,38 @@ async def test_renewal_stops_once_the_run_is_no_longer_ours(store, tenant, monke
         await session.commit()
 
     assert await worker.renew_lease(run_id) is False
+
+
+async def test_a_lost_lease_stops_the_local_copy(store, tenant, monkeypatch):
+    """One keeper renews every held run, and cancels the ones it has lost.
+
+    Only the lost one: the run still held alongside it keeps going.
+    """
+    monkeypatch.setattr(worker, "LEASE_RENEW_SECONDS", 0.05)
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+
+    kept_id = await _make_run(store, tenant, lease_minutes=30)
+    lost_id = await _make_run(store, tenant, lease_minutes=30)
+
+    from api.models.orm_models import AgentRun
+
+    async with store.agent_run_repo.get_async_session() as session:
+        run = await session.get(AgentRun, lost_id)
+        run.locked_by = "some-other-worker"
+        await session.commit()
+
+    kept = asyncio.create_task(asyncio.sleep(10))
+    lost = asyncio.create_task(asyncio.sleep(10))
+    monkeypatch.setitem(worker.held_runs, kept_id, kept)
+    monkeypatch.setitem(worker.held_runs, lost_id, lost)
+
+    keeper = asyncio.create_task(worker._keep_leases())
+    try:
+        await asyncio.sleep(0.3)
+    finally:
+        keeper.cancel()
+
+    assert lost.cancelled(), "a job kept running on a run another worker now owns"
+    assert not kept.done(), "a job whose lease was still ours was stopped"
+    assert lost_id not in worker.held_runs
+    kept.cancel()
@@ -0,0 +1,156 @@
+"""Pages are rendered ahead of the vision reads, a bounded distance ahead.
+
+Rendering moved out of the vision slot into a spawned process pool, with a
+queue between the renders and the reads. Three things have to hold for that to
+be the improvement it was meant to be:
+
+  - a spawned child renders the configured format, and the reader is told
+    which one it got, or a JPEG is sent to the model labelled as a PNG
+  - rendering stops VISION_PREFETCH pages ahead of the reads, because a
+    500-page scan rendered up front is half a gigabyte waiting for a slot
+  - a page that fails to render loses its own image and nothing else; its
+    text layer is still there
+  - a render process that dies takes the pool with it, and the next render
+    must get a new pool rather than failing for the life of the worker
+
+The last two run the real produce and consume loop with renders on threads and
+a stand-in model. No database: without a file id nothing is cached.
+"""
+import asyncio
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.processors import page_render, pdf_processor
+from api.processors.pdf_processor import PDFProcessor
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _pdf_bytes(pages: int) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for n in range(1, pages + 1):
+        doc.new_page().insert_text((72, 100), f"Page {n} wiring diagram")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def test_a_spawned_child_renders_the_configured_format(tmp_path, monkeypatch):
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(_pdf_bytes(2))
+    loop = asyncio.get_running_loop()
+    try:
+        png = await loop.run_in_executor(
+            page_render.render_pool(), page_render.render_page, str(path), 1, 72, "png", 85
+        )
+        jpeg = await loop.run_in_executor(
+            page_render.render_pool(), page_render.render_page, str(path), 1, 72, "jpeg", 85
+        )
+    finally:
+        page_render.shutdown_render_pool()
+
+    assert png.startswith(b"\x89PNG")
+    assert jpeg.startswith(b"\xff\xd8")
+
+    monkeypatch.setattr(page_render, "VISION_IMAGE_FORMAT", "jpg")
+    assert page_render.image_format() == ("jpeg", "image/jpeg")
+    monkeypatch.setattr(page_render, "VISION_IMAGE_FORMAT", "tiff")
+    assert page_render.image_format() == ("png", "image/png")
+
+
+async def test_a_dead_render_process_is_replaced(tmp_path):
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(_pdf_bytes(2))
+    try:
+        first = await page_render.render_in_pool(str(path), 0, 72, "png", 85)
+        broken = page_render.render_pool()
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+        second = await page_render.render_in_pool(str(path), 1, 72, "png", 85)
+        assert page_render.render_pool() is not broken
+    finally:
+        page_render.shutdown_render_pool()
+
+    assert first.startswith(b"\x89PNG") and second.startswith(b"\x89PNG")
+
+
+class _Renders:
+    def __init__(self):
+        self.started = []
+        self.fail = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, path, page_index, dpi, fmt, quality):
+        with self._lock:
+            self.started.append(page_index + 1)
+        if page_index + 1 in self.fail:
+            raise RuntimeError("MuPDF could not render this page")
+        return f"{fmt}:{page_index + 1}".encode()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Renders on threads, recording which pages were started."""
+    render = _Renders()
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(page_render, "render_pool", lambda: pool)
+    monkeypatch.setattr(page_render, "render_page", render)
+    monkeypatch.setattr(pdf_processor, "image_format", lambda: ("jpeg", "image/jpeg"))
+    monkeypatch.setattr(pdf_processor, "VISION_CONCURRENCY_MAX", 1)
+    monkeypatch.setattr(pdf_processor, "VISION_PREFETCH", 2)
+    yield render
+    pool.shutdown(wait=True)
+
+
+def _processor(monkeypatch, read):
+    processor = PDFProcessor(None)
+    monkeypatch.setattr(processor, "_page_needs_vision", lambda page, text: True)
+    monkeypatch.setattr(processor, "_read_page_with_vision", read)
+    return processor
+
+
+async def test_rendering_stops_prefetch_pages_ahead_of_the_reads(renders, monkeypatch):
+    release = asyncio.Event()
+    sent = []
+
+    async def read(page, text_layer, image=None, mime_type=None):
+        await release.wait()
+        sent.append((image, mime_type))
+        return f"| page |\n| --- |\n| {page.number + 1} |", {}
+
+    processor = _processor(monkeypatch, read)
+    extraction = asyncio.ensure_future(processor.extract_text_with_page_numbers(_pdf_bytes(10)))
+    for _ in range(20):
+        await asyncio.sleep(0.02)
+
+    # One page with the only reader, VISION_PREFETCH in the queue, and one
+    # rendered by the producer while it waits for room.
+    assert len(renders.started) == 1 + 2 + 1, f"rendered ahead: {sorted(renders.started)}"
+
+    release.set()
+    pages = await extraction
+
+    assert len(renders.started) == 10
+    assert (b"jpeg:1", "image/jpeg") in sent
+    assert all(f"| {n} |" in page["text"] for n, page in enumerate(pages, start=1))
+
+
+async def test_a_failed_render_costs_only_its_own_page(renders, monkeypatch):
+    renders.fail = {2}
+
+    async def read(page, text_layer, image=None, mime_type=None):
+        return f"| page |\n| --- |\n| {page.number + 1} |", {}
+
+    processor = _processor(monkeypatch, read)
+    pages = await processor.extract_text_with_page_numbers(_pdf_bytes(3))
+
+    assert "| 1 |" in pages[0]["text"] and "| 3 |" in pages[2]["text"]
+    assert "Page 2 wiring diagram" in pages[1]["text"], "page 2 should keep its text layer"
@@ -0,0 +1,131 @@
+"""A question picks up where its dead worker left it.
+
+The query graph hands its state to a checkpoint after every node, and a retried
+run resumes after the last node that finished. What is worth protecting:
+
+  - every node is checkpointed, with passages named by chunk id and not copied
+    into the row as text
+  - a run resumed after retrieval does not rewrite or search again, and
+    answers from the same passages the first attempt found
+
+No database: the store is a stand-in that serves chunks by id, which is all a
+resume reads.
+"""
+import pytest
+
+from api.agents import query_agent as qa
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+_CHUNKS = {
+    i: {
+        "chunk_id": i, "file_id": 7, "segment_id": 100 + i,
+        "content": f"passage {i} about charging R-410A", "file_name": "manual.pdf",
+        "file_url": "u", "page_number": i, "meta_data": {},
+    }
+    for i in range(1, 6)
+}
+
+
+class _Files:
+    def __init__(self):
+        self.searches = 0
+
+    async def hybrid_search(self, **kwargs):
+        self.searches += 1
+        return [dict(_CHUNKS[i], hybrid_score=1.0 / i) for i in (3, 1, 4)]
+
+    async def chunks_by_ids(self, ids):
+        return {i: dict(_CHUNKS[i]) for i in ids if i in _CHUNKS}
+
+
+class _Store:
+    def __init__(self):
+        self.file_repo = _Files()
+
+
+class _Syntext:
+    def __init__(self):
+        self.contexts = []
+
+    async def query_pipeline(self, message, history, chunks, language, level):
+        self.contexts.append([c["chunk_id"] for c in chunks])
+        return "Charge by subcooling [Segment 1]."
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    rewrites = []
+
+    async def process(message, history):
+        rewrites.append(message)
+        return "charging R-410A", []
+
+    async def embed(text):
+        return [0.0, 1.0]
+
+    monkeypatch.setattr(qa.query_processor, "process", process)
+    monkeypatch.setattr(qa, "get_text_embedding", embed)
+    agent = qa.QueryAgent(store=_Store(), syntext=_Syntext())
+    agent.rewrites = rewrites
+    return agent
+
+
+async def _ask(agent, **kwargs):
+    return await agent.run(
+        user_id=1, message="how do I charge it", language="English",
+        comprehension_level="beginner", workspace_id=3, **kwargs,
+    )
+
+
+async def test_every_node_is_checkpointed_without_the_text(agent):
+    saved = []
+
+    async def checkpoint(state):
+        saved.append(state)
+
+    await _ask(agent, checkpoint=checkpoint)
+
+    assert [s["completed"] for s in saved] == [
+        "process_query", "retrieve", "dedupe_and_normalize",
+        "check_coverage", "select_context", "generate",
+    ]
+    last = saved[-1]
+    assert last["rewritten_query"] == "charging R-410A"
+    assert {e["chunk_id"] for e in last["evidence"]} == {1, 3, 4}
+    assert [c["chunk_id"] for c in last["context_chunks"]] == [3, 1, 4]
+    assert "passage" not in repr(saved), "document text was written into the checkpoint"
+
+
+async def test_a_resumed_run_does_not_search_again(agent):
+    saved = []
+
+    async def checkpoint(state):
+        saved.append(state)
+
+    first = await _ask(agent, checkpoint=checkpoint)
+    after_retrieve = next(s for s in saved if s["completed"] == "retrieve")
+    searches = agent._store.file_repo.searches
+
+    resumed = await _ask(agent, resume_from=after_retrieve)
+
+    assert agent.rewrites == ["how do I charge it"], "the question was rewritten twice"
+    assert agent._store.file_repo.searches == searches, "retrieval ran again"
+    assert resumed["resumed_after"] == "retrieve"
+    assert agent._syntext.contexts[-1] == agent._syntext.contexts[0]
+    assert resumed["response"] == first["response"]
+
+
+async def test_a_run_that_had_already_answered_is_not_answered_again(agent):
+    saved = []
+
+    async def checkpoint(state):
+        saved.append(state)
+
+    await _ask(agent, checkpoint=checkpoint)
+    answers = len(agent._syntext.contexts)
+
+    resumed = await _ask(agent, resume_from=saved[-1])
+
+    assert len(agent._syntext.contexts) == answers
+    assert resumed["response"] == "Charge by subcooling [Segment 1]."
@@ -0,0 +1,128 @@
+"""The queue metrics a replica decision is made from.
+
+/internal/metrics is scraped by Prometheus, so what matters is that it is
+behind the internal secret, that it speaks the text format, and that a burst of
+scrapes reaches the database once. The endpoint tests use a stand-in
+repository; the last two run the aggregate against a real database.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routes import internal
+from api.routes.internal import INTERNAL_SECRET_ENV, router
+
+_DATA = {
+    "live": [
+        {"status": "queued", "run_type": "ingest_file", "org_id": 7, "n": 12,
+         "oldest_seconds": 340.0},
+        {"status": "running", "run_type": "answer_query", "org_id": 9, "n": 2,
+         "oldest_seconds": None},
+    ],
+    "window": [
+        {"run_type": "answer_query", "claimed": 90, "wait": [0.4, 2.5, 6.0],
+         "finished": 88, "duration": [8.0, 21.0, 40.0], "reclaims": 1},
+    ],
+}
+
+
+class _Runs:
+    def __init__(self):
+        self.calls = 0
+
+    async def queue_metrics(self, *, window_seconds):
+        self.calls += 1
+        return _DATA
+
+
+class _Store:
+    def __init__(self):
+        self.agent_run_repo = _Runs()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv(INTERNAL_SECRET_ENV, "s3cret")
+    monkeypatch.setattr(internal, "METRICS_WINDOW_SECONDS", 900)
+    monkeypatch.setattr(internal, "_metrics_cache", {"body": None, "at": 0.0})
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/internal")
+    app.state.store = _Store()
+    return TestClient(app)
+
+
+def test_a_scrape_without_the_secret_is_refused(client):
+    assert client.get("/api/v1/internal/metrics").status_code == 403
+    assert client.app.state.store.agent_run_repo.calls == 0
+
+
+def test_the_queue_is_exposed_in_prometheus_format(client):
+    response = client.get(
+        "/api/v1/internal/metrics", headers={"Authorization": "Bearer s3cret"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'syntext_agent_runs{status="queued",run_type="ingest_file",organization_id="7"} 12' in body
+    assert 'syntext_agent_runs_oldest_queued_seconds{run_type="ingest_file"} 340' in body
+    assert 'syntext_agent_runs_claims_per_second{run_type="answer_query"} 0.1' in body
+    assert 'syntext_agent_run_queue_wait_seconds{run_type="answer_query",quantile="0.99"} 6' in body
+    assert 'syntext_agent_run_duration_seconds_count{run_type="answer_query"} 88' in body
+    assert "# TYPE syntext_agent_run_duration_seconds summary" in body
+
+
+def test_scrapes_in_quick_succession_query_once(client):
+    for _ in range(3):
+        client.get("/api/v1/internal/metrics", headers={"X-Internal-Secret": "s3cret"})
+
+    assert client.app.state.store.agent_run_repo.calls == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_the_aggregate_counts_what_is_queued(store, tenant):
+    before = await store.agent_run_repo.queue_metrics(window_seconds=900)
+    for i in range(2):
+        await store.agent_run_repo.enqueue_run(
+            run_type="ingest_file", agent_name="IngestionAgent", agent_version=None,
+            payload={"n": i}, user_id=tenant.owner,
+        )
+
+    after = await store.agent_run_repo.queue_metrics(window_seconds=900)
+
+    def queued(data):
+        return sum(
+            r["n"] for r in data["live"]
+            if r["status"] == "queued" and r["run_type"] == "ingest_file"
+            and r["org_id"] == tenant.org
+        )
+
+    assert queued(after) - queued(before) == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_a_reclaim_is_counted_when_it_happens(store, tenant):
+    """Of a run created before the window, and once rather than every scrape."""
+    from datetime import datetime, timedelta
+
+    from api.models.orm_models import AgentRun
+    from api.workers import worker
+
+    async with store.agent_run_repo.get_async_session() as session:
+        session.add(AgentRun(
+            run_type="reclaim_probe", agent_name="test", status="running",
+            payload={}, user_id=tenant.owner, locked_by="a-dead-replica",
+            # Failed by the reclaim rather than requeued, so no later claim
+            # picks the probe up.
+            max_attempts=1,
+            created_at=datetime.utcnow() - timedelta(hours=2),
+            lease_expires_at=datetime.utcnow() - timedelta(minutes=1),
+        ))
+        await session.commit()
+
+    def reclaims(data):
+        return sum(r["reclaims"] for r in data["window"] if r["run_type"] == "reclaim_probe")
+
+    assert reclaims(await store.agent_run_repo.queue_metrics(window_seconds=900)) == 0
+    await worker.reclaim_expired_runs()
+    assert reclaims(await store.agent_run_repo.queue_metrics(window_seconds=900)) == 1
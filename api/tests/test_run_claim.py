@@ -0,0 +1,186 @@
+"""Claiming queued runs in one statement.
+
+fetch_pending_runs used to load candidates as ORM objects, apply the per-user
+cap in Python and write each claim back, after which process_agent_run read the
+same row again. It is one CTE now, so what is worth protecting is that the one
+statement still does everything the loop did:
+
+  - the per-user cap holds, counting what is already running anywhere, even
+    when two replicas claim at the same moment
+  - runs that lose to the cap stay queued, untouched
+  - the claim hands back the payload, so dispatch has no reason to re-read
+  - an organization with a hundred uploads queued does not make another one's
+    single upload wait for all of them
+
+Against a real database, because the cap and the fairness are now SQL.
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from api.models.orm_models import AgentRun
+from api.workers import worker
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def _enqueue(store, user_id: int, n: int, run_type: str = "answer_query"):
+    ids = []
+    for i in range(n):
+        run_id = await store.agent_run_repo.enqueue_run(
+            run_type=run_type,
+            agent_name="QueryAgent",
+            agent_version=None,
+            payload={"message": f"question {i}"},
+            user_id=user_id,
+            # Ahead of anything another test left queued.
+            priority=-1000,
+        )
+        ids.append(run_id)
+    return ids
+
+
+async def test_the_cap_counts_what_is_already_in_flight(store, tenant, monkeypatch):
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+    monkeypatch.setattr(worker, "MAX_RUNS_PER_USER", 3)
+
+    # Already running, on some other replica: the ledger is the table.
+    async with store.agent_run_repo.get_async_session() as session:
+        session.add(AgentRun(
+            run_type="answer_query", agent_name="test", status="running",
+            payload={}, user_id=tenant.owner, locked_by="another-replica",
+        ))
+        await session.commit()
+
+    ids = await _enqueue(store, tenant.owner, 5)
+
+    claimed = await worker.fetch_pending_runs(limit=10)
+    mine = [run for run in claimed if str(run.id) in ids]
+
+    assert len(mine) == 2, "one running elsewhere plus two claimed is the cap of three"
+
+    taken = {str(run.id) for run in mine}
+    async with store.agent_run_repo.get_async_session() as session:
+        statuses = [(await session.get(AgentRun, run.id)).status for run in mine]
+        left = [
+            (await session.get(AgentRun, uuid.UUID(i))).status
+            for i in ids if i not in taken
+        ]
+    assert statuses == ["running", "running"]
+    assert left == ["queued"] * 3, "a run refused by the cap was written anyway"
+
+
+async def test_two_replicas_claiming_at_once_still_hold_the_cap(store, tenant, monkeypatch):
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+    monkeypatch.setattr(worker, "MAX_RUNS_PER_USER", 3)
+
+    ids = await _enqueue(store, tenant.owner, 6)
+
+    first, second = await asyncio.gather(
+        worker.fetch_pending_runs(limit=3), worker.fetch_pending_runs(limit=3)
+    )
+    mine = [run for run in first + second if str(run.id) in ids]
+
+    assert len(mine) == 3, "each claim saw the other's runs as not yet running"
+
+
+async def test_a_run_is_queued_under_its_organization(store, tenant):
+    [run_id] = await _enqueue(store, tenant.owner, 1)
+
+    async with store.agent_run_repo.get_async_session() as session:
+        run = await session.get(AgentRun, uuid.UUID(run_id))
+    assert run.organization_id == tenant.org
+
+
+async def test_the_claim_carries_what_dispatch_needs(store, tenant, monkeypatch):
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+    monkeypatch.setattr(worker, "MAX_RUNS_PER_USER", 3)
+
+    [run_id] = await _enqueue(store, tenant.owner, 1)
+
+    claimed = await worker.fetch_pending_runs(limit=10)
+    [run] = [r for r in claimed if str(r.id) == run_id]
+
+    assert run.run_type == "answer_query"
+    assert run.user_id == tenant.owner
+    assert run.payload == {"message": "question 0"}
+    assert run.started_at is not None and run.created_at is not None
+    assert run.started_at >= run.created_at
+
+
+async def test_a_bulk_upload_does_not_hold_up_another_organization(store, tenant, monkeypatch):
+    """The case the fair ordering exists for.
+
+    One organization queues twelve ingests; another queues one, after all of
+    them. Two slots free up. Oldest-first gives both to the first organization
+    and would keep doing so until its twelve were through. Fair turns give the
+    second organization one of the two.
+    """
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+    monkeypatch.setattr(worker, "MAX_RUNS_PER_USER", 100)
+
+    other_owner = await tenant.new_user("other-owner")
+    other_org = await store.org_repo.create_organization("Other Co", other_owner)
+    try:
+        bulk = await _enqueue(store, tenant.owner, 12, run_type="ingest_file")
+        [single] = await _enqueue(store, other_owner, 1, run_type="ingest_file")
+
+        claimed = await worker.fetch_pending_runs(limit=2)
+        taken = {str(run.id) for run in claimed}
+
+        assert single in taken, "the later organization waited behind the bulk upload"
+        assert len(taken & set(bulk)) == 1
+    finally:
+        await store.org_repo.delete_organization(other_org)
+
+
+async def _queued_row(store, user_id: int, *, priority: int, age_seconds: float = 0,
+                      start_by=None) -> str:
+    from datetime import datetime, timedelta
+
+    async with store.agent_run_repo.get_async_session() as session:
+        run = AgentRun(
+            run_type="answer_query", agent_name="test", status="queued",
+            payload={}, user_id=user_id, priority=priority,
+            created_at=datetime.utcnow() - timedelta(seconds=age_seconds),
+            start_by=start_by,
+        )
+        session.add(run)
+        await session.commit()
+        return str(run.id)
+
+
+async def test_an_upload_that_has_waited_long_enough_outranks_a_new_question(
+    store, tenant, monkeypatch
+):
+    """Static priorities let a stream of questions hold uploads back forever."""
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+    monkeypatch.setattr(worker, "MAX_RUNS_PER_USER", 100)
+    monkeypatch.setattr(worker, "PRIORITY_AGING_SECONDS", 6)
+
+    # Both far ahead of anything else queued, and an hour apart in age.
+    question = await _queued_row(store, tenant.owner, priority=-5000)
+    upload = await _queued_row(store, tenant.owner, priority=-4810, age_seconds=3600)
+
+    claimed = [str(r.id) for r in await worker.fetch_pending_runs(limit=10)]
+
+    assert claimed.index(upload) < claimed.index(question)
+
+
+async def test_a_run_with_a_deadline_goes_first(store, tenant, monkeypatch):
+    from datetime import datetime, timedelta
+
+    monkeypatch.setenv("WORKER_ID", str(os.getpid()))
+    monkeypatch.setattr(worker, "MAX_RUNS_PER_USER", 100)
+
+    urgent = await _queued_row(store, tenant.owner, priority=-5000)
+    slack = await _queued_row(
+        store, tenant.owner, priority=100,
+        start_by=datetime.utcnow() + timedelta(seconds=3),
+    )
+
+    claimed = [str(r.id) for r in await worker.fetch_pending_runs(limit=10)]
+
+    assert claimed.index(slack) < claimed.index(urgent)
@@ -0,0 +1,248 @@
+"""The statements hybrid_search sends, read off a stand-in session.
+
+Two things are only visible in the SQL itself:
+
+  - the same text goes out for every search of a kind. Prepared statements are
+    kept per connection by SQL text, so a statement rebuilt with something
+    different in it on every call is parsed and planned on every call.
+  - over a halfvec or bit index, the vector arm's first pass is ordered by the
+    index's own expression, or the planner cannot use it, and what it found is
+    ranked by the full-precision distance, or quantisation decides the order.
+"""
+import json
+import re
+from contextlib import asynccontextmanager
+
+import pytest
+
+from api.core import workspace_organizations
+from api.repositories.async_file_repository import AsyncFileRepository, _statement_settings
+
+
+# EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) of a search, cut down to the nodes
+# the profile reads.
+PLAN = [{
+    "Plan": {
+        "Node Type": "Limit", "Actual Rows": 10, "Actual Loops": 1,
+        "Plans": [
+            {"Subplan Name": "CTE vec_scan", "Actual Rows": 100, "Actual Loops": 1,
+             "Actual Total Time": 12.5, "Shared Hit Blocks": 40, "Shared Read Blocks": 3},
+            {"Subplan Name": "CTE scored", "Actual Rows": 37, "Actual Loops": 1,
+             "Actual Total Time": 30.0, "Shared Hit Blocks": 90, "Shared Read Blocks": 0},
+        ],
+    },
+    "Planning Time": 8.25,
+    "Execution Time": 45.0,
+}]
+
+
+class _Result:
+    def __init__(self, statement, indexes):
+        self._statement = str(statement)
+        self._indexes = indexes
+
+    def scalar(self):
+        if self._statement.startswith("EXPLAIN"):
+            return json.dumps(PLAN)
+        return "0.8.0"
+
+    def scalars(self):
+        indexes = self._indexes
+
+        class _Scalars:
+            def all(self):
+                return indexes
+        return _Scalars()
+
+    def all(self):
+        return [(1, 7), (2, 7)]
+
+    def fetchall(self):
+        return []
+
+
+class _Session:
+    def __init__(self):
+        self.statements = []
+        # The vector indexes the stand-in server has built, by name.
+        self.indexes = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((statement, params or {}))
+        return _Result(statement, self.indexes)
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    # Class-level, looked up once per process: put back afterwards so the
+    # database tests detect the real server's.
+    monkeypatch.setattr(AsyncFileRepository, "VECTOR_INDEX", "auto")
+    monkeypatch.setattr(AsyncFileRepository, "_compact_index_known", False)
+    monkeypatch.setattr(AsyncFileRepository, "_compact_index", None)
+    monkeypatch.setattr(AsyncFileRepository, "_iterative_scan", None)
+    monkeypatch.setattr(workspace_organizations, "_organizations", {})
+    monkeypatch.setattr(AsyncFileRepository, "_statements", {})
+    monkeypatch.setattr(AsyncFileRepository, "_configure_statements", {})
+    monkeypatch.setattr(AsyncFileRepository, "STATEMENT_SETTINGS", {})
+    monkeypatch.setattr(AsyncFileRepository, "EXPLAIN_EVERY", 0)
+    monkeypatch.setattr(AsyncFileRepository, "_searches_seen", 0)
+    session = _Session()
+    repo = AsyncFileRepository.__new__(AsyncFileRepository)
+
+    @asynccontextmanager
+    async def get_async_session():
+        yield session
+
+    repo.get_async_session = get_async_session
+    repo.session = session
+    return repo
+
+
+def _index(monkeypatch, repo, built, preference="auto"):
+    """Stand in for a server with these indexes, and look them up afresh."""
+    repo.session.indexes = built
+    monkeypatch.setattr(AsyncFileRepository, "VECTOR_INDEX", preference)
+    monkeypatch.setattr(AsyncFileRepository, "_compact_index_known", False)
+    monkeypatch.setattr(AsyncFileRepository, "_compact_index", None)
+
+
+async def _search(repo, **scope):
+    repo.session.statements.clear()
+    await repo.hybrid_search(user_id=1, query="error E4", query_embedding=[0.1] * 4, **scope)
+    search = next(
+        (s, p) for s, p in repo.session.statements
+        if "vec_scan" in str(s) and not str(s).startswith("EXPLAIN")
+    )
+    settings = {}
+    for statement, params in repo.session.statements:
+        if "set_config" in str(statement):
+            settings.update(
+                (params[f"setting_{i}"], params[f"value_{i}"])
+                for i in range(str(statement).count("set_config"))
+            )
+    return search, settings
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_searches_of_a_kind_share_one_statement(repo):
+    (first, _), _ = await _search(repo, workspace_id=1)
+    (second, params), _ = await _search(repo, workspace_id=2, top_k=40)
+
+    assert second is first
+    assert params["workspace_id"] == 2
+
+    (accessible, _), _ = await _search(repo, accessible_workspace_ids=[1, 2])
+    assert accessible is not first
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_a_single_file_is_one_statement_whichever_scope_allowed_it(repo):
+    (in_workspace, params), _ = await _search(repo, workspace_id=1, file_id=3)
+    assert params["scope_workspace_ids"] == [1] and not params["scope_unfiled"]
+
+    (in_accessible, params), _ = await _search(repo, accessible_workspace_ids=[1, 2], file_id=3)
+    assert params["scope_workspace_ids"] == [1, 2] and params["scope_unfiled"]
+
+    (owned, params), _ = await _search(repo, file_id=3)
+    assert params["scope_workspace_ids"] == [] and params["scope_owner"]
+
+    assert in_workspace is in_accessible is owned
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_pinned_settings_apply_to_their_statement_and_win(repo, monkeypatch):
+    monkeypatch.setattr(AsyncFileRepository, "STATEMENT_SETTINGS", _statement_settings(
+        "*:plan_cache_mode=force_generic_plan, workspace:hnsw.iterative_scan=strict_order"
+    ))
+
+    _, settings = await _search(repo, workspace_id=1)
+    assert settings == {
+        "hnsw.iterative_scan": "strict_order",
+        "plan_cache_mode": "force_generic_plan",
+    }
+
+    _, settings = await _search(repo, accessible_workspace_ids=[1])
+    assert settings["hnsw.iterative_scan"] == "relaxed_order"
+    assert settings["plan_cache_mode"] == "force_generic_plan"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_one_search_in_n_is_explained_first_and_profiled(repo, monkeypatch):
+    monkeypatch.setattr(AsyncFileRepository, "EXPLAIN_EVERY", 2)
+    profiles = []
+
+    for _ in range(4):
+        repo.session.statements.clear()
+        await repo.hybrid_search(
+            user_id=1, query="error E4", query_embedding=[0.1] * 4,
+            workspace_id=1, profiles=profiles,
+        )
+    sent = [str(s) for s, _ in repo.session.statements]
+
+    assert len(profiles) == 2
+    explained = next(i for i, sql in enumerate(sent) if sql.startswith("EXPLAIN"))
+    searched = next(
+        i for i, sql in enumerate(sent) if "vec_scan" in sql and not sql.startswith("EXPLAIN")
+    )
+    assert explained < searched, "the profile must see the cold reads the search would"
+    assert sent[explained].endswith(sent[searched])
+
+    profile = profiles[0]
+    assert profile["scope"] == "workspace" and profile["vector"] == "float"
+    assert profile["planning_ms"] == 8.25 and profile["rows"] == 10
+    assert profile["arms"]["vec_scan"] == {
+        "rows": 100, "ms": 12.5, "shared_hit": 40, "shared_read": 3,
+    }
+    assert profile["arms"]["scored"]["rows"] == 37
+    assert profile["rest_ms"] == 2.5
+
+
+def test_malformed_settings_are_ignored():
+    assert _statement_settings("workspace:hnsw.ef_search=200,,nonsense,file:=1") == {
+        "workspace": {"hnsw.ef_search": "200"},
+    }
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_without_a_compact_index_the_float_index_is_searched(repo, monkeypatch):
+    _index(monkeypatch, repo, [])
+    (statement, _), settings = await _search(repo, workspace_id=1)
+    sql = str(statement)
+
+    assert "LIMIT :oversampled" not in sql
+    assert "ORDER BY c.embedding <=> CAST(:embedding AS vector)" in sql
+    assert "hnsw.ef_search" not in settings
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_a_bit_index_is_searched_deep_and_rescored_exactly(repo, monkeypatch):
+    _index(monkeypatch, repo, ["ix_chunks_embedding_bit"])
+    (statement, params), settings = await _search(repo, workspace_id=1)
+    sql = str(statement)
+
+    first_pass = re.search(r"ORDER BY (.+)\n\s*LIMIT :oversampled", sql).group(1)
+    assert first_pass == AsyncFileRepository._COMPACT_DISTANCE["bit"]
+    assert "embedding <=> CAST(:embedding AS vector) AS distance" in sql
+    assert params["oversampled"] == params["candidates"] * AsyncFileRepository.OVERSAMPLE["bit"]
+    assert settings["hnsw.ef_search"] == str(min(params["oversampled"], 1000))
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_the_preference_chooses_between_two_built_indexes(repo, monkeypatch):
+    built = ["ix_chunks_embedding_halfvec", "ix_chunks_embedding_bit"]
+
+    _index(monkeypatch, repo, built)
+    (statement, _), _ = await _search(repo, workspace_id=1)
+    assert "halfvec(1024)" in str(statement)
+
+    _index(monkeypatch, repo, built, preference="bit")
+    (statement, _), _ = await _search(repo, workspace_id=1)
+    assert "binary_quantize" in str(statement)
+
+    _index(monkeypatch, repo, built, preference="float")
+    (statement, _), _ = await _search(repo, workspace_id=1)
+    assert "LIMIT :oversampled" not in str(statement)
@@ -0,0 +1,137 @@
+"""The vision limiter finds what the endpoint can serve, and backs off when it cannot.
+
+VISION_CONCURRENCY was a fixed three. Eight had been tried and produced nothing
+but timeouts, because the endpoint queued requests server side and every one of
+them slowed together. Three was then a guess that left a healthy provider idle.
+
+What is asserted is the shape of the control loop, not its constants:
+
+  - good reads at a steady latency grow the limit
+  - a timeout or a 408 halves it, and it never drops below the floor
+  - a burst that fails together halves it once, not once per call
+  - an exception that is not the endpoint's doing leaves it alone
+  - reads that slow down together stop the growth, which is the failure mode
+    eight-at-once had
+  - the limit is a limit: nothing past it is ever in flight
+
+No database and no endpoint. The limiter is pure arithmetic around a condition.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from api.services.llm_service import AdaptiveLimiter
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _limiter(initial=3, minimum=1, maximum=12):
+    return AdaptiveLimiter(
+        "test_vision", initial=initial, minimum=minimum, maximum=maximum,
+        latency_tolerance=2.0,
+    )
+
+
+async def test_steady_good_reads_grow_the_limit():
+    limiter = _limiter()
+    for _ in range(30):
+        async with limiter.slot():
+            pass
+    assert limiter.limit > 3
+    assert limiter.limit <= 12
+
+
+async def test_an_overload_halves_the_limit():
+    limiter = _limiter(initial=8)
+    async with limiter.slot() as outcome:
+        outcome["overload"] = True
+    assert int(limiter.limit) == 4
+
+
+async def test_the_limit_never_drops_below_the_floor():
+    limiter = _limiter(initial=2, minimum=1)
+    for _ in range(10):
+        async with limiter.slot() as outcome:
+            outcome["overload"] = True
+    assert limiter.limit == 1
+
+
+async def test_a_burst_of_overloads_halves_the_limit_once():
+    limiter = _limiter(initial=8)
+    entered = 0
+    all_in = asyncio.Event()
+
+    async def call():
+        nonlocal entered
+        async with limiter.slot() as outcome:
+            entered += 1
+            if entered == 8:
+                all_in.set()
+            await all_in.wait()
+            outcome["overload"] = True
+
+    await asyncio.gather(*(call() for _ in range(8)))
+    assert int(limiter.limit) == 4
+
+    # A call admitted after the halving reports on the new limit.
+    async with limiter.slot() as outcome:
+        outcome["overload"] = True
+    assert int(limiter.limit) == 2
+
+
+async def test_a_timeout_escaping_the_call_counts_as_overload():
+    limiter = _limiter(initial=6)
+    with pytest.raises(httpx.ReadTimeout):
+        async with limiter.slot():
+            raise httpx.ReadTimeout("no answer")
+    assert int(limiter.limit) == 3
+
+
+async def test_a_bug_escaping_the_call_does_not_move_the_limit():
+    limiter = _limiter(initial=6)
+    with pytest.raises(KeyError):
+        async with limiter.slot():
+            raise KeyError("choices")
+    assert limiter.limit == 6
+
+
+async def test_an_ordinary_failure_does_not_move_the_limit():
+    """A 400 or an empty answer is about the request, not the endpoint."""
+    limiter = _limiter(initial=5)
+    async with limiter.slot() as outcome:
+        outcome["failed"] = True
+    assert limiter.limit == 5
+
+
+async def test_reads_that_slow_down_together_stop_the_growth(monkeypatch):
+    """Queueing at the far end looks like this, and it is what eight-at-once died of."""
+    import api.services.llm_service as llm
+
+    clock = [0.0]
+    monkeypatch.setattr(llm.time, "monotonic", lambda: clock[0])
+
+    limiter = _limiter(initial=4)
+    for _ in range(5):
+        async with limiter.slot():
+            clock[0] += 10.0
+    grown = limiter.limit
+
+    for _ in range(5):
+        async with limiter.slot():
+            clock[0] += 60.0
+    assert limiter.limit == grown, "the limit kept growing while every read took six times longer"
+
+
+async def test_nothing_past_the_limit_is_ever_in_flight():
+    limiter = _limiter(initial=2, maximum=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(10)))
+    assert peak == 2
@@ -69,7 +69,7 @@ async def test_extraction_puts_the_flags_on_the_page(store, doc_file, monkeypatc
     """Page 1 could not be verified, page 2 was read cleanly."""
     processor = PDFProcessor(store)
 
-    async def fake_vision(page, text_layer):
+    async def fake_vision(page, text_layer, **rendered):
         n = page.number + 1
         return f"| col |\n| --- |\n| {n} |", (UNVERIFIED if n == 1 else {})
 
@@ -91,7 +91,7 @@ async def test_a_resumed_page_is_no_more_trusted_than_a_fresh_one(
     second attempt at a document must not quietly launder an unverified page."""
     processor = PDFProcessor(store)
 
-    async def fake_vision(page, text_layer):
+    async def fake_vision(page, text_layer, **rendered):
         n = page.number + 1
         return f"| col |\n| --- |\n| {n} |", (UNVERIFIED if n == 1 else {})
 
@@ -99,7 +99,7 @@ async def test_a_resumed_page_is_no_more_trusted_than_a_fresh_one(
     monkeypatch.setattr(processor, "_read_page_with_vision", fake_vision)
     await processor.extract_text_with_page_numbers(_pdf_bytes(2), file_id=doc_file["id"])
 
-    async def must_not_run(page, text_layer):
+    async def must_not_run(page, text_layer, **rendered):
         raise AssertionError("a cached page was read again")
 
     monkeypatch.setattr(processor, "_read_page_with_vision", must_not_run)
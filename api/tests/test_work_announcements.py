@@ -286,3 +286,156 @@ async def test_a_failing_handler_does_not_kill_the_listener(monkeypatch):
         await events.listen("syntext:test", handler)
 
     assert seen == [1, 2]
+
+
+class _FakeListenConnection:
+    """Stands in for the worker's dedicated asyncpg connection."""
+
+    def __init__(self):
+        self.callbacks = []
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.callbacks.append(callback)
+
+    def notify(self, payload):
+        for callback in self.callbacks:
+            callback(self, 1234, events.PG_WORK_CHANNEL, payload)
+
+    async def execute(self, sql):
+        return "SELECT 1"
+
+    async def close(self):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+
+async def test_a_notify_reaches_the_handler_in_the_redis_shape(monkeypatch):
+    """One handler serves both wake paths, so the payload has to look the same.
+
+    The first call, with no run id, is the look taken on connecting: anything
+    notified while the connection was down was lost, and it is cheaper to look
+    once than to wait out the poll.
+    """
+    conn = _FakeListenConnection()
+
+    async def connect():
+        return conn
+
+    monkeypatch.setattr(events, "_connect_for_listen", connect)
+    seen = []
+    got_run = asyncio.Event()
+
+    async def handler(payload):
+        seen.append(payload)
+        if payload["run_id"] == "abc-123":
+            got_run.set()
+
+    task = asyncio.create_task(events.listen_postgres(events.PG_WORK_CHANNEL, handler))
+    try:
+        for _ in range(50):
+            if conn.callbacks:
+                break
+            await asyncio.sleep(0.01)
+        conn.notify("abc-123")
+        await asyncio.wait_for(got_run.wait(), timeout=1)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert seen == [{"run_id": None}, {"run_id": "abc-123"}]
+    assert conn.closed
+
+
+async def test_a_failing_handler_does_not_kill_the_postgres_listener(monkeypatch):
+    conn = _FakeListenConnection()
+
+    async def connect():
+        return conn
+
+    monkeypatch.setattr(events, "_connect_for_listen", connect)
+    seen = []
+    second = asyncio.Event()
+
+    async def handler(payload):
+        seen.append(payload["run_id"])
+        if payload["run_id"] == "two":
+            second.set()
+        if payload["run_id"] == "one":
+            raise RuntimeError("handler blew up")
+
+    task = asyncio.create_task(events.listen_postgres(events.PG_WORK_CHANNEL, handler))
+    try:
+        for _ in range(50):
+            if conn.callbacks:
+                break
+            await asyncio.sleep(0.01)
+        conn.notify("one")
+        conn.notify("two")
+        await asyncio.wait_for(second.wait(), timeout=1)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert seen[1:] == ["one", "two"]
+
+
+async def test_a_notify_is_heard_only_once_the_run_is_committed(store, tenant, monkeypatch):
+    """WORK_WAKE=postgres, against a real database.
+
+    The NOTIFY is issued inside the enqueue's transaction, and the property
+    being bought is that Postgres holds it until the commit. So the listener
+    here does what the worker would on waking: looks for the row from another
+    connection. Redis must not be used at all on this path.
+    """
+    from sqlalchemy import select
+    from api.models.orm_models import AgentRun
+
+    monkeypatch.setattr(events, "WORK_WAKE", "postgres")
+
+    async def no_redis(run_id: str) -> bool:
+        raise AssertionError("announced over Redis with WORK_WAKE=postgres")
+
+    monkeypatch.setattr(
+        "api.repositories.async_agent_run_repository.announce_work", no_redis
+    )
+
+    visible_at_notify = {}
+    heard = asyncio.Event()
+
+    async def look(payload):
+        run_id = payload["run_id"]
+        if run_id is None:
+            return
+        async with store.agent_run_repo.get_async_session() as session:
+            found = (
+                await session.execute(
+                    select(AgentRun).where(AgentRun.id == uuid.UUID(run_id))
+                )
+            ).scalar_one_or_none()
+            visible_at_notify[run_id] = found is not None
+        heard.set()
+
+    listener = asyncio.create_task(events.listen_postgres(events.PG_WORK_CHANNEL, look))
+    try:
+        # Let the LISTEN register before anything is notified.
+        await asyncio.sleep(0.5)
+        run_id = await store.agent_run_repo.enqueue_run(
+            run_type="answer_query",
+            agent_name="QueryAgent",
+            agent_version=None,
+            payload={"message": "does the worker hear this?"},
+            user_id=tenant.owner,
+        )
+        await asyncio.wait_for(heard.wait(), timeout=5)
+    finally:
+        listener.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await listener
+
+    assert run_id is not None
+    assert visible_at_notify.get(run_id) is True
@@ -0,0 +1,84 @@
+"""The supervisor keeps its workers up, reports their health, and drains them.
+
+The children here are tiny Python processes standing in for the worker, so
+nothing touches a database: what is under test is process handling, and a real
+worker would only make it slower and flakier.
+"""
+import asyncio
+import sys
+import time
+
+import pytest
+
+from api.workers import supervisor
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+_CRASHES = [sys.executable, "-c", "import sys; sys.exit(3)"]
+_RUNS = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+@pytest.fixture(autouse=True)
+def _fast(monkeypatch, tmp_path):
+    monkeypatch.setattr(supervisor, "SUPERVISE_INTERVAL", 0.05)
+    monkeypatch.setattr(supervisor, "HEARTBEAT_PATH", str(tmp_path / "heartbeat"))
+
+
+async def _run_for(children, seconds):
+    stop = asyncio.Event()
+    task = asyncio.create_task(supervisor.supervise(children, stop))
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.wait_for(task, timeout=5)
+
+
+async def test_a_crashed_worker_is_started_again():
+    child = supervisor.Child("query", 0, command=_CRASHES)
+
+    await _run_for([child], 1.5)
+
+    assert child.generation > 1, "a worker that exited was left down"
+
+
+async def test_each_start_claims_under_a_new_worker_id():
+    """A restarted child must not renew or finish its predecessor's runs."""
+    child = supervisor.Child("ingest", 0, command=_RUNS)
+    first = child.env()["WORKER_ID"]
+    child.generation += 1
+    assert child.env()["WORKER_ID"] != first
+    assert child.env()["WORKER_RUN_TYPES"] == "ingest_file"
+
+
+async def test_shutdown_waits_for_every_worker_to_exit():
+    children = [supervisor.Child("query", i, command=_RUNS) for i in range(2)]
+
+    await _run_for(children, 0.3)
+
+    assert all(c.process.returncode is not None for c in children)
+    assert all(c.generation == 1 for c in children), "a worker was restarted while draining"
+
+
+async def test_one_stalled_worker_makes_the_whole_thing_unhealthy(monkeypatch, tmp_path):
+    """The container's healthcheck reads one file; it must speak for every child."""
+    monkeypatch.setattr(supervisor, "HEARTBEAT_STALE_SECONDS", 1)
+    healthy = supervisor.Child("query", 0, command=_RUNS)
+    stalled = supervisor.Child("ingest", 0, command=_RUNS)
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(supervisor.supervise([healthy, stalled], stop))
+    try:
+        # Past the start-up grace, with only one of the two beating.
+        for _ in range(30):
+            (tmp_path / f"heartbeat.{healthy.name}").write_text(str(int(time.time())))
+            await asyncio.sleep(0.05)
+        (tmp_path / "heartbeat").unlink(missing_ok=True)
+        for _ in range(10):
+            (tmp_path / f"heartbeat.{healthy.name}").write_text(str(int(time.time())))
+            await asyncio.sleep(0.05)
+    finally:
+        stop.set()
+        await asyncio.wait_for(task, timeout=5)
+
+    assert not (tmp_path / "heartbeat").exists(), (
+        "reported healthy while one worker had never written a heartbeat"
+    )
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""Runs query workers and ingest workers as separate processes.
+
+    python -m api.workers.supervisor
+
+WHY
+
+One worker process runs every job on one event loop. The budgets in
+_acquire_slot keep an upload from taking a question's slot, but not from taking
+its CPU: parsing a PDF, chunking it and decoding the model's stream all hold the
+GIL, and every chat question on that loop waits while they do. On a droplet
+with several cores, one of them was doing all of it.
+
+So this starts QUERY_WORKERS processes that claim only questions and
+INGEST_WORKERS that claim only uploads (WORKER_RUN_TYPES, read by the claim),
+and sizes each pool on its own. Each child is the ordinary worker, unchanged
+but for that one variable, so everything about claiming, leases and fairness
+still lives in one place and in the database.
+
+WHAT IT OWNS
+
+  restarts    a child that exits without being asked to is started again,
+              with a backoff so one that dies on startup does not spin. Its
+              runs are not lost: their leases lapse and the sweeper in any
+              other child requeues them.
+  heartbeat   each child writes its own heartbeat file. WORKER_HEARTBEAT_PATH,
+              the one the container healthcheck reads, is written here and only
+              while every child's is fresh, so a stalled child makes the
+              container unhealthy exactly as a stalled single worker did.
+  shutdown    SIGTERM is passed to every child, and the supervisor waits for
+              them to drain their in-flight jobs before exiting. No new child
+              is started once it has been asked to stop.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from api.core.timing import emit
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger('syntextai-supervisor')
+
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "2"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+HEARTBEAT_PATH = os.getenv("WORKER_HEARTBEAT_PATH", "/tmp/worker_heartbeat")
+
+# A child whose heartbeat is older than this counts as stalled. Under the
+# compose healthcheck's 180 so a stall is reported before the check gives up.
+HEARTBEAT_STALE_SECONDS = int(os.getenv("HEARTBEAT_STALE_SECONDS", "120"))
+
+SUPERVISE_INTERVAL = float(os.getenv("SUPERVISE_INTERVAL", "5"))
+
+# Restart backoff, doubling per consecutive crash. A child that stays up this
+# long has recovered, and its next crash starts from the bottom again.
+RESTART_BACKOFF_MAX = 60
+RESTART_STABLE_SECONDS = 60
+
+CHILD_COMMAND = [sys.executable, "-m", "api.workers.worker"]
+
+ROLES = {
+    "query": "answer_query",
+    "ingest": "ingest_file",
+}
+
+
+class Child:
+    """One worker process slot: what it runs, and its current process."""
+
+    def __init__(self, role: str, index: int, command: Optional[List[str]] = None):
+        self.role = role
+        self.index = index
+        self.command = command or CHILD_COMMAND
+        self.name = f"{role}-{index}"
+        self.heartbeat_path = f"{HEARTBEAT_PATH}.{self.name}"
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.generation = 0
+        self.crashes = 0
+        self.restart_at = 0.0
+
+    def env(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env["WORKER_RUN_TYPES"] = ROLES[self.role]
+        env["WORKER_HEARTBEAT_PATH"] = self.heartbeat_path
+        # locked_by on every run this child claims. Unique per start, so a
+        # restarted child never mistakes its predecessor's runs for its own.
+        env["WORKER_ID"] = f"{socket.gethostname()}:{self.name}.{self.generation}"
+        return env
+
+    async def start(self) -> None:
+        self.generation += 1
+        self.process = await asyncio.create_subprocess_exec(*self.command, env=self.env())
+        self.started_at = time.monotonic()
+        logger.info(f"Started {self.name} (pid {self.process.pid})")
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def fresh(self, now: float) -> bool:
+        """Whether this child has shown signs of life recently enough.
+
+        A child that has only just started has not written a heartbeat yet,
+        and counts as fresh until it has had the full window to do so.
+        """
+        if not self.running:
+            return False
+        if time.monotonic() - self.started_at < HEARTBEAT_STALE_SECONDS:
+            return True
+        try:
+            beat = int(Path(self.heartbeat_path).read_text())
+        except Exception:
+            return False
+        return now - beat < HEARTBEAT_STALE_SECONDS
+
+
+def _children() -> List[Child]:
+    return (
+        [Child("query", i) for i in range(QUERY_WORKERS)]
+        + [Child("ingest", i) for i in range(INGEST_WORKERS)]
+    )
+
+
+async def supervise(children: List[Child], stop: asyncio.Event) -> None:
+    """Keep every child running until `stop` is set, then drain them."""
+    for child in children:
+        await child.start()
+
+    while not stop.is_set():
+        now = time.monotonic()
+        for child in children:
+            if child.running:
+                if now - child.started_at > RESTART_STABLE_SECONDS:
+                    child.crashes = 0
+                continue
+            if child.restart_at == 0.0:
+                child.crashes += 1
+                delay = min(2 ** (child.crashes - 1), RESTART_BACKOFF_MAX)
+                child.restart_at = now + delay
+                logger.error(
+                    f"{child.name} exited with {child.process.returncode}; "
+                    f"restarting in {delay}s"
+                )
+                emit("worker_restarted", worker=child.name,
+                     returncode=child.process.returncode, crashes=child.crashes)
+            if now >= child.restart_at:
+                child.restart_at = 0.0
+                await child.start()
+
+        wall = time.time()
+        if all(child.fresh(wall) for child in children):
+            try:
+                Path(HEARTBEAT_PATH).write_text(str(int(wall)))
+            except Exception:
+                logger.debug("Could not write heartbeat", exc_info=True)
+        else:
+            stale = [c.name for c in children if not c.fresh(wall)]
+            logger.warning(f"Not reporting healthy: {', '.join(stale)} stalled or down")
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=SUPERVISE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    await drain(children)
+
+
+async def drain(children: List[Child]) -> None:
+    """Ask every child to stop and wait while they finish what they hold.
+
+    No timeout here. The child's own shutdown waits for its in-flight jobs,
+    and whatever stops the container decides how long that may take.
+    """
+    live = [c for c in children if c.running]
+    logger.info(f"Draining {len(live)} worker(s)...")
+    for child in live:
+        try:
+            child.process.send_signal(signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    await asyncio.gather(*(c.process.wait() for c in live))
+    logger.info("All workers drained")
+
+
+async def main() -> None:
+    children = _children()
+    logger.info(
+        f"Starting supervisor ({QUERY_WORKERS} query worker(s), "
+        f"{INGEST_WORKERS} ingest worker(s))"
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await supervise(children, stop)
+    logger.info("Supervisor shutdown complete")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -20,20 +20,26 @@ import signal
 import time
 import requests
 from contextlib import asynccontextmanager
-from sqlalchemy import text
+from sqlalchemy import DateTime, Integer, String, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional
 from urllib.parse import urlparse
 import uuid
 from dotenv import load_dotenv
 from pathlib import Path
 from api.core.events import (
+    PG_WORK_CHANNEL,
     WORK_CHANNEL,
     aclose as aclose_events,
     announce_client_event,
     is_enabled as is_events_enabled,
     listen,
+    listen_postgres,
+    wakes_via_postgres,
 )
+from api.agents.overhead import measure_graph_overhead
+from api.core.plans import PLANS, get_plan
 from api.core.timing import emit
 from api.models.orm_models import AgentRun
 from api.workflows.tasks import process_file_data
@@ -105,12 +111,28 @@ INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
 # A file at or above this size takes the exclusive heavy slot.
 HEAVY_FILE_BYTES = int(os.getenv("HEAVY_FILE_BYTES", str(8 * 1024 * 1024)))
 
-# Per-tenant cap on simultaneously running jobs, so one user queueing twenty
-# files cannot starve everyone else. Queries and ingests count together.
+# Per-user cap on simultaneously running jobs, so one user queueing twenty
+# files cannot starve everyone else. Queries and ingests count together, and
+# the count is of running rows in agent_runs, so it holds across every worker
+# replica rather than per process. Fairness between organizations is separate
+# and weighted by plan; see _CLAIM_SQL.
 MAX_RUNS_PER_USER = int(os.getenv("MAX_RUNS_PER_USER", "3"))
 
-# Total in-flight ceiling across all run types.
-MAX_INFLIGHT = int(os.getenv("MAX_INFLIGHT", str(QUERY_CONCURRENCY + INGEST_CONCURRENCY)))
+# Which run types this process claims, comma separated. Empty means all of
+# them, which is how a single worker runs. The supervisor (workers/supervisor.py)
+# starts query-only and ingest-only processes by setting this, so a PDF being
+# parsed never shares an event loop, or a GIL, with a chat question.
+WORKER_RUN_TYPES = [t.strip() for t in os.getenv("WORKER_RUN_TYPES", "").split(",") if t.strip()]
+
+# Total in-flight ceiling across all run types. By default the sum of the
+# budgets this process can actually use: a query-only worker claiming ingest
+# slots' worth of questions would only hold them waiting on the semaphore.
+_BUDGETS = {"answer_query": QUERY_CONCURRENCY, "ingest_file": INGEST_CONCURRENCY}
+MAX_INFLIGHT = int(os.getenv(
+    "MAX_INFLIGHT",
+    str(sum(_BUDGETS.get(t, 0) for t in WORKER_RUN_TYPES) if WORKER_RUN_TYPES
+        else QUERY_CONCURRENCY + INGEST_CONCURRENCY),
+))
 
 # Idle poll interval. The loop also wakes as soon as any running task finishes,
 # so this only governs how long it sleeps when there is nothing to do.
@@ -120,10 +142,10 @@ POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "30"))
 # are returned to the queue.
 LEASE_MINUTES = int(os.getenv("LEASE_MINUTES", "15"))
 
-# A running job pushes its own lease forward this often. Without it the lease
-# means "this job started less than LEASE_MINUTES ago", not "a worker is alive
-# and holding it", so anything slower than the lease gets reclaimed while it is
-# still working. Measured 2026-08-12: vision extraction on the 69-page Carrier
+# The worker pushes every running job's lease forward this often. Without it
+# the lease means "this job started less than LEASE_MINUTES ago", not "a worker
+# is alive and holding it", so anything slower than the lease gets reclaimed
+# while it is still working. Measured 2026-08-12: vision extraction on the 69-page Carrier
 # manual takes about an hour, so the sweeper requeued it at 15, 30 and 45
 # minutes and then marked it "worker presumed dead. Out of attempts." The worker
 # was alive the whole time, and each requeue started a SECOND live extraction of
@@ -132,6 +154,14 @@ LEASE_MINUTES = int(os.getenv("LEASE_MINUTES", "15"))
 # is reclaimed.
 LEASE_RENEW_SECONDS = max(30, (LEASE_MINUTES * 60) // 3)
 
+# How long a run may wait in the queue before its start is reported as a
+# breach (queue_wait_slo_breach). A run with its own start_by is held to that
+# instead.
+QUEUE_WAIT_SLO_MS = {
+    "answer_query": float(os.getenv("QUERY_WAIT_SLO_MS", "5000")),
+    "ingest_file": float(os.getenv("INGEST_WAIT_SLO_MS", "120000")),
+}
+
 # API base URL for internal notifications (docker-compose sets this to http://syntextaiapp:3000)
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:3000").rstrip("/")
 
@@ -146,21 +176,29 @@ query_semaphore = asyncio.Semaphore(QUERY_CONCURRENCY)
 ingest_semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
 heavy_ingest_semaphore = asyncio.Semaphore(1)
 
-# user_id -> number of runs currently executing, used for the per-tenant cap.
-inflight_by_user: Dict[int, int] = {}
+# run id -> the task executing it, for every run whose lease this worker holds.
+# _keep_leases renews them together and cancels any it has lost.
+held_runs: Dict[uuid.UUID, asyncio.Task] = {}
 
 # Track running tasks to ensure graceful shutdown. A set, because the loop adds
 # and removes entries as jobs start and finish rather than in batches.
 running_tasks: set = set()
 shutdown_event = asyncio.Event()
 
-# Set by the Redis listener when the API announces a queued run, so the loop
+# Set by the listener (Redis, or Postgres NOTIFY under WORK_WAKE=postgres) when
+# the API announces a queued run, so the loop
 # stops waiting and goes to look. Cleared by the loop before each fetch.
 work_available = asyncio.Event()
 
 # How often to sweep for runs whose lease expired.
 RECLAIM_INTERVAL = int(os.getenv("RECLAIM_INTERVAL", "60"))
 
+# agent_runs housekeeping: monthly partitions created ahead, and the full
+# result of finished runs older than AGENT_RUN_ARCHIVE_DAYS moved to
+# agent_runs_archive. One replica does it per interval; see run_maintenance.
+MAINTENANCE_INTERVAL = int(os.getenv("AGENT_RUN_MAINTENANCE_INTERVAL", str(6 * 3600)))
+AGENT_RUN_ARCHIVE_DAYS = int(os.getenv("AGENT_RUN_ARCHIVE_DAYS", "90"))
+
 # Liveness heartbeat. The worker serves no HTTP, so the image's HEALTHCHECK
 # (which curls port 3000) could never pass for it and left the container
 # permanently unhealthy, hiding real stalls. The loop touches this file on every
@@ -262,6 +300,9 @@ async def update_agent_run(
         run.status = status
         if result is not None:
             run.result = result
+        if status in ("succeeded", "failed"):
+            # Only a retry reads it, and a finished run is not retried.
+            run.checkpoint = None
         if last_error is not None:
             run.last_error = last_error
         if started_at is not None:
@@ -324,7 +365,8 @@ def _run_record(result: Dict[str, Any]) -> Dict[str, Any]:
     keep = {
         k: result.get(k)
         for k in ("mode", "rewritten_query", "expanded_terms",
-                  "information_needs", "covered_needs", "retrievals", "error")
+                  "information_needs", "covered_needs", "retrievals", "error",
+                  "resumed_after", "search_profiles")
         if result.get(k) is not None
     }
     chunks = result.get("context_chunks") or []
@@ -340,28 +382,61 @@ def _run_record(result: Dict[str, Any]) -> Dict[str, Any]:
     return keep
 
 
-async def process_agent_run(run_id: uuid.UUID) -> None:
+async def process_agent_run(run_id: uuid.UUID, claimed: Optional["ClaimedRun"] = None) -> None:
+    """Dispatch one claimed run.
+
+    `claimed` is what fetch_pending_runs returned for it. Without it the row is
+    read back, which is only for callers that hold nothing but an id.
+    """
     store = get_repository_manager()
 
-    async with store.agent_run_repo.get_async_session() as session:
-        run = await session.get(AgentRun, run_id)
-        if not run:
-            return
-        payload = run.payload or {}
-        run_type = run.run_type
-        run_user_id = run.user_id
-        queued_at = run.created_at
-        started_at = run.started_at
+    if claimed is None:
+        async with store.agent_run_repo.get_async_session() as session:
+            run = await session.get(AgentRun, run_id)
+            if not run:
+                return
+            claimed = ClaimedRun(
+                run.id, run.user_id, run.run_type, run.payload or {},
+                run.created_at, run.started_at, run.start_by, run.checkpoint,
+            )
+    payload = claimed.payload or {}
+    run_type = claimed.run_type
+    run_user_id = claimed.user_id
+    queued_at = claimed.created_at
+    started_at = claimed.started_at
 
     # Queue wait is the headline latency number: how long the user sat there
     # after uploading or asking before any work began.
     if queued_at and started_at:
+        wait_ms = (started_at - queued_at).total_seconds() * 1000
         emit(
             "queue_wait",
-            ms=(started_at - queued_at).total_seconds() * 1000,
+            ms=wait_ms,
             run_type=run_type,
             user_id=run_user_id,
         )
+        # The tail is what customers notice, and a p99 over a day hides the
+        # afternoon it went wrong. One event per breach can be counted and
+        # alerted on as it happens.
+        start_by = claimed.start_by
+        if start_by is not None and started_at > start_by:
+            emit(
+                "queue_wait_slo_breach",
+                ms=wait_ms,
+                run_type=run_type,
+                user_id=run_user_id,
+                reason="deadline",
+                late_ms=(started_at - start_by).total_seconds() * 1000,
+            )
+        elif wait_ms > QUEUE_WAIT_SLO_MS.get(run_type, float("inf")):
+            emit(
+                "queue_wait_slo_breach",
+                ms=wait_ms,
+                run_type=run_type,
+                user_id=run_user_id,
+                reason="slo",
+                slo_ms=QUEUE_WAIT_SLO_MS[run_type],
+            )
 
     async with _acquire_slot(run_type, payload):
         if shutdown_event.is_set():
@@ -451,6 +526,11 @@ async def process_agent_run(run_id: uuid.UUID) -> None:
                 formatted_history = await store.chat_repo.format_user_chat_history(
                     int(history_id), int(user_id), accessible_workspace_ids=accessible_ids
                 )
+                worker_id = os.getenv("WORKER_ID") or str(os.getpid())
+
+                async def checkpoint(state: Dict[str, Any]) -> None:
+                    await store.agent_run_repo.save_checkpoint(run_id, state, locked_by=worker_id)
+
                 result = await run_query_pipeline(
                     user_id=int(user_id),
                     message=str(message),
@@ -459,6 +539,10 @@ async def process_agent_run(run_id: uuid.UUID) -> None:
                     formatted_history=formatted_history,
                     workspace_id=int(workspace_id) if workspace_id is not None else None,
                     file_id=int(file_id) if file_id is not None else None,
+                    # Set when a worker died part way through this question:
+                    # carry on after the last step it finished.
+                    checkpoint=checkpoint,
+                    resume_from=claimed.checkpoint,
                 )
                 response = result.get("response")
                 if response:
@@ -556,53 +640,108 @@ async def notify_client(user_id: int, event_type: str, data: Dict[str, Any]) ->
     await asyncio.to_thread(_post)
 
 
-async def renew_lease(run_id: uuid.UUID) -> bool:
-    """Push one running run's lease forward. False means we no longer hold it.
+# Renews every lease this worker holds in one statement, and reports which of
+# them are still ours. A row the sweeper (or anyone) has taken is simply not
+# returned.
+_RENEW_SQL = text(
+    """
+    UPDATE agent_runs
+    SET lease_expires_at = :lease_until, updated_at = :now
+    WHERE id = ANY(:ids)
+      AND status = 'running'
+      AND locked_by = :worker_id
+    RETURNING id
+    """
+).columns(id=PG_UUID(as_uuid=True))
+
+
+async def renew_leases(run_ids: List[uuid.UUID]) -> set:
+    """Push the leases of `run_ids` forward. Returns the ids we still hold.
 
-    Deliberately conditional on the row still being ours and still running: if
-    the sweeper already reclaimed this run, renewing would drag a row somebody
-    else now owns, and two workers would believe they hold the same job.
+    Deliberately conditional on each row still being ours and still running: if
+    the sweeper already reclaimed a run, renewing would drag a row somebody else
+    now owns, and two workers would believe they hold the same job.
     """
+    if not run_ids:
+        return set()
     try:
-        from sqlalchemy import update as sa_update
-
         store = get_repository_manager()
         worker_id = os.getenv("WORKER_ID") or str(os.getpid())
         now = datetime.utcnow()
         async with store.agent_run_repo.get_async_session() as session:
-            res = await session.execute(
-                sa_update(AgentRun)
-                .where(
-                    AgentRun.id == run_id,
-                    AgentRun.status == "running",
-                    AgentRun.locked_by == str(worker_id),
-                )
-                .values(lease_expires_at=now + timedelta(minutes=LEASE_MINUTES), updated_at=now)
+            rows = await session.execute(
+                _RENEW_SQL,
+                {
+                    "ids": list(run_ids),
+                    "worker_id": str(worker_id),
+                    "now": now,
+                    "lease_until": now + timedelta(minutes=LEASE_MINUTES),
+                },
             )
+            held = {row.id for row in rows}
             await session.commit()
-            return res.rowcount > 0
+            return held
     except Exception as e:
-        logger.warning(f"Could not renew lease for run {run_id}: {e}")
+        logger.warning(f"Could not renew leases for {len(run_ids)} run(s): {e}")
         # Not fatal on its own. A single failed renewal still leaves most of the
         # lease in hand, and the next tick will try again.
-        return True
+        return set(run_ids)
+
+
+async def renew_lease(run_id: uuid.UUID) -> bool:
+    """Push one running run's lease forward. False means we no longer hold it."""
+    return run_id in await renew_leases([run_id])
+
 
+async def _keep_leases() -> None:
+    """Renew the lease on every run this worker holds, for as long as it runs.
 
-async def _hold_lease(run_id: uuid.UUID) -> None:
-    """Renew a run's lease for as long as its job is running."""
+    One of these per process, not one per job. Each job used to carry its own
+    renewal task, so a worker with six slots issued six UPDATEs on six pooled
+    connections every interval. Now it is one UPDATE for all of them, and a
+    lost lease is noticed for every run in the same pass.
+
+    A run that comes back not ours has been reclaimed and is, or soon will be,
+    running somewhere else. Its local task is cancelled: carrying on means two
+    workers doing the same paid work, and this one's result would be written
+    over a row it no longer owns.
+    """
     while True:
         await asyncio.sleep(LEASE_RENEW_SECONDS)
-        still_ours = await renew_lease(run_id)
-        if not still_ours:
-            # The job is still executing here, so this is the moment the run got
-            # taken away from us. Say so loudly: the alternative is two workers
-            # doing the same paid work and neither of them mentioning it.
+        if not held_runs:
+            continue
+        ids = list(held_runs)
+        still_ours = await renew_leases(ids)
+        for run_id in ids:
+            if run_id in still_ours:
+                continue
+            task = held_runs.pop(run_id, None)
+            if task is None:
+                # Finished between the snapshot and the answer.
+                continue
+            # Say so loudly: the alternative is two workers doing the same job
+            # and neither of them mentioning it.
             logger.error(
                 f"Run {run_id} was reclaimed while this worker is still executing it. "
-                "Lease renewal is losing to the sweeper."
+                "Lease renewal is losing to the sweeper; cancelling the local copy."
             )
             emit("lease_lost_while_running", run_id=str(run_id))
-            return
+            task.cancel()
+
+
+async def _maintain() -> None:
+    """agent_runs housekeeping, every MAINTENANCE_INTERVAL, beside the loop.
+
+    Its own task rather than a step of worker_loop, which it used to be: the
+    replica doing it stopped claiming until the archive was through.
+    """
+    while True:
+        done = await get_repository_manager().agent_run_repo.run_maintenance(
+            archive_after_days=AGENT_RUN_ARCHIVE_DAYS
+        )
+        if any(done.values()):
+            logger.info(f"agent_runs maintenance: {done}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
 
 
 async def reclaim_expired_runs() -> int:
@@ -632,10 +771,12 @@ async def reclaim_expired_runs() -> int:
             for run in runs:
                 attempts = (run.attempts or 0) + 1
                 run.attempts = attempts
+                run.reclaimed_at = now
                 if attempts >= (run.max_attempts or 3):
                     run.status = "failed"
                     run.last_error = "Lease expired; worker presumed dead. Out of attempts."
                     run.finished_at = now
+                    run.checkpoint = None
                     if run.file_id:
                         logger.warning(f"Run {run.id} abandoned permanently; marking file {run.file_id} failed")
                 else:
@@ -666,87 +807,282 @@ async def reclaim_expired_runs() -> int:
         return 0
 
 
-async def fetch_pending_runs(limit: int = 10) -> List[Tuple[uuid.UUID, Optional[int]]]:
+class ClaimedRun(NamedTuple):
+    """What the claim returns: everything dispatch reads, so nothing re-reads it."""
+
+    id: uuid.UUID
+    user_id: Optional[int]
+    run_type: str
+    payload: Dict[str, Any]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    start_by: Optional[datetime] = None
+    # Progress saved by an earlier attempt that did not finish, if any.
+    checkpoint: Optional[Dict[str, Any]] = None
+
+
+# One statement, one round trip, and fair between organizations.
+#
+# The old order was priority then age, over the oldest few dozen rows. Fairness
+# was MAX_RUNS_PER_USER counted in this process's memory, which meant one
+# organization with twenty staff could hold every slot, a bulk upload of a
+# hundred PDFs filled the scan window so nobody else's ingest was even looked
+# at, and two worker replicas each enforced the cap on their own.
+#
+# Now, in order:
+#
+#   live          every queued and running run, which is what
+#                 idx_agent_runs_hot holds, with the organization it belongs
+#                 to: its workspace's, or for a run with no workspace (a
+#                 question across everything) its user's own organization.
+#                 enqueue_run stores it on the run; only runs queued before
+#                 that are still resolved here, row by row.
+#   the ledger    running counts per organization and per user, read from the
+#                 rows themselves, so nothing has to be kept in step. Claims
+#                 take _CLAIM_LOCK first, so each one's snapshot includes every
+#                 claim before it; without it two replicas claiming at once
+#                 each saw N-1 running and both took the Nth.
+#   heads         each organization's next few runs of the types this process
+#                 serves, so the candidates are a slice of every tenant rather
+#                 than the oldest rows overall.
+#   candidates    those heads, locked with SKIP LOCKED. The window functions
+#                 cannot share a level with FOR UPDATE, hence separate CTEs.
+#   ranked        the per-user cap (running plus this user's earlier
+#                 candidates), and each run's finish tag: its organization's
+#                 running count plus its place in that organization's line,
+#                 divided by the plan's queue_weight.
+#
+# Claiming in order of priority, then finish tag, is deficit round robin with
+# the deficit kept in the ledger: an organization with work in flight has
+# already had its turn, one with nothing running goes next, and a business plan
+# gets twice the turns of a starter one while both are waiting. The weight is
+# the plan's only while it is paid for: a lapsed or past-due subscription gets
+# the default, as it would from core/limits. Priority still
+# comes first, so a fresh question never waits behind anybody's ingest.
+#
+# "Priority" is not the stored integer. It is the effective priority at claim
+# time, eff = priority - seconds waited / PRIORITY_AGING_SECONDS, compared in
+# bands of PRIORITY_BAND so that runs of about the same urgency still take fair
+# turns rather than strictly oldest first. The stored 10 for a question and 200
+# for an upload meant a steady stream of questions could hold a backlog of
+# uploads forever; with aging an upload that has waited long enough outranks a
+# question that has just arrived. A run with a start_by deadline goes ahead of
+# everything without one, earliest deadline first.
+#
+# Rows that lose to the cap are locked only until the statement ends and are
+# never written, so they stay queued for the next pass or another worker.
+_CLAIM_SQL = text(
+    """
+    WITH live AS (
+        SELECT r.id, r.status, r.run_type, r.user_id, r.created_at, r.run_after,
+               r.start_by,
+               r.priority - extract(epoch FROM (:now - r.created_at)) / :aging_seconds AS eff,
+               COALESCE(r.organization_id, w.organization_id, own.organization_id) AS org_id
+        FROM agent_runs r
+        LEFT JOIN workspaces w ON r.organization_id IS NULL AND w.id = r.workspace_id
+        LEFT JOIN LATERAL (
+            SELECT m.organization_id
+            FROM organization_members m
+            WHERE r.organization_id IS NULL AND r.workspace_id IS NULL
+              AND m.user_id = r.user_id
+            ORDER BY (m.role = 'owner') DESC, m.id
+            LIMIT 1
+        ) own ON true
+        WHERE r.status IN ('queued', 'running')
+    ),
+    org_running AS (
+        SELECT org_id, count(*) AS n FROM live
+        WHERE status = 'running' GROUP BY org_id
+    ),
+    user_running AS (
+        SELECT user_id, count(*) AS n FROM live
+        WHERE status = 'running' AND user_id IS NOT NULL GROUP BY user_id
+    ),
+    weights AS (
+        SELECT o.org_id, COALESCE(pw.weight, :default_weight) AS weight
+        FROM (SELECT DISTINCT org_id FROM live WHERE status = 'queued') o
+        LEFT JOIN LATERAL (
+            SELECT s.plan_key
+            FROM subscriptions s
+            WHERE s.organization_id = o.org_id
+              AND s.status IN ('active', 'trialing')
+            ORDER BY s.updated_at DESC NULLS LAST
+            LIMIT 1
+        ) sub ON true
+        LEFT JOIN unnest(CAST(:plan_keys AS text[]),
+                         CAST(:plan_weights AS double precision[])) AS pw(plan_key, weight)
+               ON pw.plan_key = lower(sub.plan_key)
+    ),
+    heads AS (
+        SELECT id, org_id, eff, start_by
+        FROM (
+            SELECT id, org_id, eff, start_by,
+                   row_number() OVER (
+                       PARTITION BY org_id ORDER BY start_by NULLS LAST, eff, created_at
+                   ) AS k
+            FROM live
+            WHERE status = 'queued'
+              AND (run_after IS NULL OR run_after <= :now)
+              AND (cardinality(CAST(:run_types AS text[])) = 0
+                   OR run_type = ANY(CAST(:run_types AS text[])))
+        ) q
+        WHERE k <= :per_org_scan
+    ),
+    candidates AS (
+        SELECT a.id, a.user_id, a.created_at, h.org_id, h.eff, h.start_by
+        FROM agent_runs a
+        JOIN heads h ON h.id = a.id
+        WHERE a.status = 'queued'
+        FOR UPDATE OF a SKIP LOCKED
+    ),
+    ranked AS (
+        SELECT c.id, c.user_id, c.created_at, c.start_by,
+               floor(c.eff / :band) AS band,
+               row_number() OVER (
+                   PARTITION BY c.user_id ORDER BY c.start_by NULLS LAST, c.eff, c.created_at
+               ) + COALESCE(ur.n, 0) AS nth,
+               (row_number() OVER (
+                   PARTITION BY c.org_id ORDER BY c.start_by NULLS LAST, c.eff, c.created_at
+               ) + COALESCE(orr.n, 0)) / COALESCE(wt.weight, :default_weight) AS finish
+        FROM candidates c
+        LEFT JOIN user_running ur ON ur.user_id = c.user_id
+        LEFT JOIN org_running orr ON orr.org_id IS NOT DISTINCT FROM c.org_id
+        LEFT JOIN weights wt ON wt.org_id IS NOT DISTINCT FROM c.org_id
+    ),
+    picked AS (
+        SELECT id,
+               row_number() OVER (
+                   ORDER BY start_by ASC NULLS LAST, band ASC, finish ASC, created_at ASC
+               ) AS ord
+        FROM ranked
+        WHERE user_id IS NULL OR nth <= :per_user
+        ORDER BY ord
+        LIMIT :limit
+    ),
+    claimed AS (
+        UPDATE agent_runs a
+        SET status = 'running',
+            locked_by = :worker_id,
+            locked_at = :now,
+            started_at = :now,
+            lease_expires_at = :lease_until,
+            updated_at = :now
+        FROM picked
+        WHERE a.id = picked.id
+        RETURNING a.id, a.user_id, a.run_type, a.payload, a.created_at,
+                  a.started_at, a.start_by, a.checkpoint, picked.ord
+    )
+    SELECT id, user_id, run_type, payload, created_at, started_at, start_by, checkpoint,
+           (SELECT count(*) FROM ranked
+            WHERE user_id IS NOT NULL AND nth > :per_user) AS deferred
+    FROM claimed
+    ORDER BY ord
+    """
+).columns(
+    id=PG_UUID(as_uuid=True),
+    user_id=Integer,
+    run_type=String,
+    payload=JSONB,
+    created_at=DateTime(timezone=True),
+    started_at=DateTime(timezone=True),
+    start_by=DateTime(timezone=True),
+    checkpoint=JSONB,
+    deferred=Integer,
+)
+
+# Serialises claims across replicas for the rest of the claiming transaction,
+# which is the one statement above. Claims are milliseconds, so queueing on
+# this costs less than the cap it makes exact.
+_CLAIM_LOCK = text("SELECT pg_advisory_xact_lock(hashtext('agent_runs_claim'))")
+
+# Seconds of waiting worth one point of priority. At 6, an upload (200) that
+# has waited about nineteen minutes outranks a question (10) asked just now.
+PRIORITY_AGING_SECONDS = float(os.getenv("PRIORITY_AGING_SECONDS", "6"))
+
+# Runs whose effective priority falls in the same band of this width take fair
+# turns between organizations; a lower band always goes first.
+PRIORITY_BAND = float(os.getenv("PRIORITY_BAND", "10"))
+
+# How many of each organization's queued runs are considered per claim. A few
+# more than one pass can take, so an organization's next run is never missed
+# because its user was at the cap.
+PER_ORG_SCAN = int(os.getenv("PER_ORG_SCAN", "8"))
+
+
+async def fetch_pending_runs(limit: int = 10) -> List[ClaimedRun]:
     """Claim up to `limit` queued runs, respecting the per-tenant cap.
 
-    Candidates are read in priority order, then filtered against the per-user
-    in-flight count. Rows we decline are simply left untouched, so they stay
-    queued and remain available to this worker's next pass or another worker.
+    Candidates are taken from the head of every organization's line, filtered
+    against the per-user cap, and claimed in priority order and then in fair
+    turns between organizations (see _CLAIM_SQL). Rows we decline are simply
+    left untouched, so they stay queued and remain available to this worker's
+    next pass or another worker.
+
+    This used to load every candidate as an ORM object, decide in Python, and
+    flush an UPDATE per claimed row, after which process_agent_run opened a
+    second session to read the same row back. Now it is _CLAIM_SQL: one
+    statement that locks, caps, claims and returns what dispatch needs.
     """
     if limit <= 0:
         return []
     try:
-        from sqlalchemy import select, or_
-
         store = get_repository_manager()
         worker_id = os.getenv("WORKER_ID") or str(os.getpid())
+        now = datetime.utcnow()
 
         async with store.agent_run_repo.get_async_session() as session:
-            now = datetime.utcnow()
-            stmt = (
-                select(AgentRun)
-                .where(
-                    AgentRun.status == "queued",
-                    or_(AgentRun.run_after.is_(None), AgentRun.run_after <= now),
+            await session.execute(_CLAIM_LOCK)
+            rows = (
+                await session.execute(
+                    _CLAIM_SQL,
+                    {
+                        "now": now,
+                        "lease_until": now + timedelta(minutes=LEASE_MINUTES),
+                        "worker_id": str(worker_id),
+                        "per_org_scan": max(PER_ORG_SCAN, limit),
+                        "limit": limit,
+                        "per_user": MAX_RUNS_PER_USER,
+                        "plan_keys": list(PLANS),
+                        "plan_weights": [p.queue_weight for p in PLANS.values()],
+                        "default_weight": get_plan(None).queue_weight,
+                        "run_types": WORKER_RUN_TYPES,
+                        "aging_seconds": float(max(PRIORITY_AGING_SECONDS, 1)),
+                        "band": float(max(PRIORITY_BAND, 1)),
+                    },
                 )
-                .order_by(AgentRun.priority.asc(), AgentRun.created_at.asc())
-                .with_for_update(skip_locked=True)
-                # Over-fetch so that skipping a user at their cap does not cost
-                # us the whole batch.
-                .limit(max(limit * 4, 20))
-            )
-
-            res = await session.execute(stmt)
-            runs = res.scalars().all()
-
-            # Provisional per-user tally, seeded from what is already running.
-            tally = dict(inflight_by_user)
-            claimed: List[Tuple[uuid.UUID, Optional[int]]] = []
-            deferred = 0
-            for run in runs:
-                if len(claimed) >= limit:
-                    break
-                uid = run.user_id
-                if uid is not None:
-                    if tally.get(uid, 0) >= MAX_RUNS_PER_USER:
-                        deferred += 1
-                        continue
-                    tally[uid] = tally.get(uid, 0) + 1
-
-                run.status = "running"
-                run.locked_by = str(worker_id)
-                run.locked_at = now
-                run.started_at = now
-                run.lease_expires_at = now + timedelta(minutes=LEASE_MINUTES)
-                run.updated_at = now
-                claimed.append((run.id, uid))
-
+            ).all()
             await session.commit()
-            if deferred:
-                logger.info(f"Deferred {deferred} run(s) whose owner is at the per-user cap of {MAX_RUNS_PER_USER}")
-            return claimed
+
+        claimed = [
+            ClaimedRun(r.id, r.user_id, r.run_type, r.payload or {}, r.created_at,
+                       r.started_at, r.start_by, r.checkpoint)
+            for r in rows
+        ]
+        deferred = rows[0].deferred if rows else 0
+        if deferred:
+            logger.info(f"Deferred {deferred} run(s) whose owner is at the per-user cap of {MAX_RUNS_PER_USER}")
+        return claimed
     except Exception as e:
         logger.error(f"Error fetching pending agent runs: {str(e)}")
         return []
 
 
-async def _run_tracked(run_id: uuid.UUID, user_id: Optional[int]) -> None:
-    """Run one job while maintaining the per-user in-flight count."""
-    if user_id is not None:
-        inflight_by_user[user_id] = inflight_by_user.get(user_id, 0) + 1
-    keepalive = asyncio.create_task(_hold_lease(run_id))
+async def _run_tracked(run: ClaimedRun) -> None:
+    """Run one job while this worker holds its lease."""
+    run_id = run.id
+    held_runs[run_id] = asyncio.current_task()
     try:
-        await process_agent_run(run_id)
+        await process_agent_run(run_id, claimed=run)
+    except asyncio.CancelledError:
+        if run_id in held_runs:
+            raise
+        # Cancelled by _keep_leases because the run is no longer ours. That is
+        # the end of this copy, not of the worker.
+        logger.info(f"Stopped run {run_id} after losing its lease")
     except Exception:
         logger.exception(f"Agent run {run_id} raised")
     finally:
-        keepalive.cancel()
-        if user_id is not None:
-            remaining = inflight_by_user.get(user_id, 1) - 1
-            if remaining > 0:
-                inflight_by_user[user_id] = remaining
-            else:
-                inflight_by_user.pop(user_id, None)
+        held_runs.pop(run_id, None)
 
 
 async def _work_announced(payload: Dict[str, Any]) -> None:
@@ -807,8 +1143,8 @@ async def worker_loop() -> None:
                     logger.info(
                         f"Claimed {len(claimed)} run(s); in-flight {len(running_tasks)}/{MAX_INFLIGHT}"
                     )
-                for run_id, uid in claimed:
-                    task = asyncio.create_task(_run_tracked(run_id, uid))
+                for run in claimed:
+                    task = asyncio.create_task(_run_tracked(run))
                     running_tasks.add(task)
                     task.add_done_callback(running_tasks.discard)
 
@@ -853,7 +1189,8 @@ async def main():
     """Main entry point for the worker"""
     logger.info(
         "Starting SynText AI Worker "
-        f"(queries={QUERY_CONCURRENCY}, ingests={INGEST_CONCURRENCY}, "
+        f"(run types={','.join(WORKER_RUN_TYPES) or 'all'}, "
+        f"queries={QUERY_CONCURRENCY}, ingests={INGEST_CONCURRENCY}, "
         f"heavy>={HEAVY_FILE_BYTES // (1024 * 1024)}MB, per-user cap={MAX_RUNS_PER_USER}, "
         f"max in-flight={MAX_INFLIGHT})"
     )
@@ -869,16 +1206,32 @@ async def main():
     # No local model to preload
     logger.info("✅ Using HTTP-based embeddings (Voyage AI) - no model preload needed")
 
+    # What the graph framework costs per run, logged as graph_overhead. A few
+    # milliseconds once, so a regression in orchestration is seen at deploy.
+    overhead = await measure_graph_overhead()
+    for graph, numbers in overhead.items():
+        logger.info(
+            f"{graph} graph: compiled in {numbers['compile_ms']}ms, "
+            f"{numbers['ainvoke_us']}us per run outside the nodes"
+        )
+
     # Listen for announcements alongside the loop. This is the fast path only:
     # if it never connects, or dies and stays dead, the loop still polls and
     # the product behaves exactly as it did before this existed.
-    listener = asyncio.create_task(listen(WORK_CHANNEL, _work_announced))
-    if is_events_enabled():
-        logger.info("Waking on announcements as well as polling")
+    if wakes_via_postgres():
+        listener = asyncio.create_task(listen_postgres(PG_WORK_CHANNEL, _work_announced))
+        logger.info("Waking on NOTIFY %s as well as polling", PG_WORK_CHANNEL)
     else:
-        logger.info(
-            "REDIS_URL is not set, so work is found by polling every %ss", POLL_INTERVAL
-        )
+        listener = asyncio.create_task(listen(WORK_CHANNEL, _work_announced))
+        if is_events_enabled():
+            logger.info("Waking on announcements as well as polling")
+        else:
+            logger.info(
+                "REDIS_URL is not set, so work is found by polling every %ss", POLL_INTERVAL
+            )
+
+    lease_keeper = asyncio.create_task(_keep_leases())
+    maintenance = asyncio.create_task(_maintain())
 
     # Start the worker loop
     try:
@@ -895,17 +1248,34 @@ async def main():
         except asyncio.CancelledError:
             pass
 
+        # Between transactions or mid-batch, either is safe to stop: every
+        # batch commits on its own.
+        maintenance.cancel()
+        try:
+            await maintenance
+        except asyncio.CancelledError:
+            pass
+
         # Wait for remaining tasks to complete on shutdown
         if running_tasks:
             logger.info(f"Waiting for {len(running_tasks)} tasks to complete...")
             await asyncio.wait(running_tasks)
 
+        # Only now: the jobs drained above were holding leases until the end.
+        lease_keeper.cancel()
+        try:
+            await lease_keeper
+        except asyncio.CancelledError:
+            pass
+
         # Clean up shared database resources
         logger.info("Cleaning up shared database resources...")
         from api.repositories.async_base_repository import cleanup_shared_db_resources
         await cleanup_shared_db_resources()
         from api.services.llm_service import aclose_client
         await aclose_client()
+        from api.processors.page_render import shutdown_render_pool
+        shutdown_render_pool()
         await aclose_events()
 
         logger.info("SynText AI Worker shutdown complete")
@@ -16,7 +16,7 @@ from api.core.websocket_manager import websocket_manager
 from dotenv import load_dotenv
 from fastapi import HTTPException
 import gc
-from typing import Optional, List, Dict, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from api.models.async_db import get_database_url
 from api.processors.factory import FileProcessingFactory
 from urllib.parse import urlparse
@@ -220,6 +220,12 @@ async def _process_file_data_impl(
             error_msg = f"Fatal error in file processing pipeline: {str(e)[:1000]}"
             return await handle_processing_error(file_id_int, error_msg)
 
+# Compiled once per process, like query_agent above. Everything that differs
+# between uploads is the state handed to run(), so there is nothing to rebuild,
+# and constructing one per ingest recompiled the same graph every time.
+ingestion_agent = IngestionAgent(process_fn=_process_file_data_impl)
+
+
 async def process_file_data(
     user_id: int,
     file_id: int,
@@ -229,35 +235,24 @@ async def process_file_data(
     language: str = "en",
     comprehension_level: str = "Beginner",
 ) -> Dict[str, Any]:
-    """Processes the uploaded file via the LangGraph ingestion agent with a safe fallback."""
-    try:
-        ingestion_agent = IngestionAgent(process_fn=_process_file_data_impl)
-        return await ingestion_agent.run(
-            user_id=user_id,
-            file_id=file_id,
-            filename=filename,
-            file_url=file_url,
-            workspace_id=workspace_id,
-            language=language,
-            comprehension_level=comprehension_level,
-        )
-    except Exception as agent_error:
-        logger.warning(
-            {
-                "event": "process_file_data.agent_failed_fallback",
-                "file_id": file_id,
-                "error": str(agent_error),
-            }
-        )
-        return await _process_file_data_impl(
-            user_id=user_id,
-            file_id=file_id,
-            filename=filename,
-            file_url=file_url,
-            workspace_id=workspace_id,
-            language=language,
-            comprehension_level=comprehension_level,
-        )
+    """Processes the uploaded file via the LangGraph ingestion agent.
+
+    There used to be a fallback here that ran _process_file_data_impl again
+    whenever the agent raised. The agent is a single node around that same
+    function, which turns its own failures into a result, so anything that got
+    out was a failure the second attempt would meet again, after downloading
+    and parsing the whole document a second time. It raises to the worker now,
+    which marks the file failed.
+    """
+    return await ingestion_agent.run(
+        user_id=user_id,
+        file_id=file_id,
+        filename=filename,
+        file_url=file_url,
+        workspace_id=workspace_id,
+        language=language,
+        comprehension_level=comprehension_level,
+    )
 
 
 async def run_query_pipeline(
@@ -269,8 +264,15 @@ async def run_query_pipeline(
     formatted_history: str = "",
     workspace_id: int | None = None,
     file_id: int | None = None,
+    checkpoint: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None,
+    resume_from: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-    """Run retrieval + generation for a single query without persisting chat messages."""
+    """Run retrieval + generation for a single query without persisting chat messages.
+
+    `checkpoint` and `resume_from` are passed to QueryAgent.run: the first is
+    handed the graph's state after every node, the second is one of those
+    states to carry on from when a run is retried.
+    """
     cache_key_parts = dict(
         workspace_id=workspace_id,
         question=message,
@@ -302,6 +304,8 @@ async def run_query_pipeline(
                 formatted_history=formatted_history,
                 workspace_id=workspace_id,
                 file_id=file_id,
+                checkpoint=checkpoint,
+                resume_from=resume_from,
             )
             ctx["chunks"] = len(result.get("context_chunks") or [])
         await query_cache.put(result=result, **cache_key_parts)